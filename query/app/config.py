@@ -1,4 +1,5 @@
 import os
+MODEL_CACHE_DIR = "/app/.cache/huggingface/sentence-transformers"
 os.environ["TRANSFORMERS_CACHE"] = "/app/model_cache"
 os.environ["HF_HOME"] = "/app/.cache/huggingface"
-os.environ["SENTENCE_TRANSFORMERS_HOME"] = "/app/.cache/huggingface/sentence-transformers"
+os.environ["SENTENCE_TRANSFORMERS_HOME"] = MODEL_CACHE_DIR
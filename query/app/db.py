@@ -8,17 +8,41 @@ MONGO_URI       = os.getenv("MONGODB_URI")
 MONGO_DB_NAME   = os.getenv("MONGODB_DB", "querysearcher")
 TEXTBOOK_URI    = os.getenv("TEXTBOOK_URI")         
 
+# Connection pool sizing (per process)
+MONGO_MAX_POOL      = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL      = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+TEXTBOOK_MAX_POOL   = int(os.getenv("TEXTBOOK_MAX_POOL_SIZE", "20"))
+MONGO_TIMEOUT_MS    = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+
+# Process-wide clients and buckets – created once in the FastAPI lifespan
+# (or lazily on first use from scripts), closed on shutdown
+_client: AsyncIOMotorClient | None           = None
+_gridfs: AsyncIOMotorGridFSBucket | None     = None
+_textbook_client: AsyncIOMotorClient | None  = None
+_textbook_fs: AsyncIOMotorGridFSBucket | None = None
+
 # ────────────────────────────────────────────────────────────────
 # helpers for the main “query-searcher” DB
 # ────────────────────────────────────────────────────────────────
-def get_client():
-    return AsyncIOMotorClient(MONGO_URI)
+def get_client() -> AsyncIOMotorClient:
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL,
+            minPoolSize=MONGO_MIN_POOL,
+            serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        )
+    return _client
 
 def get_db():
     return get_client()[MONGO_DB_NAME]
 
-def get_gridfs():
-    return AsyncIOMotorGridFSBucket(get_db())
+def get_gridfs() -> AsyncIOMotorGridFSBucket:
+    global _gridfs
+    if _gridfs is None:
+        _gridfs = AsyncIOMotorGridFSBucket(get_db())
+    return _gridfs
 
 # ────────────────────────────────────────────────────────────────
 # ONE canonical helper for the *textbook* bucket
@@ -28,29 +52,54 @@ def _get_textbook_fs() -> AsyncIOMotorGridFSBucket:
     Build (and cache) a GridFS bucket that points to the textbook replica.
     Works whether TEXTBOOK_URI ends with '/<db>' or not.
     """
+    global _textbook_client, _textbook_fs
+    if _textbook_fs is not None:
+        return _textbook_fs
     if not TEXTBOOK_URI:
         raise RuntimeError("TEXTBOOK_URI not set in environment")
 
     parsed   = parse_uri(TEXTBOOK_URI)
     db_name  = parsed.get("database") or "textbooks"      # fallback name
-    client   = AsyncIOMotorClient(TEXTBOOK_URI)
-    return AsyncIOMotorGridFSBucket(client[db_name])
+    _textbook_client = AsyncIOMotorClient(
+        TEXTBOOK_URI,
+        maxPoolSize=TEXTBOOK_MAX_POOL,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+    )
+    _textbook_fs = AsyncIOMotorGridFSBucket(_textbook_client[db_name])
+    return _textbook_fs
 
-# ── public wrappers ─────────────────────────────────────────────
-async def save_to_textbook_fs(doc_id: str, file_path: str):
-    try:
-        bucket = _get_textbook_fs()
-        with open(file_path, "rb") as fp:
-            await bucket.upload_from_stream(f"{doc_id}.pdf", fp)
-        logger.info(f"📦 textbook PDF stored for {doc_id} → {TEXTBOOK_URI}")
-    except Exception as e:
-        logger.warning(f"⚠️ textbook GridFS save failed: {e}")
+# ── lifecycle (FastAPI lifespan) ────────────────────────────────
+def init_clients():
+    """Open both clients/buckets up front so every router and service reuses them."""
+    get_gridfs()
+    if TEXTBOOK_URI:
+        _get_textbook_fs()
+    logger.info(f"🔌 Mongo clients ready (pool ≤ {MONGO_MAX_POOL}, textbook pool ≤ {TEXTBOOK_MAX_POOL})")
+
+def close_clients():
+    global _client, _gridfs, _textbook_client, _textbook_fs
+    for client in (_client, _textbook_client):
+        if client is not None:
+            client.close()
+    _client = _gridfs = _textbook_client = _textbook_fs = None
+    logger.info("🔌 Mongo clients closed")
 
+# ── public wrappers ─────────────────────────────────────────────
 # Fetch to view PDF on frontend
 async def fetch_textbook_pdf(doc_id: str):
     bucket = _get_textbook_fs()
     return await bucket.open_download_stream_by_name(f"{doc_id}.pdf")
 
+# Newest textbook file record ({_id, length, uploadDate, ...}) for ranged/cached serving
+async def find_textbook_file(doc_id: str) -> dict | None:
+    bucket = _get_textbook_fs()
+    files = await bucket.find({"filename": f"{doc_id}.pdf"}).sort("uploadDate", -1).limit(1).to_list(1)
+    return files[0] if files else None
+
+async def open_textbook_file(file_id):
+    bucket = _get_textbook_fs()
+    return await bucket.open_download_stream(file_id)
+
 # Delete textbook when handshake failed
 async def delete_textbook_pdf(doc_id: str):
     bucket = _get_textbook_fs()
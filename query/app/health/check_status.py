@@ -1,7 +1,8 @@
 # app/health/check_status.py
 from fastapi import APIRouter
-from motor.motor_asyncio import AsyncIOMotorClient
-import os, logging
+from app.db import get_db
+from app.services import catalog, embedder, embedding_cache, jobs, progress, provider_health, search_cache, textbook_cache, vector_index
+import logging
 
 router = APIRouter()
 logger = logging.getLogger("book-query")
@@ -9,8 +10,7 @@ logger = logging.getLogger("book-query")
 @router.get("")
 async def get_status():
     try:
-        client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
-        db = client[os.getenv("MONGODB_DB", "querysearcher")]
+        db = get_db()
 
         docs = await db.documents.find().sort("_id", -1).limit(5).to_list(length=5)
         doc_count = await db.documents.count_documents({})
@@ -20,6 +20,15 @@ async def get_status():
             "status": "ok",
             "documents_total": doc_count,
             "embeddings_total": embed_count,
+            "embedder": embedder.status(),
+            "embedding_cache": embedding_cache.stats(),
+            "ingestion": jobs.status(),
+            "search_cache": search_cache.stats(),
+            "providers": provider_health.stats(),
+            "catalog": catalog.stats(),
+            "progress": progress.stats(),
+            "vector_index": vector_index.stats(),
+            "textbook_cache": textbook_cache.stats(),
             "recent_documents": [
                 {
                     "id": doc.get("_id"),
@@ -31,4 +40,4 @@ async def get_status():
         }
     except Exception as e:
         logger.exception("❌ Health check failed")
-        return {"status": "error", "error": str(e)}
+        return {"status": "error", "error": str(e), "embedder": embedder.status()}
@@ -0,0 +1,60 @@
+# app/health/export_metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services import (
+    catalog, embedder, embedding_cache, jobs, metrics, progress, provider_health, search_cache, textbook_cache, vector_index,
+)
+
+router = APIRouter()
+
+_STATES = {provider_health.CLOSED: 0, provider_health.HALF_OPEN: 1, provider_health.OPEN: 2}
+
+
+def _scrape_time() -> list[list[str]]:
+    """Gauges mirrored from the services' own stats(), read only when Prometheus asks."""
+    queue, sockets = jobs.status(), progress.stats()
+    caches, providers = search_cache.stats(), provider_health.stats()
+    embeds, books, local = embedding_cache.stats(), textbook_cache.stats(), catalog.stats()
+    index = vector_index.stats()
+    return [
+        metrics.gauge("bookquery_ingest_queue_depth", "Ingestion jobs waiting in this worker.", [((), queue["queue_depth"])]),
+        metrics.gauge("bookquery_ingest_queue_max", "Queue depth at which imports get a 429.", [((), queue["queue_max"])]),
+        metrics.gauge("bookquery_websocket_connections", "Open progress WebSockets.", [((), sockets["sockets"])]),
+        metrics.gauge("bookquery_websocket_documents", "Documents with at least one watcher.", [((), sockets["documents"])]),
+        metrics.gauge("bookquery_embedder_ready", "1 once the encoder is loaded.", [((), int(embedder.is_ready()))]),
+        metrics.gauge(
+            "bookquery_cache_hit_ratio", "Hit ratio since start, per cache.",
+            [((f"search:{name}",), c["hit_rate"]) for name, c in caches.items()]
+            + [(("embedding",), embeds["hit_rate"]), (("catalog",), local["hit_rate"])],
+            labels=("cache",),
+        ),
+        metrics.gauge(
+            "bookquery_cache_requests_total", "Cache lookups by result.",
+            [((f"search:{name}", "hit"), c["hits"] + c["stale_hits"]) for name, c in caches.items()]
+            + [((f"search:{name}", "miss"), c["misses"]) for name, c in caches.items()]
+            + [(("embedding", "hit"), embeds["lookups"] - embeds["misses"]), (("embedding", "miss"), embeds["misses"])]
+            + [(("catalog", "hit"), local["hits"] + local["shared_hits"]), (("catalog", "miss"), local["misses"])]
+            + [(("textbook", "hit"), books["disk_hits"]), (("textbook", "miss"), books["gridfs_reads"])],
+            labels=("cache", "result"), kind="counter",
+        ),
+        metrics.gauge(
+            "bookquery_provider_circuit_state", "0 closed, 1 half-open, 2 open.",
+            [((name,), _STATES[p["state"]]) for name, p in providers.items()], labels=("provider",),
+        ),
+        metrics.gauge(
+            "bookquery_provider_inflight_limit", "Adaptive in-flight cap per provider.",
+            [((name,), p["limit"]) for name, p in providers.items()], labels=("provider",),
+        ),
+        metrics.gauge(
+            "bookquery_provider_rejected_total", "Calls turned away by the breaker.",
+            [((name,), p["rejected"]) for name, p in providers.items()], labels=("provider",), kind="counter",
+        ),
+        metrics.gauge("bookquery_vector_index_bytes", "Memory held by loaded document indexes.", [((), index["bytes"])]),
+    ]
+
+
+@router.get("", response_class=PlainTextResponse)
+async def export_metrics():
+    return PlainTextResponse(
+        metrics.render(*_scrape_time()), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -7,12 +7,44 @@
 # │   │   └── import_doc.py
 # │   │   └── ws_progress.py
 # │   ├── services/
+# │   │   ├── blobs.py
+# │   │   ├── catalog.py
+# │   │   ├── chunker.py
+# │   │   ├── embedder.py
+# │   │   ├── embedding_cache.py
+# │   │   ├── http_pool.py
+# │   │   ├── import_flights.py
+# │   │   ├── provider_health.py
+# │   │   ├── search_cache.py
+# │   │   ├── textbook_cache.py
+# │   │   ├── transfer.py
+# │   │   ├── vectors.py
+# │   │   ├── vector_index.py
+# │   │   ├── vector_store.py
+# │   │   ├── lexical_index.py
+# │   │   ├── ingest.py
+# │   │   ├── jobs.py
+# │   │   ├── metrics.py
+# │   │   ├── pdf_text.py
+# │   │   ├── progress.py
 # │   │   ├── google_books.py
 # │   │   ├── open_library.py
 # │   │   └── internet_archive.py
 # │   │   └── project_gutenberg.py
+# │   ├── tools/
+# │   │   └── migrate_embeddings.py
 # │   └── health/
-# │       └── check_status.py
+# │       ├── check_status.py
+# │       └── export_metrics.py
+# ├── bench/                 offline benchmarks (python -m bench.run)
+# │   ├── run.py
+# │   ├── compare.py
+# │   ├── providers.py
+# │   ├── memory_mongo.py
+# │   ├── synthetic_pdf.py
+# │   ├── startup.py
+# │   └── fixtures/
+# ├── gunicorn.conf.py       optional preload mode (GUNICORN_PRELOAD=1)
 # ├── Dockerfile
 # ├── docker-compose.yml
 # └── README.md
@@ -20,10 +52,14 @@
 # https://binkhoale1812-querysearcher.hf.space/health
 
 # app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket
 from app.routers import search, import_doc
-from app.health import check_status
+from app.health import check_status, export_metrics
+from app.services import embedder, jobs, ingest, http_pool, search_cache, project_gutenberg, blobs, embedding_cache, progress, import_flights, catalog
+from app import db
 import app.config
+import asyncio
 
 # Debugger
 import logging
@@ -39,11 +75,38 @@ for noisy_module in ["pymongo", "pymongo.server_selection", "pymongo.topology",
     logging.getLogger(noisy_module).setLevel(logging.WARNING)
 logger.info("🚀 Starting Tutor Book Querier...")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The encoder loads on first use unless EMBEDDING_WARMUP=1; under GUNICORN_PRELOAD the
+    # weights came with the fork and this only runs one encode. /health reports readiness.
+    db.init_clients()
+    warmup = asyncio.create_task(asyncio.to_thread(embedder.warmup)) if embedder.WARMUP or embedder.is_ready() else None
+    await ingest.ensure_indexes()
+    await search_cache.ensure_indexes()
+    await project_gutenberg.ensure_indexes()
+    await blobs.ensure_indexes()
+    await embedding_cache.ensure_indexes()
+    await import_flights.ensure_indexes()
+    await catalog.ensure_indexes()
+    catalog_warm = asyncio.create_task(catalog.warm())
+    await jobs.start()
+    progress.start()
+    yield
+    await progress.stop()
+    await jobs.stop()
+    if warmup and not warmup.done():
+        warmup.cancel()
+    if not catalog_warm.done():
+        catalog_warm.cancel()
+    await http_pool.close()
+    db.close_clients()
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(search.router, prefix="/search")
 app.include_router(import_doc.router, prefix="/import")
 app.include_router(check_status.router, prefix="/health")
+app.include_router(export_metrics.router, prefix="/metrics")
 
 @app.websocket("/ws/documents/{document_id}")
 async def websocket_endpoint(websocket: WebSocket, document_id: str):
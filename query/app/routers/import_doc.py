@@ -1,19 +1,78 @@
 # app/routers/import_doc.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.db import get_db, get_gridfs, save_to_textbook_fs, fetch_textbook_pdf
-from app.services import google_books, open_library, internet_archive, project_gutenberg
-from app.services.ingest import parse_and_index
-import aiofiles, uuid, os
-import asyncio
+from email.utils import format_datetime, parsedate_to_datetime
 import httpx
+from app.db import get_db
+from app.services import google_books, open_library, internet_archive, project_gutenberg
+from app.services import jobs, http_pool, transfer, blobs, import_flights, textbook_cache, metrics, vector_index
 
 import logging
 logger = logging.getLogger("book-query")
 
 router = APIRouter()
 
+def _ensure_capacity():
+    """Push back before downloading anything if the ingestion queue is already full."""
+    if not jobs.has_capacity():
+        logger.warning(f"🚦 ingestion queue full ({jobs.queue_depth()}), rejecting request")
+        raise HTTPException(429, "Ingestion queue is full, retry later", headers={"Retry-After": "30"})
+
+async def _enqueue(document_id: str):
+    try:
+        await jobs.submit(document_id)
+    except jobs.QueueFull:
+        # Job record is persisted as QUEUED; the scheduler sweep will pick it up
+        logger.warning(f"🚦 queue filled up, {document_id} left for the scheduler sweep")
+
+async def _link_content(doc_id: str, stored: dict, fields: dict) -> str:
+    """Register freshly stored bytes under their content hash, dropping our copy if it's a duplicate."""
+    blob = await blobs.register(doc_id, stored)
+    if blob["duplicate"]:
+        await blobs.discard_upload(stored)
+    return await _link_blob(doc_id, blob, fields)
+
+async def _link_blob(doc_id: str, blob: dict, fields: dict) -> str:
+    """
+    Attach the document to its content hash. New content is queued for ingestion;
+    known content reuses the owner's blob and embeddings and skips ingestion.
+    """
+    db = get_db()
+    owner = blob["owner"]
+    await db.documents.update_one(
+        {"_id": doc_id},
+        {"$set": {
+            **fields,
+            "status": "DOWNLOADING",
+            "blob": {"sha256": blob["_id"], "size": blob["size"], "owner": owner},
+        }}
+    )
+    vector_index.forget_owner(doc_id)
+    # Re-uploaded or re-imported with different content: let go of the old blob
+    await blobs.release_previous(doc_id, blob["_id"])
+    if not blob["duplicate"]:
+        await _enqueue(doc_id)
+        return "QUEUED"
+    if await blobs.embeddings_ready(owner):
+        await db.documents.update_one({"_id": doc_id}, {"$set": {"status": "READY"}})
+        logger.info(f"♻️ {doc_id} matches already indexed content of {owner}, ready instantly")
+        return "READY"
+    # Owner still indexing (READY gets mirrored when it finishes) – or failed, so run it again
+    job = await db.ingest_jobs.find_one({"_id": owner}, {"status": 1})
+    if not job or job.get("status") == "FAILED":
+        await _enqueue(owner)
+    logger.info(f"♻️ {doc_id} matches content of {owner}, waiting on its ingestion")
+    return "QUEUED"
+
+async def _follow(doc_id: str, outcome: dict) -> str | None:
+    """Point a coalesced import at the content its flight leader stored; inherits its status and progress."""
+    blob = await blobs.attach(doc_id, outcome["sha256"])
+    if blob is None:
+        return None
+    logger.info(f"🪢 {doc_id} joined the import of {outcome['document_id']}")
+    return await _link_blob(doc_id, blob, {"metadata": outcome["metadata"]})
+
 class ImportRequest(BaseModel):
     candidate_id: str
     title: str
@@ -46,59 +105,62 @@ async def import_book(req: ImportRequest):
         }
     }
     await db.documents.replace_one({"_id": req.candidate_id}, placeholder_doc, upsert=True) 
-    # Try to fetch from source
-    result = await source_lookup[req.source](req.ref)
-    logger.debug(f"🔎 Fetch result for ref {req.ref}: {result}")
-    # Invalid URL
-    if not result:
-        logger.warning(f"⛔️ No fetch result for {req.source} with ref {req.ref}")
-        raise HTTPException(403, "Download not permitted")
-    # Preview only
-    if not result.get("download_url"):
-        logger.warning(f"📄 No download URL from {req.source}. Viewability: {result.get('viewability', 'unknown')}")
-        raise HTTPException(403, "Download not permitted")
-    # Download PDF to temp path
-    download_url = result["download_url"]
-    file_path = f"/tmp/{req.candidate_id}.pdf"
-    logger.info(f"⬇️ Downloading from: {download_url}")
-    # Read and Write
-    try:
-        async with aiofiles.open(file_path, mode='wb') as f:
-            async with httpx.AsyncClient() as client:
-                r = await client.get(download_url)
-                r.raise_for_status()
-                await f.write(r.content)
-        logger.info(f"✅ PDF saved to {file_path}")
-    except Exception as e:
-        logger.error(f"🚨 Failed to download or write PDF: {e}")
-        raise HTTPException(500, "Failed to download PDF")
-    # Save to both buckets
+
+    # Leader only: fetch, download and store the PDF, then queue its ingestion
+    async def lead() -> dict:
+        _ensure_capacity()
+        # Try to fetch from source
+        with metrics.PROVIDER_SECONDS.time(metrics.provider_label(req.source), "fetch", errors=metrics.PROVIDER_ERRORS):
+            result = await source_lookup[req.source](req.ref)
+        logger.debug(f"🔎 Fetch result for ref {req.ref}: {result}")
+        # Invalid URL
+        if not result:
+            logger.warning(f"⛔️ No fetch result for {req.source} with ref {req.ref}")
+            raise HTTPException(403, "Download not permitted")
+        # Preview only
+        if not result.get("download_url"):
+            logger.warning(f"📄 No download URL from {req.source}. Viewability: {result.get('viewability', 'unknown')}")
+            raise HTTPException(403, "Download not permitted")
+        # Stream the PDF straight into both buckets (no temp file, no full copy in RAM)
+        download_url = result["download_url"]
+        logger.info(f"⬇️ Downloading from: {download_url}")
+        try:
+            with metrics.IMPORT_STAGE_SECONDS.time("download"):
+                async with http_pool.get_client().stream("GET", download_url) as r:
+                    r.raise_for_status()
+                    declared = int(r.headers.get("content-length") or 0) or None
+                    blob = await transfer.stream_to_buckets(
+                        req.candidate_id, r.aiter_bytes(transfer.TRANSFER_CHUNK), declared
+                    )
+        except transfer.TooLarge:
+            logger.warning(f"📏 PDF for {req.candidate_id} exceeds {transfer.MAX_PDF_BYTES} bytes")
+            raise HTTPException(413, "PDF too large")
+        except httpx.HTTPError as e:
+            logger.error(f"🚨 Failed to download PDF: {e}")
+            raise HTTPException(500, "Failed to download PDF")
+        except Exception as e:
+            logger.error(f"💥 Failed to upload to GridFS: {e}")
+            raise HTTPException(500, "Storage failed")
+        # Update document metadata and hand over to the ingestion scheduler (unless deduplicated)
+        status = await _link_content(req.candidate_id, blob, {"metadata": result})
+        logger.info(f"📚 Document {req.candidate_id} {status.lower()}")
+        return {"document_id": req.candidate_id, "sha256": blob["sha256"], "metadata": result, "status": status}
+
+    # One fetch/download/ingestion per (source, ref); concurrent importers share its outcome
     try:
-        grid_fs_bucket = get_gridfs()
-        with open(file_path, "rb") as f:
-            await grid_fs_bucket.upload_from_stream(f"{req.candidate_id}.pdf", f)
-        await save_to_textbook_fs(req.candidate_id, file_path)
-        os.remove(file_path)
-    except Exception as e:
-        logger.error(f"💥 Failed to upload to GridFS: {e}")
-        raise HTTPException(500, "Storage failed")
-    # Update document metadata after download
-    await db.documents.update_one(
-        {"_id": req.candidate_id},
-        {
-            "$set": {
-                "status": "DOWNLOADING",
-                "metadata": result
-            }
-        }
-    )
-    # Trigger async embedding
-    asyncio.create_task(parse_and_index(req.candidate_id))
-    logger.info(f"📚 Document {req.candidate_id} queued for indexing")
+        outcome, led = await import_flights.run(import_flights.flight_key(req.source, req.ref), lead)
+    except import_flights.FlightFailed as e:
+        raise HTTPException(e.status_code, e.detail)
+    status = outcome["status"]
+    if not led and outcome["document_id"] != req.candidate_id:
+        status = await _follow(req.candidate_id, outcome)
+        if status is None:
+            # The shared content was deleted in the meantime: import it ourselves
+            status = (await lead())["status"]
     # Return info to frontend
     uri = f"/import/textbook/{req.candidate_id}"
     return {
-        "status": "QUEUED",
+        "status": status,
         "id": req.candidate_id,
         "title": req.title,
         "source": req.source,
@@ -109,7 +171,37 @@ async def import_book(req: ImportRequest):
  
 # File upload stream: Embedding, query and PDF saver to buckets
 from fastapi import UploadFile, File, Form
-@router.post("/upload")
+from fastapi.routing import APIRoute
+
+FORM_OVERHEAD = 1024 * 1024   # multipart boundaries and the small text fields around the PDF
+
+class _BoundedUpload(APIRoute):
+    """
+    Enforce MAX_PDF_BYTES while the body arrives. FastAPI parses (and spools to a
+    temp file) the whole multipart form before upload_book runs, so the check there
+    only fires after an oversized body has been received in full.
+    """
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        limit = transfer.MAX_PDF_BYTES + FORM_OVERHEAD
+
+        async def bounded(request: Request) -> Response:
+            declared = request.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > limit:
+                logger.warning(f"📏 Upload rejected up front: {declared} bytes declared")
+                raise HTTPException(413, "PDF too large")
+            received = 0
+            # Chunked bodies carry no length: count as they're read and stop past the limit
+            async def receive():
+                nonlocal received
+                message = await request.receive()
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(413, "PDF too large")
+                return message
+            return await handler(Request(request.scope, receive))
+        return bounded
+
 async def upload_book(
     file: UploadFile = File(...),
     title: str = Form(...),
@@ -117,6 +209,7 @@ async def upload_book(
     source: str = Form("manual")  # Optional default source
 ):
     logger.info(f"📤 Received direct upload for: {candidate_id} ({title})")
+    _ensure_capacity()
     db = get_db()
     # Insert placeholder document first
     placeholder_doc = {
@@ -129,36 +222,22 @@ async def upload_book(
         }
     }
     await db.documents.replace_one({"_id": candidate_id}, placeholder_doc, upsert=True)
-    # Save uploaded file to temp
-    file_path = f"/tmp/{candidate_id}.pdf"
-    try:
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
-        logger.info(f"✅ Uploaded PDF temporarily saved to {file_path}")
-    except Exception as e:
-        logger.error(f"🚨 Failed to save uploaded file: {e}")
-        raise HTTPException(500, "Failed to save uploaded PDF")
-    # Save to buckets
+    # Stream the upload into both buckets chunk by chunk
     try:
-        grid_fs_bucket = get_gridfs()
-        with open(file_path, "rb") as f:
-            await grid_fs_bucket.upload_from_stream(f"{candidate_id}.pdf", f)
-        await save_to_textbook_fs(candidate_id, file_path)
-        os.remove(file_path)
+        with metrics.IMPORT_STAGE_SECONDS.time("upload"):
+            blob = await transfer.stream_to_buckets(candidate_id, transfer.iter_upload(file), file.size)
+    except transfer.TooLarge:
+        logger.warning(f"📏 Upload {candidate_id} exceeds {transfer.MAX_PDF_BYTES} bytes")
+        raise HTTPException(413, "PDF too large")
     except Exception as e:
         logger.error(f"💥 Failed to upload to GridFS: {e}")
         raise HTTPException(500, "Storage failed")
-    # Update metadata and trigger ingestion
-    await db.documents.update_one(
-        {"_id": candidate_id},
-        {"$set": {"status": "DOWNLOADING"}}
-    )
-    asyncio.create_task(parse_and_index(candidate_id))
-    logger.info(f"📚 Direct upload {candidate_id} queued for indexing")
+    # Update metadata and trigger ingestion (unless deduplicated)
+    status = await _link_content(candidate_id, blob, {})
+    logger.info(f"📚 Direct upload {candidate_id} {status.lower()}")
     # Final block
     return {
-        "status": "QUEUED",
+        "status": status,
         "id": candidate_id,
         "title": title,
         "source": source,
@@ -166,13 +245,88 @@ async def upload_book(
         "uri": f"/import/textbook/{candidate_id}"
     }
 
+router.add_api_route("/upload", upload_book, methods=["POST"], route_class_override=_BoundedUpload)
 
-# Fetch textbook on id
+
+# Retry a failed/stuck ingestion; resumes from the last committed chunk batch
+@router.post("/retry/{doc_id}")
+async def retry_ingestion(doc_id: str):
+    db = get_db()
+    doc = await db.documents.find_one({"_id": doc_id}, {"status": 1})
+    if not doc:
+        raise HTTPException(404, "Document not found")
+    if doc.get("status") == "READY":
+        return {"status": "READY", "id": doc_id}
+    owner = await blobs.storage_id(doc_id)
+    # Nothing to retry while a worker is on it (submit would only flag a needless re-run)
+    if job := await jobs.running(owner):
+        return {"status": job["status"], "id": doc_id}
+    _ensure_capacity()
+    await db.documents.update_one({"_id": doc_id}, {"$set": {"status": "DOWNLOADING"}})
+    await _enqueue(owner)
+    logger.info(f"🔁 Re-queued ingestion for {doc_id} (content owner {owner})")
+    return {"status": "QUEUED", "id": doc_id}
+
+
+def _not_modified(request: Request, info: dict) -> bool:
+    """If-None-Match wins over If-Modified-Since (RFC 9110 §13.2.2)."""
+    if inm := request.headers.get("if-none-match"):
+        tags = [t.strip().removeprefix("W/") for t in inm.split(",")]
+        return "*" in tags or info["etag"] in tags
+    if ims := request.headers.get("if-modified-since"):
+        try:
+            return parsedate_to_datetime(ims) >= info["last_modified"]
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _byte_range(request: Request, info: dict) -> tuple[int, int] | None:
+    """Single `bytes=` range as inclusive (start, end); None serves the whole file."""
+    header, length = request.headers.get("range"), info["length"]
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None   # absent, or multipart ranges – a full 200 is always allowed
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != info["etag"] and if_range != format_datetime(info["last_modified"], usegmt=True):
+        return None   # client's partial copy is stale
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), min(int(last) if last else length - 1, length - 1)
+        else:
+            start, end = max(length - int(last), 0), length - 1   # suffix: the last N bytes
+    except ValueError:
+        return None
+    if start > end or start >= length:
+        raise HTTPException(416, "Range not satisfiable", headers={"Content-Range": f"bytes */{length}"})
+    return start, end
+
+# Fetch textbook on id – supports Range (pdf.js lazy loading) and conditional requests
 @router.get("/textbook/{doc_id}")
-async def get_textbook(doc_id: str):
+async def get_textbook(doc_id: str, request: Request):
     try:
-        stream = await fetch_textbook_pdf(doc_id)
-        return StreamingResponse(stream, media_type="application/pdf")
+        info = await textbook_cache.describe(await blobs.storage_id(doc_id))
     except Exception as e:
         logger.error(f"❌ Failed to serve textbook {doc_id}: {e}")
-        raise HTTPException(404, "Textbook not found")
\ No newline at end of file
+        raise HTTPException(404, "Textbook not found")
+    if info is None:
+        logger.error(f"❌ Failed to serve textbook {doc_id}: no file")
+        raise HTTPException(404, "Textbook not found")
+    headers = {
+        "ETag": info["etag"],
+        "Last-Modified": format_datetime(info["last_modified"], usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",   # always revalidate; unchanged books cost a 304
+    }
+    if _not_modified(request, info):
+        return Response(status_code=304, headers=headers)
+    span = _byte_range(request, info)
+    start, end = span or (0, info["length"] - 1)
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+    if span:
+        headers["Content-Range"] = f"bytes {start}-{end}/{info['length']}"
+    return StreamingResponse(
+        textbook_cache.iter_range(info, start, end),
+        status_code=206 if span else 200,
+        media_type="application/pdf",
+        headers=headers,
+    )
@@ -1,18 +1,53 @@
 # app/routers/search.py
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Literal
 from uuid import uuid4
-import asyncio, logging, re
+import asyncio, json, logging, os, re, time
 
 from app.services import (
     google_books,
     open_library,
     internet_archive,
-    project_gutenberg,  
+    project_gutenberg,
+    search_cache,
+    provider_health,
+    catalog,
+    embedder,
+    jobs,
+    metrics,
+    vector_index,
 )
 
 logger = logging.getLogger("book-query")
 router = APIRouter()
 
+PROVIDERS = {
+    "google_books": google_books.search,
+    "open_library": open_library.search,
+    "internet_archive": internet_archive.search,
+    "project_gutenberg": project_gutenberg.search,
+}
+
+# Whole-request latency budget, and optional tighter per-provider deadlines
+# (e.g. SEARCH_DEADLINE_OPEN_LIBRARY=2.5)
+SEARCH_BUDGET = float(os.getenv("SEARCH_BUDGET", "6"))
+PROVIDER_DEADLINES = {
+    name: float(os.getenv(f"SEARCH_DEADLINE_{name.upper()}", SEARCH_BUDGET)) for name in PROVIDERS
+}
+MAX_RESULTS = 40
+RRF_K = int(os.getenv("SEARCH_RRF_K", "60"))   # reciprocal-rank-fusion damping for hybrid mode
+
+# Provider calls that outlived their deadline keep running to warm the cache
+_background: set[asyncio.Task] = set()
+
+def _detach(task: asyncio.Task):
+    """Let a task finish after the response has gone out (held here so it isn't collected)."""
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())  # silence unretrieved errors
+
 def _tokenize(text: str):
     """lower-case & keep only alnum tokens"""
     return re.findall(r"[a-z0-9]+", text.lower())
@@ -26,31 +61,184 @@ def _title_matches(title: str, query_tokens: list[str]) -> bool:
     joined_query = "".join(query_tokens)
     return all(tok in title_norm for tok in query_tokens) or joined_query in title_norm
 
+def _filter(items: list[dict], query_tokens: list[str], dropped: list) -> list[dict]:
+    kept = []
+    for item in items:
+        if item["title"] and _title_matches(item["title"], query_tokens):
+            kept.append({"candidate_id": str(uuid4()), **item})
+        else:
+            dropped.append(item["title"])
+    return kept
+
+def _start_providers(q: str, query_tokens: list[str]):
+    """Kick off every (cached) provider search and wrap each one in its own deadline."""
+    cache_key = " ".join(query_tokens)
+    started = time.monotonic()
+
+    async def bounded(name, fn):
+        # Cache first; only a miss (or stale refresh) goes through the provider's breaker
+        breaker = provider_health.for_provider(name)
+        task = asyncio.create_task(search_cache.for_provider(name).get_or_fetch(cache_key, lambda: breaker.call(fn, q)))
+        remaining = SEARCH_BUDGET - (time.monotonic() - started)
+        try:
+            return name, "ok", await asyncio.wait_for(asyncio.shield(task), min(PROVIDER_DEADLINES[name], remaining))
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ {name} missed its deadline for {q!r}")
+            _detach(task)
+            return name, "timeout", []
+        except provider_health.Unavailable as e:
+            logger.info(f"⏭️ skipped {e}")
+            return name, "skipped", []
+        except Exception as e:
+            logger.warning(f"⚠️ {name} search failed for {q!r}: {e}")
+            return name, "error", []
+
+    return [bounded(name, fn) for name, fn in PROVIDERS.items()]
+
 @router.get("")
-async def search_books(q: str = Query(...)):
+@metrics.timed(metrics.SEARCH_SECONDS, "search")
+async def search_books(response: Response, q: str = Query(...)):
     query_tokens = _tokenize(q)
     logger.info(f"🔍 /search called with query={q!r} tokens={query_tokens}")
 
-    # 1. gather raw results
-    raw = await asyncio.gather(
-        google_books.search(q),
-        open_library.search(q),
-        internet_archive.search(q),
-        project_gutenberg.search(q),     
-    )
+    # 0. repeat query – answered from the local catalog, no provider calls
+    local = await catalog.lookup(query_tokens)
+    if local is not None:
+        response.headers["X-Search-Source"] = "catalog"
+        return _filter(local, query_tokens, [])[:MAX_RESULTS]
+
+    # 1. gather raw results – never longer than the budget, never failing on one provider
+    outcomes = await asyncio.gather(*_start_providers(q, query_tokens))
 
     # 2. flatten & filter by title tokens
     merged, dropped = [], []
-    for source_list in raw:
-        for item in source_list:
-            if item["title"] and _title_matches(item["title"], query_tokens):
-                merged.append({"candidate_id": str(uuid4()), **item})
-            else:
-                dropped.append(item["title"])
+    for name, status, items in outcomes:
+        merged.extend(_filter(items, query_tokens, dropped))
+
+    # Catalog writes go to Mongo; the response doesn't wait for them
+    _detach(asyncio.create_task(catalog.record(
+        query_tokens,
+        [item for _, _, items in outcomes for item in items],
+        complete=all(status == "ok" for _, status, _ in outcomes),
+    )))
 
     logger.debug(f"✅ kept {len(merged)} / ❌ dropped {len(dropped)} titles")
     if dropped:
         logger.debug(f"🚮 truncated titles: {dropped[:10]}")
 
+    # Partial-result markers (body stays a plain list for existing clients)
+    timed_out = [name for name, status, _ in outcomes if status == "timeout"]
+    failed = [name for name, status, _ in outcomes if status == "error"]
+    skipped = [name for name, status, _ in outcomes if status == "skipped"]
+    if timed_out:
+        response.headers["X-Search-Timed-Out"] = ",".join(timed_out)
+    if failed:
+        response.headers["X-Search-Failed"] = ",".join(failed)
+    if skipped:
+        response.headers["X-Search-Skipped"] = ",".join(skipped)
+
     # Limit to 40 best matches
-    return merged[:40]
+    return merged[:MAX_RESULTS]
+
+
+@router.get("/stream")
+async def search_books_stream(q: str = Query(...)):
+    """NDJSON: one line per provider as soon as it answers, then a summary line."""
+    query_tokens = _tokenize(q)
+    logger.info(f"🔍 /search/stream called with query={q!r} tokens={query_tokens}")
+
+    async def lines():
+        sent, timed_out, failed, skipped, dropped = 0, [], [], [], []
+        local = await catalog.lookup(query_tokens)
+        if local is not None:
+            kept = _filter(local, query_tokens, dropped)[:MAX_RESULTS]
+            yield json.dumps({"source": "catalog", "status": "ok", "results": kept}) + "\n"
+            yield json.dumps({"done": True, "total": len(kept), "timed_out": [], "failed": [], "skipped": []}) + "\n"
+            return
+        raw = []
+        for next_done in asyncio.as_completed(_start_providers(q, query_tokens)):
+            name, status, items = await next_done
+            if status == "timeout":
+                timed_out.append(name)
+            elif status == "error":
+                failed.append(name)
+            elif status == "skipped":
+                skipped.append(name)
+            raw.extend(items)
+            kept = _filter(items, query_tokens, dropped)[:max(MAX_RESULTS - sent, 0)]
+            sent += len(kept)
+            yield json.dumps({"source": name, "status": status, "results": kept}) + "\n"
+        yield json.dumps({"done": True, "total": sent, "timed_out": timed_out, "failed": failed, "skipped": skipped}) + "\n"
+        _detach(asyncio.create_task(catalog.record(query_tokens, raw, complete=not timed_out and not failed and not skipped)))
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/suggest")
+async def suggest(q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    """Autocomplete from the local catalog (never calls a provider)."""
+    return catalog.suggest(q, limit)
+
+
+class SemanticQuery(BaseModel):
+    document_ids: list[str] = Field(..., min_length=1)
+    question: str
+    k: int = Field(5, ge=1, le=50)
+    mode: Literal["vector", "lexical", "hybrid"] = "vector"
+
+
+def _fuse(rankings: list[list[tuple[float, int]]], k: int) -> list[tuple[float, int]]:
+    """Reciprocal rank fusion: scores from different retrievers aren't comparable, ranks are."""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (_, row) in enumerate(ranking):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(((score, row) for row, score in fused.items()), reverse=True)[:k]
+
+
+@router.post("/semantic")
+@metrics.timed(metrics.SEARCH_SECONDS, "semantic")
+async def semantic_search(req: SemanticQuery):
+    """Top-k chunks across the given documents: embeddings, BM25 keywords, or both fused."""
+    logger.info(f"🧭 /search/semantic ({req.mode}) over {req.document_ids} q={req.question!r}")
+    # Shared content lives under its owner document (resolved once per document, then cached)
+    owners = {doc_id: await vector_index.owner(doc_id) for doc_id in req.document_ids}
+    indexes = {}
+    for owner in set(owners.values()):
+        ix = await vector_index.get(owner)
+        if ix is not None:
+            indexes[owner] = ix
+    if not indexes:
+        raise HTTPException(404, "No indexed documents found")
+    query = None
+    if req.mode != "lexical":
+        query = (await jobs.run_blocking(embedder.encode, [req.question]))[0]
+        query = query / max(float((query ** 2).sum()) ** 0.5, 1e-12)
+
+    hits = []
+    for doc_id, owner in owners.items():
+        ix = indexes.get(owner)
+        if ix is None:
+            continue
+        if req.mode == "vector":
+            ranked = ix.search(query, req.k)
+        elif req.mode == "lexical":
+            ranked = ix.lexical.search(req.question, req.k)
+        else:
+            # Over-fetch from both so fusion has overlap to work with
+            ranked = _fuse([ix.search(query, req.k * 4), ix.lexical.search(req.question, req.k * 4)], req.k)
+        for score, row in ranked:
+            hits.append({
+                "document_id": doc_id,
+                "chunk_id": int(ix.chunk_ids[row]),
+                "page": ix.meta[row]["page"],
+                "score": round(score, 4),
+                "text": ix.meta[row]["text"],
+            })
+    hits.sort(key=lambda h: h["score"], reverse=True)
+    return {"results": hits[:req.k], "missing": [d for d, o in owners.items() if o not in indexes]}
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    return search_cache.stats()
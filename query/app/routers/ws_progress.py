@@ -3,6 +3,7 @@ import asyncio, logging, contextlib
 from fastapi import WebSocket, WebSocketDisconnect
 from bson import ObjectId
 from app.db import get_db, get_gridfs, delete_textbook_pdf
+from app.services import blobs, metrics, progress, textbook_cache, vector_index
 
 logger = logging.getLogger("book-query")
 
@@ -10,39 +11,72 @@ async def _delete_everything(doc_id: str):
     """Remove embeddings, GridFS file & textbook copy if the user vanished."""
     db           = get_db()
     gridfs_query = get_gridfs()
-    # remove metadata + embeddings
+    # remove metadata; shared content only goes once its last reference is gone
     await db.documents.delete_one({"_id": doc_id})
-    await db.embeddings.delete_many({"document_id": doc_id})
+    vector_index.forget_owner(doc_id)
+    owner = await blobs.release(doc_id)
+    if owner is None:
+        logger.info(f"🗑️  removed {doc_id}, content still referenced elsewhere")
+        return
+    await db.embeddings.delete_many({"document_id": owner})
+    await db.ingest_jobs.delete_one({"_id": owner})
+    vector_index.drop(owner)
     # remove original PDF from the main bucket
     with contextlib.suppress(Exception):
-        file = await gridfs_query.find({"filename": f"{doc_id}.pdf"}).to_list(1)
-        if file:
-            await gridfs_query.delete(file[0]["_id"])
+        async for file in gridfs_query.find({"filename": f"{owner}.pdf"}):
+            await gridfs_query.delete(file["_id"])
     # remove textbook replica
     with contextlib.suppress(Exception):
-        await delete_textbook_pdf(doc_id)
+        await delete_textbook_pdf(owner)
+    textbook_cache.drop(owner)
     logger.info(f"🗑️  cleaned up artefacts of {doc_id}")
 
 
+async def _send(websocket: WebSocket, payload: dict):
+    await websocket.send_json(payload)
+    metrics.WEBSOCKET_MESSAGES.inc(payload["status"])
+
+
+async def _disconnected(websocket: WebSocket):
+    """Returns once the client goes away (anything it sends is ignored)."""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def _next_event(queue: asyncio.Queue, gone: asyncio.Task):
+    """Wait for the next bus event; None once the client has gone away."""
+    getter = asyncio.create_task(queue.get())
+    await asyncio.wait({getter, gone}, return_when=asyncio.FIRST_COMPLETED)
+    if getter.done():
+        return getter.result()
+    getter.cancel()
+    return None
+
+
 async def forward_progress(websocket: WebSocket, document_id: str):
-    """Handle state change allowing frontend to connect and update seamlessly."""
+    """Push state changes and ingestion progress to the frontend as they happen."""
     logger.info(f"📡 WebSocket accepted for doc {document_id}")
+    metrics.WEBSOCKETS.inc()
+    # Subscribe before the first read so no transition can slip in between
+    queue = progress.subscribe(document_id)
+    gone = asyncio.create_task(_disconnected(websocket))
     try:
         db = get_db()
-        doc = await db.documents.find_one({"_id": document_id})
-        if not doc:
-            await websocket.send_json({"status": "NOT_FOUND"})
-            return
-        # Valid doc
+        doc = await db.documents.find_one({"_id": document_id}, {"status": 1, "progress": 1})
+        state = {"status": doc.get("status"), "progress": doc.get("progress")} if doc else {"deleted": True}
+        sent = None
         while True:
-            doc = await db.documents.find_one({"_id": document_id})
-            if not doc:
-                await websocket.send_json({"status": "NOT_FOUND"})
+            if state.get("deleted"):
+                await _send(websocket, {"status": "NOT_FOUND"})
                 return
             # Get status real-time
-            status = doc.get("status")
+            status = state.get("status")
             if status == "READY":
-                await websocket.send_json({
+                doc = await db.documents.find_one({"_id": document_id})
+                if not doc:
+                    await _send(websocket, {"status": "NOT_FOUND"})
+                    return
+                await _send(websocket, {
                     "status": "READY",
                     "id": doc["_id"],
                     "title": doc.get("title"),
@@ -52,15 +86,24 @@ async def forward_progress(websocket: WebSocket, document_id: str):
                 })
                 break
             elif status == "FAILED":
-                await websocket.send_json({"status": "FAILED"})
+                await _send(websocket, {"status": "FAILED"})
                 break
-            await asyncio.sleep(1.5)
+            update = {"status": status, "progress": state.get("progress")}
+            if update != sent:
+                await _send(websocket, update)
+                sent = update
+            event = await _next_event(queue, gone)
+            if event is None:
+                return
+            state = {**state, **event}
     except Exception as e:
         logger.exception(f"📡 WebSocket failed for doc {document_id}: {e}")
         try:
-            await websocket.send_json({"status": "ERROR"})
+            await _send(websocket, {"status": "ERROR"})
             await websocket.close()
         except Exception:
             pass
     finally:
+        gone.cancel()
+        progress.unsubscribe(document_id, queue)
         logger.info(f"📡 WebSocket closed for doc {document_id}")
@@ -0,0 +1,132 @@
+# app/services/blobs.py
+# Content-addressed index over stored PDFs (db.blobs, keyed by SHA-256).
+# The first document to store some content is its `owner`: the GridFS files
+# ({owner}.pdf) and db.embeddings rows (document_id=owner) belong to it.
+# Later documents with the same bytes only add themselves to `refs`.
+import contextlib, logging
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from app.db import get_db, get_gridfs, _get_textbook_fs, delete_textbook_pdf, TEXTBOOK_URI
+
+logger = logging.getLogger("book-query")
+
+
+async def ensure_indexes():
+    try:
+        await get_db().blobs.create_index("refs", name="refs")
+    except Exception as e:
+        logger.warning(f"⚠️ could not ensure blobs index: {e}")
+
+
+async def register(doc_id: str, stored: dict) -> dict:
+    """
+    Record that `doc_id` holds the content described by `stored` (transfer.stream_to_buckets output).
+    Returns the blob record; `owner != doc_id` or a pre-existing record means duplicate content.
+    """
+    blob = await get_db().blobs.find_one_and_update(
+        {"_id": stored["sha256"]},
+        {
+            "$addToSet": {"refs": doc_id},
+            "$setOnInsert": {
+                "owner": doc_id,
+                "size": stored["size"],
+                "file_id": stored["file_id"],
+                "replica_id": stored.get("replica_id"),
+                "created_at": datetime.now(timezone.utc),
+            },
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    blob["duplicate"] = blob["file_id"] != stored["file_id"]
+    return blob
+
+
+async def attach(doc_id: str, sha256: str) -> dict | None:
+    """Reference content someone else already stored (coalesced imports). None if it has since been deleted."""
+    blob = await get_db().blobs.find_one_and_update(
+        {"_id": sha256}, {"$addToSet": {"refs": doc_id}}, return_document=ReturnDocument.AFTER
+    )
+    if blob is not None:
+        blob["duplicate"] = blob["owner"] != doc_id
+    return blob
+
+
+async def discard_upload(stored: dict):
+    """Drop the copies we just streamed in – the content already exists under its owner."""
+    with contextlib.suppress(Exception):
+        await get_gridfs().delete(stored["file_id"])
+    if stored.get("replica_id") and TEXTBOOK_URI:
+        with contextlib.suppress(Exception):
+            await _get_textbook_fs().delete(stored["replica_id"])
+
+
+async def storage_id(doc_id: str) -> str:
+    """Document id whose GridFS files and embeddings hold this document's content."""
+    doc = await get_db().documents.find_one({"_id": doc_id}, {"blob.owner": 1})
+    return ((doc or {}).get("blob") or {}).get("owner") or doc_id
+
+
+async def embeddings_ready(owner: str) -> bool:
+    job = await get_db().ingest_jobs.find_one({"_id": owner}, {"status": 1})
+    return bool(job) and job.get("status") == "DONE"
+
+
+async def propagate_status(owner: str, status: str):
+    """Mirror the owner's ingestion outcome onto every document sharing its content."""
+    await get_db().documents.update_many(
+        {"blob.owner": owner, "_id": {"$ne": owner}}, {"$set": {"status": status}}
+    )
+
+
+async def release(doc_id: str, sha256: str | None = None) -> str | None:
+    """
+    Drop `doc_id`'s reference (to the blob `sha256`, if given). Returns the owner id whose
+    artefacts must now be deleted when this was the last reference, otherwise None.
+    Documents stored before the blob index existed own their artefacts outright.
+    """
+    db = get_db()
+    blob = await db.blobs.find_one_and_update(
+        {"refs": doc_id} if sha256 is None else {"_id": sha256, "refs": doc_id},
+        {"$pull": {"refs": doc_id}}, return_document=ReturnDocument.AFTER
+    )
+    if blob is None:
+        return doc_id if sha256 is None else None
+    if blob["refs"]:
+        logger.info(f"🔗 {doc_id} released blob {blob['_id'][:12]}… ({len(blob['refs'])} refs left)")
+        return None
+    # Only delete if nobody re-attached in the meantime
+    result = await db.blobs.delete_one({"_id": blob["_id"], "refs": {"$size": 0}})
+    return blob["owner"] if result.deleted_count else None
+
+
+async def release_previous(doc_id: str, sha256: str):
+    """
+    `doc_id` now holds the content `sha256`: release whatever it held before, and
+    delete that content once nothing references it. The owner's embeddings, job and
+    index go too unless the owner still owns some blob (it was re-uploaded with new
+    content under the same id, and ingestion is rewriting them).
+    """
+    from app.services import textbook_cache, vector_index
+    db = get_db()
+    previous = await db.blobs.find(
+        {"refs": doc_id, "_id": {"$ne": sha256}}, {"file_id": 1, "replica_id": 1}
+    ).to_list(None)
+    for old in previous:
+        owner = await release(doc_id, old["_id"])
+        if owner is None:
+            continue
+        # The stored copies are addressed by id: a newer upload may share their filename
+        with contextlib.suppress(Exception):
+            await get_gridfs().delete(old["file_id"])
+        if old.get("replica_id") and TEXTBOOK_URI:
+            with contextlib.suppress(Exception):
+                await _get_textbook_fs().delete(old["replica_id"])
+        if await db.blobs.find_one({"owner": owner}, {"_id": 1}) is None:
+            await db.embeddings.delete_many({"document_id": owner})
+            await db.ingest_jobs.delete_one({"_id": owner})
+            if not old.get("replica_id"):
+                await delete_textbook_pdf(owner)   # stored before blobs recorded the replica
+            vector_index.drop(owner)
+            textbook_cache.drop(owner)
+        logger.info(f"🗑️  {doc_id} moved to new content, released blob {old['_id'][:12]}… of {owner}")
@@ -0,0 +1,314 @@
+# app/services/catalog.py
+# Local catalog of every record the providers have returned.
+# Records are merged into "works" (same ISBN, else same normalized title), so a
+# book found on three providers is one entry with three source records.
+#   - inverted index: title/author token → work ids
+#   - prefix index:   sorted token vocabulary, bisected for "calc" → calculus, …
+#   - coverage:       which (order-insensitive) queries were answered upstream, when
+# A repeat query with fresh coverage is answered from here without any provider call.
+# Works and coverage are shared through Mongo (db.catalog, db.catalog_queries).
+import asyncio, bisect, heapq, json, os, re, time, logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pymongo import ReplaceOne
+from app.db import get_db
+
+logger = logging.getLogger("book-query")
+
+CATALOG_TTL       = float(os.getenv("CATALOG_TTL", "21600"))            # repeat queries answered locally for 6 h
+CATALOG_WORK_DAYS = float(os.getenv("CATALOG_WORK_DAYS", "30"))         # works kept in Mongo after last sighting
+CATALOG_MAX_WORKS = int(os.getenv("CATALOG_MAX_WORKS", "50000"))        # in-memory works per process
+CATALOG_WARM      = int(os.getenv("CATALOG_WARM_WORKS", "5000"))        # loaded at startup; the rest on demand
+WARM_BATCH        = 500                                                 # works indexed between yields to the loop
+CATALOG_MONGO     = os.getenv("CATALOG_MONGO", "1") == "1"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+_works: OrderedDict[str, dict] = OrderedDict()       # work id → {title, author, year, isbns, items, seen_at}
+_by_isbn: dict[str, str] = {}
+_by_title: dict[str, str] = {}
+_postings: dict[str, set[str]] = {}
+_vocab: list[str] = []                               # sorted keys of _postings
+_coverage: OrderedDict[str, tuple[float, list[str]]] = OrderedDict()   # query key → (fetched_at, work ids)
+_stats = {"hits": 0, "shared_hits": 0, "misses": 0, "suggestions": 0}
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN.findall((text or "").lower())
+
+def _norm_title(title: str) -> str:
+    return "".join(_tokens(title))
+
+def _isbn(value) -> str:
+    digits = re.sub(r"[^0-9Xx]", "", str(value or "")).upper()
+    return digits if len(digits) in (10, 13) else ""
+
+def query_key(tokens: list[str]) -> str:
+    return " ".join(sorted(set(tokens)))
+
+def _item_key(item: dict) -> str:
+    return f"{item.get('source')}:{json.dumps(item.get('ref'), sort_keys=True, default=str)}"
+
+
+# ────────────────────────────────────────────────────────────────
+# In-memory index
+# ────────────────────────────────────────────────────────────────
+def _index(work_id: str, work: dict, add: bool):
+    for token in set(_tokens(work["title"]) + _tokens(work.get("author"))):
+        if add:
+            if token not in _postings:
+                _postings[token] = set()
+                bisect.insort(_vocab, token)
+            _postings[token].add(work_id)
+        elif token in _postings:
+            _postings[token].discard(work_id)
+            if not _postings[token]:
+                del _postings[token]
+                del _vocab[bisect.bisect_left(_vocab, token)]
+
+def _forget(work_id: str):
+    work = _works.pop(work_id, None)
+    if work is None:
+        return
+    _index(work_id, work, add=False)
+    for isbn in work["isbns"]:
+        if _by_isbn.get(isbn) == work_id:
+            del _by_isbn[isbn]
+    if _by_title.get(_norm_title(work["title"])) == work_id:
+        del _by_title[_norm_title(work["title"])]
+
+def _rank(work: dict) -> tuple:
+    """Suggestion order: downloadable first, then found on more sources, then shorter titles."""
+    return (-any(i.get("download_available") for i in work["items"].values()), -len(work["items"]), len(work["title"]))
+
+def _put(work_id: str, work: dict):
+    if work_id in _works:
+        _forget(work_id)
+    work["rank"] = _rank(work)
+    _works[work_id] = work
+    _index(work_id, work, add=True)
+    for isbn in work["isbns"]:
+        _by_isbn[isbn] = work_id
+    _by_title.setdefault(_norm_title(work["title"]), work_id)
+    while len(_works) > CATALOG_MAX_WORKS:
+        _forget(next(iter(_works)))
+
+def _merge(item: dict, now: float) -> str | None:
+    """Fold one provider record into its work; returns the work id."""
+    title = item.get("title")
+    if not title or not _norm_title(title):
+        return None
+    isbn = _isbn(item.get("isbn"))
+    work_id = (_by_isbn.get(isbn) if isbn else None) or _by_title.get(_norm_title(title))
+    work = _works.get(work_id) if work_id else None
+    if work is None:
+        work_id = f"isbn:{isbn}" if isbn else f"title:{_norm_title(title)}"
+        work = {"title": title, "author": item.get("author") or "", "year": item.get("year"), "isbns": [], "items": {}}
+    work = {**work, "items": dict(work["items"]), "isbns": list(work["isbns"]), "seen_at": now}
+    if isbn and isbn not in work["isbns"]:
+        work["isbns"].append(isbn)
+    if not work.get("author") and item.get("author"):
+        work["author"] = item["author"]
+    work["items"][_item_key(item)] = {k: v for k, v in item.items() if k != "candidate_id"}
+    _put(work_id, work)
+    return work_id
+
+def _cover(key: str, fetched_at: float, work_ids: list[str]):
+    _coverage[key] = (fetched_at, work_ids)
+    _coverage.move_to_end(key)
+    while len(_coverage) > CATALOG_MAX_WORKS:
+        _coverage.popitem(last=False)
+
+def _prefix_ids(token: str) -> set[str]:
+    ids: set[str] = set()
+    i = bisect.bisect_left(_vocab, token)
+    while i < len(_vocab) and _vocab[i].startswith(token):
+        ids |= _postings[_vocab[i]]
+        i += 1
+    return ids
+
+def _match(tokens: list[str]) -> list[str]:
+    """Work ids whose title/author has a word starting with every query token."""
+    ids = None
+    # Rarest-looking (longest) tokens first keeps the intersection small
+    for token in sorted(set(tokens), key=len, reverse=True):
+        found = _prefix_ids(token)
+        ids = found if ids is None else ids & found
+        if not ids:
+            return []
+    return list(ids or [])
+
+
+# ────────────────────────────────────────────────────────────────
+# Shared Mongo tier
+# ────────────────────────────────────────────────────────────────
+def _to_doc(work: dict) -> dict:
+    return {
+        "title": work["title"], "author": work["author"], "year": work.get("year"),
+        "isbns": work["isbns"], "items": list(work["items"].values()),
+        "seen_at": work["seen_at"],
+        "expires_at": datetime.now(timezone.utc) + timedelta(days=CATALOG_WORK_DAYS),
+    }
+
+def _from_doc(doc: dict) -> dict:
+    return {
+        "title": doc["title"], "author": doc.get("author") or "", "year": doc.get("year"),
+        "isbns": doc.get("isbns", []), "items": {_item_key(i): i for i in doc.get("items", [])},
+        "seen_at": doc.get("seen_at", 0.0),
+    }
+
+async def _load_works(work_ids: list[str]):
+    missing = [w for w in work_ids if w not in _works]
+    if not missing or not CATALOG_MONGO:
+        return
+    try:
+        async for doc in get_db().catalog.find({"_id": {"$in": missing}}):
+            _put(doc["_id"], _from_doc(doc))
+    except Exception as e:
+        logger.debug(f"[catalog] work lookup failed: {e}")
+
+async def _shared_coverage(key: str):
+    if not CATALOG_MONGO:
+        return None
+    try:
+        doc = await get_db().catalog_queries.find_one({"_id": key})
+    except Exception as e:
+        logger.debug(f"[catalog] coverage lookup failed for {key!r}: {e}")
+        return None
+    if not doc or time.time() - doc["fetched_at"] >= CATALOG_TTL:
+        return None
+    _cover(key, doc["fetched_at"], doc["work_ids"])
+    return _coverage[key]
+
+
+# ────────────────────────────────────────────────────────────────
+# Public
+# ────────────────────────────────────────────────────────────────
+async def lookup(tokens: list[str]) -> list[dict] | None:
+    """Provider records for a repeat query, or None when upstream has to be asked."""
+    key = query_key(tokens)
+    if not key:
+        return None
+    entry = _coverage.get(key)
+    if entry is None or time.time() - entry[0] >= CATALOG_TTL:
+        entry = await _shared_coverage(key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _stats["shared_hits"] += 1
+    else:
+        _stats["hits"] += 1
+    await _load_works(entry[1])   # evicted here, or first seen by another worker
+    # Works upstream returned for this query first, then other catalog matches
+    ordered = list(dict.fromkeys([w for w in entry[1] if w in _works] + _match(tokens)))
+    return [dict(item) for w in ordered for item in _works[w]["items"].values()]
+
+async def record(tokens: list[str], items: list[dict], complete: bool):
+    """Remember provider results; `complete` (every provider answered) marks the query as covered."""
+    now = time.time()
+    work_ids = list(dict.fromkeys(w for w in (_merge(item, now) for item in items) if w))
+    key = query_key(tokens)
+    if complete and key:
+        _cover(key, now, work_ids)
+    if not CATALOG_MONGO:
+        return
+    try:
+        if work_ids:
+            await get_db().catalog.bulk_write(
+                [ReplaceOne({"_id": w}, _to_doc(_works[w]), upsert=True) for w in work_ids if w in _works],
+                ordered=False,
+            )
+        if complete and key:
+            await get_db().catalog_queries.replace_one(
+                {"_id": key},
+                {"work_ids": work_ids, "fetched_at": now,
+                 "expires_at": datetime.now(timezone.utc) + timedelta(seconds=CATALOG_TTL)},
+                upsert=True,
+            )
+    except Exception as e:
+        logger.debug(f"[catalog] store failed for {key!r}: {e}")
+
+def suggest(text: str, limit: int = 10) -> list[dict]:
+    """Autocomplete: one entry per work, every typed word matched as a prefix, best-ranked first."""
+    _stats["suggestions"] += 1
+    tokens = _tokens(text)
+    if not tokens:
+        return []
+    works = heapq.nsmallest(limit, (_works[w] for w in _match(tokens)), key=lambda w: w["rank"])
+    return [
+        {
+            "title": w["title"],
+            "author": w["author"],
+            "year": w.get("year"),
+            "isbn": w["isbns"][0] if w["isbns"] else "",
+            "sources": sorted({i.get("source") for i in w["items"].values()}),
+            "download_available": any(i.get("download_available") for i in w["items"].values()),
+        }
+        for w in works
+    ]
+
+def _put_warm(docs: list[dict]) -> int:
+    """
+    Warm-up: add stored works in bulk. They are older than anything a live search put
+    here meanwhile, so those win and these go to the cold end of the LRU. New tokens
+    are merged into the vocabulary once per batch instead of insort per token.
+    """
+    added, new_tokens = 0, []
+    for doc in docs:
+        work_id = doc["_id"]
+        if work_id in _works or len(_works) >= CATALOG_MAX_WORKS:
+            continue
+        work = _from_doc(doc)
+        work["rank"] = _rank(work)
+        _works[work_id] = work
+        _works.move_to_end(work_id, last=False)
+        for token in set(_tokens(work["title"]) + _tokens(work.get("author"))):
+            if token not in _postings:
+                _postings[token] = set()
+                new_tokens.append(token)
+            _postings[token].add(work_id)
+        for isbn in work["isbns"]:
+            _by_isbn.setdefault(isbn, work_id)
+        _by_title.setdefault(_norm_title(work["title"]), work_id)
+        added += 1
+    new_tokens.sort()
+    _vocab.extend(new_tokens)
+    _vocab.sort()   # two sorted runs: a linear merge
+    return added
+
+async def warm(limit: int = CATALOG_WARM):
+    """Fill the in-memory index from the shared catalog (most recently seen first), a batch at a time."""
+    if not CATALOG_MONGO or limit <= 0:
+        return
+    try:
+        added, batch = 0, []
+        async for doc in get_db().catalog.find().sort("seen_at", -1).limit(limit).batch_size(WARM_BATCH):
+            batch.append(doc)
+            if len(batch) >= WARM_BATCH:
+                added += _put_warm(batch)
+                batch = []
+                await asyncio.sleep(0)   # let requests in between batches
+        added += _put_warm(batch)
+        logger.info(f"📇 catalog warmed with {added} works")
+    except Exception as e:
+        logger.warning(f"⚠️ catalog warm-up failed: {e}")
+
+async def ensure_indexes():
+    if not CATALOG_MONGO:
+        return
+    try:
+        await get_db().catalog.create_index("expires_at", expireAfterSeconds=0, name="expires_ttl")
+        await get_db().catalog.create_index("seen_at", name="seen_at")
+        await get_db().catalog_queries.create_index("expires_at", expireAfterSeconds=0, name="expires_ttl")
+    except Exception as e:
+        logger.warning(f"⚠️ could not ensure catalog indexes: {e}")
+
+def stats() -> dict:
+    lookups = _stats["hits"] + _stats["shared_hits"] + _stats["misses"]
+    return {
+        "works": len(_works),
+        "tokens": len(_vocab),
+        "covered_queries": len(_coverage),
+        **_stats,
+        "hit_rate": round((_stats["hits"] + _stats["shared_hits"]) / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,58 @@
+# app/services/chunker.py
+# Split extracted pages into encoder-sized chunks.
+# Chunks are windows of CHUNK_TOKENS word pieces (CHUNK_OVERLAP shared with the
+# previous window) cut at the tokenizer's character offsets, so the stored text
+# is exactly what was embedded. Chunks never span pages: every chunk keeps its
+# page number, and batches of whole pages keep checkpoints on page boundaries.
+import os, re
+from app.services import embedder
+
+CHUNK_TOKENS  = int(os.getenv("CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "32"))
+
+_WORD = re.compile(r"\S+")
+
+
+def window() -> tuple[int, int]:
+    """(size, overlap) in tokens, capped to what the encoder actually reads."""
+    size = max(1, min(CHUNK_TOKENS, embedder.max_tokens()))
+    return size, max(0, min(CHUNK_OVERLAP, size // 2))
+
+
+def signature() -> str:
+    """Identifies the chunking scheme; a checkpoint from a different one can't be resumed."""
+    return f"{embedder.MODEL_NAME}:{CHUNK_TOKENS}:{CHUNK_OVERLAP}"
+
+
+def _spans(text: str, offsets: list[tuple[int, int]], size: int, overlap: int):
+    n = len(offsets)
+    if n <= size:
+        yield text
+        return
+    step = size - overlap
+    for start in range(0, n, step):
+        end = min(start + size, n)
+        yield text[offsets[start][0]:offsets[end - 1][1]]
+        if end == n:
+            break
+
+
+def _offsets(texts: list[str]) -> list[list[tuple[int, int]]]:
+    tokenizer = embedder.tokenizer()
+    if getattr(tokenizer, "is_fast", False):
+        enc = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True,
+                        return_attention_mask=False, truncation=False, verbose=False)
+        return [[(s, e) for s, e in offs if e > s] for offs in enc["offset_mapping"]]
+    # Slow tokenizers have no offsets: fall back to whitespace words
+    return [[m.span() for m in _WORD.finditer(text)] for text in texts]
+
+
+def chunk_pages(pages: list[tuple[int, str]]) -> list[tuple[int, str]]:
+    """[(page_no, text)] → [(page_no, chunk_text)] in reading order."""
+    size, overlap = window()
+    chunks = []
+    for (page_no, text), offsets in zip(pages, _offsets([text for _, text in pages])):
+        for chunk in _spans(text, offsets, size, overlap):
+            if chunk.strip():
+                chunks.append((page_no, chunk))
+    return chunks
@@ -0,0 +1,94 @@
+# app/services/embedder.py
+# sentence_transformers (and torch under it) is imported, and the weights loaded,
+# by the first ingestion or /search/semantic call rather than at startup, so a
+# worker that only serves /search or /health never pays for them. EMBEDDING_WARMUP=1
+# loads at startup instead; GUNICORN_PRELOAD=1 loads once in the gunicorn master.
+import os, threading, logging
+from typing import TYPE_CHECKING
+import app.config
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger("book-query")
+
+MODEL_NAME   = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+ENCODE_BATCH = int(os.getenv("ENCODE_BATCH", "32"))   # texts per forward pass
+WARMUP       = os.getenv("EMBEDDING_WARMUP", "0") == "1"   # 1: load at worker startup, not on first encode
+
+# One encoder per process – every ingestion path goes through here
+_model: "SentenceTransformer | None" = None
+_lock  = threading.Lock()
+_error: str | None = None
+_threads: int | None = None   # torch threads to restore after a preload fork
+
+
+def get_model() -> "SentenceTransformer":
+    """Load the SentenceTransformer once and hand back the shared instance."""
+    global _model, _error
+    if _model is None:
+        with _lock:
+            if _model is None:
+                try:
+                    logger.info(f"🧠 Loading embedding model {MODEL_NAME}...")
+                    from sentence_transformers import SentenceTransformer
+                    _model = SentenceTransformer(MODEL_NAME, cache_folder=app.config.MODEL_CACHE_DIR)
+                    _error = None
+                    logger.info(f"🧠 Embedding model {MODEL_NAME} ready")
+                except Exception as e:
+                    _error = str(e)
+                    raise
+    return _model
+
+
+def warmup():
+    """Load the weights and run one tiny encode so the first upload doesn't pay for it."""
+    try:
+        get_model().encode(["warm-up"])
+    except Exception as e:
+        logger.error(f"❌ Embedding model warm-up failed: {e}")
+
+
+def preload():
+    """
+    Load the weights in the gunicorn master so forked workers share them copy-on-write.
+    No forward pass, and torch single-threaded while loading: an OpenMP pool started
+    before fork() hangs in the children. after_fork() gives workers their threads back.
+    """
+    global _threads
+    import torch
+    _threads = torch.get_num_threads()
+    torch.set_num_threads(1)
+    get_model()
+
+
+def after_fork():
+    if _threads is not None:
+        import torch
+        torch.set_num_threads(_threads)
+
+
+def is_ready() -> bool:
+    return _model is not None
+
+
+def status() -> dict:
+    return {"model": MODEL_NAME, "ready": is_ready(), "error": _error}
+
+
+def tokenizer():
+    return get_model().tokenizer
+
+
+def max_tokens() -> int:
+    """Word pieces the model reads per text, excluding [CLS]/[SEP]; anything longer is truncated."""
+    return get_model().max_seq_length - 2
+
+
+def encode(texts: list[str]):
+    """
+    Embed a list of chunk texts with the shared model (numpy array, one row per text).
+    SentenceTransformer.encode already sorts each call by length, so every forward
+    pass pads to similar lengths without any ordering here.
+    """
+    return get_model().encode(texts, batch_size=ENCODE_BATCH, convert_to_numpy=True)
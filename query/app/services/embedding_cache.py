@@ -0,0 +1,109 @@
+# app/services/embedding_cache.py
+# Chunk embeddings keyed by sha256(model, normalized text).
+# Front matter, licence boilerplate, running headers and re-ingested books repeat
+# the same chunks; only texts missing from both tiers reach the encoder.
+# The shared tier is db.embeddings itself: ingestion stamps every row with its
+# text_key, so a vector is stored once, with its chunk, and nowhere else.
+import hashlib, os, unicodedata, logging
+from collections import OrderedDict
+import numpy as np
+from pymongo import ASCENDING
+from app.db import get_db
+from app.services import embedder, jobs, vectors
+
+logger = logging.getLogger("book-query")
+
+# ~1.9 KB per entry at 384 dims (1.5 KB of float32 plus key, array and dict overhead),
+# so the default is ~4 MB per worker; the shared tier catches what falls out
+EMBED_CACHE_SIZE  = int(os.getenv("EMBED_CACHE_SIZE", "2000"))        # vectors kept per process
+EMBED_CACHE_MONGO = os.getenv("EMBED_CACHE_MONGO", "1") == "1"        # look up stored chunks across workers
+
+_local: OrderedDict[str, np.ndarray] = OrderedDict()
+_stats = {"lookups": 0, "local_hits": 0, "shared_hits": 0, "misses": 0}
+
+
+def key(text: str, model: str = embedder.MODEL_NAME) -> str:
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def _put_local(k: str, vec: np.ndarray):
+    _local[k] = vec
+    _local.move_to_end(k)
+    while len(_local) > EMBED_CACHE_SIZE:
+        _local.popitem(last=False)
+
+
+async def _get_shared(keys: list[str]) -> dict[str, np.ndarray]:
+    if not EMBED_CACHE_MONGO or not keys:
+        return {}
+    found = {}
+    try:
+        cursor = get_db().embeddings.find(
+            {"text_key": {"$in": keys}}, {"_id": 0, "text_key": 1, "embedding": 1, "embedding_scale": 1}
+        )
+        # Boilerplate can sit in many documents; one row per key is enough
+        async for row in cursor:
+            found.setdefault(row["text_key"], vectors.decode_vector(row))
+            if len(found) == len(keys):
+                break
+    except Exception as e:
+        logger.debug(f"[embed-cache] shared lookup failed: {e}")
+    return found
+
+
+async def encode(texts: list[str]) -> np.ndarray:
+    """Drop-in for embedder.encode: cached rows are reused, misses are encoded once each."""
+    keys = [key(t) for t in texts]
+    found: dict[str, np.ndarray] = {}
+    for k in keys:
+        if k not in found and (vec := _local.get(k)) is not None:
+            _local.move_to_end(k)
+            found[k] = vec
+    local_found = set(found)
+    shared = await _get_shared([k for k in dict.fromkeys(keys) if k not in found])
+    for k, vec in shared.items():
+        _put_local(k, vec)
+    found.update(shared)
+
+    # Unique misses only – identical chunks inside one batch are encoded once
+    missing = {}
+    for i, k in enumerate(keys):
+        if k not in found and k not in missing:
+            missing[k] = i
+    if missing:
+        idx = list(missing.values())
+        encoded = await jobs.run_blocking(embedder.encode, [texts[i] for i in idx])
+        fresh = {k: np.asarray(encoded[j], dtype=np.float32) for j, k in enumerate(missing)}
+        for k, vec in fresh.items():
+            _put_local(k, vec)
+        found.update(fresh)
+
+    _stats["lookups"] += len(keys)
+    for k in keys:
+        if k in local_found:
+            _stats["local_hits"] += 1
+        elif k in shared:
+            _stats["shared_hits"] += 1
+    _stats["misses"] += len(missing)
+    return np.stack([found[k] for k in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+
+def stats() -> dict:
+    lookups = _stats["lookups"]
+    return {
+        "entries": len(_local),
+        **_stats,
+        # Share of chunks the encoder skipped (cache hits plus repeats inside one batch)
+        "hit_rate": round((lookups - _stats["misses"]) / lookups, 4) if lookups else 0.0,
+    }
+
+
+async def ensure_indexes():
+    if not EMBED_CACHE_MONGO:
+        return
+    try:
+        # Sparse: rows written before text_key existed simply never match
+        await get_db().embeddings.create_index([("text_key", ASCENDING)], sparse=True, name="text_key")
+    except Exception as e:
+        logger.warning(f"⚠️ could not ensure embedding cache index: {e}")
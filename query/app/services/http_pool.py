@@ -0,0 +1,112 @@
+# app/services/http_pool.py
+import asyncio, os, logging
+import httpx
+
+logger = logging.getLogger("book-query")
+
+HTTP_TIMEOUT          = float(os.getenv("HTTP_TIMEOUT", "10"))          # read/write/pool seconds
+HTTP_CONNECT_TIMEOUT  = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS  = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE    = int(os.getenv("HTTP_MAX_KEEPALIVE", "40"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_PER_HOST         = int(os.getenv("HTTP_MAX_PER_HOST", "10"))       # concurrent requests per host
+HTTP_HTTP2            = os.getenv("HTTP_HTTP2", "0") == "1"             # needs the optional `h2` package
+
+# One pooled, keep-alive client shared by every provider and the PDF downloader
+_client: httpx.AsyncClient | None = None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that gives the host slot back once the body is closed."""
+    def __init__(self, inner, sem: asyncio.Semaphore):
+        self._inner, self._sem, self._released = inner, sem, False
+
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._inner.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._sem.release()
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Caps in-flight requests per host on top of httpx's global pool limits."""
+    def __init__(self, inner: httpx.AsyncBaseTransport, per_host: int):
+        self._inner, self._per_host = inner, per_host
+        self._sems: dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        sem = self._sems.setdefault(request.url.host, asyncio.Semaphore(self._per_host))
+        await sem.acquire()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except BaseException:
+            sem.release()
+            raise
+        if response.is_stream_consumed:   # body already loaded (e.g. in-memory stand-ins)
+            sem.release()
+        else:
+            response.stream = _ReleasingStream(response.stream, sem)
+        return response
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+def _http2_available() -> bool:
+    if not HTTP_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("⚠️ HTTP_HTTP2=1 but `h2` is not installed, falling back to HTTP/1.1")
+        return False
+
+
+def pooled_transport() -> httpx.AsyncHTTPTransport:
+    """The keep-alive connection pool behind the shared client."""
+    return httpx.AsyncHTTPTransport(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        retries=1,  # connect retries only
+    )
+
+
+def build_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    """Create the shared client; `transport` lets tests/benchmarks route to local stand-ins."""
+    return httpx.AsyncClient(
+        transport=HostLimitedTransport(transport or pooled_transport(), HTTP_PER_HOST),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        follow_redirects=True,
+        headers={"User-Agent": "QuerySearcher/1.0"},
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client()
+    return _client
+
+
+def set_client(client: httpx.AsyncClient | None):
+    """Swap in a different client (e.g. one pointed at a local stand-in server)."""
+    global _client
+    _client = client
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,163 @@
+# app/services/import_flights.py
+# Single-flight coalescing for /import on (source, ref).
+# Within a process, concurrent callers share one asyncio future. Across workers,
+# a lease in db.import_flights elects one leader; every other worker polls the
+# record until the leader publishes its outcome (or its lease runs out and
+# someone takes over). Finished flights stay reusable for FLIGHT_REUSE_SECONDS.
+#
+#   {_id: key, state: RUNNING|DONE|FAILED, worker, outcome | error, expires_at}
+import asyncio, hashlib, json, os, logging
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+from app.db import get_db
+from app.services import jobs
+
+logger = logging.getLogger("book-query")
+
+FLIGHT_LEASE_SECONDS = float(os.getenv("IMPORT_FLIGHT_LEASE_SECONDS", "60"))    # renewed while the leader works
+FLIGHT_REUSE_SECONDS = float(os.getenv("IMPORT_FLIGHT_REUSE_SECONDS", "600"))   # late joiners reuse a finished flight
+FLIGHT_POLL_SECONDS  = float(os.getenv("IMPORT_FLIGHT_POLL_SECONDS", "0.5"))
+
+
+class FlightFailed(Exception):
+    """The leader's import failed; carries the HTTP status/detail it ended with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code, self.detail = status_code, detail
+
+
+_local: dict[str, asyncio.Future] = {}
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def flight_key(source: str, ref) -> str:
+    return hashlib.sha256(json.dumps([source, ref], sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def ensure_indexes():
+    try:
+        await get_db().import_flights.create_index("expires_at", expireAfterSeconds=0, name="expires_ttl")
+    except Exception as e:
+        logger.warning(f"⚠️ could not ensure import flight index: {e}")
+
+
+async def _acquire(key: str) -> bool:
+    """Take the lease if nobody holds it, or the holder's lease/outcome has expired."""
+    now = _now()
+    try:
+        await get_db().import_flights.update_one(
+            {"_id": key, "expires_at": {"$lt": now}},
+            {"$set": {"state": "RUNNING", "worker": jobs.WORKER_ID, "started_at": now,
+                      "expires_at": now + timedelta(seconds=FLIGHT_LEASE_SECONDS)},
+             "$unset": {"outcome": "", "error": ""}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _heartbeat(key: str):
+    """Renew the lease until cancelled; returns only once another worker has taken the flight over."""
+    while True:
+        await asyncio.sleep(FLIGHT_LEASE_SECONDS / 3)
+        try:
+            result = await get_db().import_flights.update_one(
+                {"_id": key, "worker": jobs.WORKER_ID, "state": "RUNNING"},
+                {"$set": {"expires_at": _now() + timedelta(seconds=FLIGHT_LEASE_SECONDS)}},
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ import flight lease renewal failed: {e}")
+            continue
+        if not result.matched_count:
+            return
+
+
+class _LeaseLost(Exception):
+    """Our lease ran out and another worker now leads the flight."""
+
+
+async def _finish(key: str, update: dict, keep_for: float):
+    try:
+        await get_db().import_flights.update_one(
+            {"_id": key, "worker": jobs.WORKER_ID},
+            {"$set": {**update, "expires_at": _now() + timedelta(seconds=keep_for)}},
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ could not record import flight outcome: {e}")
+
+
+async def _lead(key: str, lead) -> dict:
+    work = asyncio.create_task(lead())
+    beat = asyncio.create_task(_heartbeat(key))
+    try:
+        await asyncio.wait((work, beat), return_when=asyncio.FIRST_COMPLETED)
+        if not work.done():
+            raise _LeaseLost(key)
+        outcome = work.result()
+    except _LeaseLost:
+        raise
+    except Exception as e:
+        # Failures are kept just long enough for waiting workers to see them
+        error = {"status_code": getattr(e, "status_code", 500), "detail": getattr(e, "detail", str(e))}
+        await _finish(key, {"state": "FAILED", "error": error}, FLIGHT_POLL_SECONDS * 4)
+        raise
+    except BaseException:
+        await _finish(key, {"state": "FAILED", "error": {"status_code": 500, "detail": "Import interrupted"}}, 0)
+        raise
+    finally:
+        beat.cancel()
+        if not work.done():
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+    await _finish(key, {"state": "DONE", "outcome": outcome}, FLIGHT_REUSE_SECONDS)
+    return outcome
+
+
+async def _lead_or_wait(key: str, lead) -> tuple[dict, bool]:
+    while True:
+        if await _acquire(key):
+            try:
+                return await _lead(key, lead), True
+            except _LeaseLost:
+                # Someone else leads now: wait for their outcome like any other follower
+                logger.warning(f"⚠️ lost the import flight lease on {key[:12]}…, following the new leader")
+                continue
+        record = await get_db().import_flights.find_one({"_id": key})
+        if record and record.get("state") == "DONE":
+            return record["outcome"], False
+        if record and record.get("state") == "FAILED":
+            raise FlightFailed(**record["error"])
+        await asyncio.sleep(FLIGHT_POLL_SECONDS)
+
+
+async def run(key: str, lead) -> tuple[dict, bool]:
+    """
+    Run `lead()` at most once per key across all workers; every caller gets its outcome.
+    Returns (outcome, led) – `led` is True only for the caller whose `lead()` ran.
+    """
+    while (pending := _local.get(key)) is not None:
+        try:
+            return await asyncio.shield(pending), False
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise   # this caller was cancelled, not the flight
+    future = asyncio.get_running_loop().create_future()
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())   # fine if nobody else waited
+    _local[key] = future
+    try:
+        outcome, led = await _lead_or_wait(key, lead)
+        future.set_result(outcome)
+        return outcome, led
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        _local.pop(key, None)
@@ -1,49 +1,210 @@
 # app/services/ingest.py
 import os
-import fitz  # PyMuPDF - convert PDF to plaintext for semantic embedding
-import io
+import asyncio
+import tempfile
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from pymongo import ASCENDING, ReplaceOne
 from app.db import get_db, get_gridfs
-import app.config
-from sentence_transformers import SentenceTransformer
+from app.services import embedding_cache, jobs, pdf_text, blobs, vectors, vector_index, chunker, progress, metrics
+from app.services.lexical_index import LexicalBuilder
 
-async def parse_and_index(document_id: str):
+PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))  # pages per extraction task
+EMBED_BATCH    = int(os.getenv("INGEST_EMBED_BATCH", "64"))     # pages per chunk/encode/insert batch
+PIPELINE_DEPTH = int(os.getenv("INGEST_PIPELINE_DEPTH", "4"))   # batches buffered between stages
+
+_DONE = object()
+
+logger = logging.getLogger("book-query")
+
+
+async def ensure_indexes():
+    """(document_id, chunk_id) is the idempotency key for every embeddings write."""
+    try:
+        await get_db().embeddings.create_index(
+            [("document_id", ASCENDING), ("chunk_id", ASCENDING)], unique=True, name="doc_chunk"
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ could not ensure embeddings index: {e}")
+
+
+async def _spool_pdf(document_id: str) -> tuple[str, object]:
+    """Stream the PDF out of GridFS into a temp file the extraction processes can open."""
+    # Open first: a missing file (NoFile) must not leave a temp file behind
+    stream = await get_gridfs().open_download_stream_by_name(f"{document_id}.pdf")
+    fd, path = tempfile.mkstemp(prefix=f"{document_id}-", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await stream.readchunk():
+                out.write(chunk)
+    except BaseException:
+        # The caller never sees `path`, so clean up here (cancellation included)
+        os.remove(path)
+        raise
+    return path, stream._id
+
+
+async def _load_checkpoint(document_id: str, file_id) -> dict:
+    """Resume point for this exact PDF, or a fresh start if the file changed."""
+    job = await get_db().ingest_jobs.find_one({"_id": document_id}, {"checkpoint": 1})
+    checkpoint = (job or {}).get("checkpoint") or {}
+    scheme = chunker.signature()
+    if checkpoint.get("file_id") != file_id or checkpoint.get("chunker") != scheme:
+        return {"file_id": file_id, "chunker": scheme, "next_page": 0, "next_chunk": 0}
+    return checkpoint
+
+
+def _extract(path: str, start: int, end: int) -> asyncio.Future:
+    """Submit one page range; its time in the pool (queueing included) is recorded when it completes."""
+    future = jobs.submit_process(pdf_text.extract_range, path, start, end)
+    submitted = time.perf_counter()
+    future.add_done_callback(
+        lambda _: metrics.INGEST_STAGE_SECONDS.observe(time.perf_counter() - submitted, "extract"))
+    return future
+
+
+async def _extract_stage(path: str, first_page: int, n_pages: int, out_q: asyncio.Queue, tracker: progress.Tracker):
+    """Fan page ranges out to the process pool, emit batches of whole pages in page order."""
+    ranges = iter([(s, min(s + PAGES_PER_TASK, n_pages)) for s in range(first_page, n_pages, PAGES_PER_TASK)])
+    pending = deque()
+    for start, end in ranges:
+        pending.append(_extract(path, start, end))
+        if len(pending) >= jobs.INGEST_PROCESSES * 2:
+            break
+    batch = []
+    while pending:
+        pages = await pending.popleft()
+        if pages:
+            await tracker.update(pages_extracted=pages[-1][0] + 1)
+        nxt = next(ranges, None)
+        if nxt:
+            pending.append(_extract(path, *nxt))
+        for page_no, text in pages:
+            batch.append((page_no, text))
+            if len(batch) >= EMBED_BATCH:
+                await out_q.put(batch)
+                batch = []
+    if batch:
+        await out_q.put(batch)
+    await out_q.put(_DONE)
+
+
+async def _embed_stage(in_q: asyncio.Queue, out_q: asyncio.Queue):
+    """Split a batch of pages into token windows; encode the uncached ones."""
+    while (pages := await in_q.get()) is not _DONE:
+        with metrics.INGEST_STAGE_SECONDS.time("chunk"):
+            batch = await jobs.run_blocking(chunker.chunk_pages, pages)
+        if not batch:
+            continue
+        with metrics.INGEST_STAGE_SECONDS.time("encode"):
+            embeddings = await embedding_cache.encode([text for _, text in batch])
+        await out_q.put((batch, embeddings))
+    await out_q.put(_DONE)
+
+
+async def _seed_lexical(document_id: str, next_chunk: int) -> LexicalBuilder:
+    """Lexical postings for chunks committed before a resume (text only, no re-embedding)."""
+    lexical = LexicalBuilder()
+    if next_chunk:
+        rows = get_db().embeddings.find(
+            {"document_id": document_id, "chunk_id": {"$lt": next_chunk}}, {"_id": 0, "text": 1}
+        ).sort("chunk_id", 1)
+        texts = [row.get("text", "") async for row in rows]
+        await jobs.run_blocking(lexical.add, texts)
+    return lexical
+
+
+async def _insert_stage(document_id: str, checkpoint: dict, in_q: asyncio.Queue, lexical: LexicalBuilder,
+                        tracker: progress.Tracker) -> int:
+    """Upsert each batch on (document_id, chunk_id), then advance the checkpoint past it."""
+    db = get_db()
+    chunk_id = checkpoint["next_chunk"]
+    while (item := await in_q.get()) is not _DONE:
+        batch, embeddings = item
+        ops = []
+        for (page_no, text), embedding in zip(batch, embeddings):
+            ops.append(ReplaceOne(
+                {"document_id": document_id, "chunk_id": chunk_id},
+                {
+                    "document_id": document_id,
+                    "chunk_id": chunk_id,
+                    "page": page_no,
+                    "text": text,
+                    "text_key": embedding_cache.key(text),
+                    **vectors.encode_vector(embedding)
+                },
+                upsert=True,
+            ))
+            chunk_id += 1
+        with metrics.INGEST_STAGE_SECONDS.time("insert"):
+            await db.embeddings.bulk_write(ops, ordered=False)
+        with metrics.INGEST_STAGE_SECONDS.time("lexical"):
+            await jobs.run_blocking(lexical.add, [text for _, text in batch])
+        metrics.INGEST_PAGES.inc(amount=batch[-1][0] + 1 - checkpoint["next_page"])
+        metrics.INGEST_CHUNKS.inc(amount=len(batch))
+        # Batches end on page boundaries, so everything before next_page is committed
+        checkpoint.update(next_page=batch[-1][0] + 1, next_chunk=chunk_id)
+        await db.ingest_jobs.update_one({"_id": document_id}, {"$set": {"checkpoint": checkpoint}})
+        await tracker.update(stage="embedding", pages_done=checkpoint["next_page"], chunks_embedded=chunk_id)
+    return chunk_id
+
+
+async def parse_and_index(document_id: str) -> bool:
     print(f"[INFO] Starting ingestion for document: {document_id}")
+    db = get_db()
+    path = tracker = None
+    started = time.perf_counter()
     try:
-        # Lazy model load
-        model = SentenceTransformer("all-MiniLM-L6-v2")
-        db = get_db()
-        grid_fs_bucket = get_gridfs()
-        # Load PDF from GridFS
-        buffer = io.BytesIO()
-        await grid_fs_bucket.download_to_stream_by_name(f"{document_id}.pdf", buffer)
-        buffer.seek(0)
-        # Extract text from PDF
-        text_chunks = []
-        with fitz.open(stream=buffer.read(), filetype="pdf") as doc:
-            for page in doc:
-                text = page.get_text("text")
-                if text.strip():
-                    text_chunks.append(text.strip())
-
-        if not text_chunks:
+        with metrics.INGEST_STAGE_SECONDS.time("spool"):
+            path, file_id = await _spool_pdf(document_id)
+        n_pages = await jobs.run_blocking(pdf_text.page_count, path)
+        checkpoint = await _load_checkpoint(document_id, file_id)
+        if checkpoint["next_page"]:
+            print(f"[INFO] Resuming {document_id} at page {checkpoint['next_page']}/{n_pages} (chunk {checkpoint['next_chunk']})")
+        first_page, first_chunk = checkpoint["next_page"], checkpoint["next_chunk"]
+        tracker = progress.Tracker(document_id, n_pages, first_page, first_chunk)
+        await tracker.update(force=True)
+        lexical = await _seed_lexical(document_id, checkpoint["next_chunk"])
+        # extract → embed → insert, overlapping through bounded queues
+        texts, embedded = asyncio.Queue(PIPELINE_DEPTH), asyncio.Queue(PIPELINE_DEPTH)
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(_extract_stage(path, checkpoint["next_page"], n_pages, texts, tracker))
+            tg.create_task(_embed_stage(texts, embedded))
+            inserted = tg.create_task(_insert_stage(document_id, checkpoint, embedded, lexical, tracker))
+        total = inserted.result()
+        # Drop rows left over from an older, longer version of this document
+        await db.embeddings.delete_many({"document_id": document_id, "chunk_id": {"$gte": total}})
+        if not total:
             raise ValueError("No text extracted from PDF.")
-        # Embed chunks
-        embeddings = model.encode(text_chunks, convert_to_tensor=True)
-        # Store in MongoDB
-        entries = [
-            {
-                "document_id": document_id,
-                "chunk_id": i,
-                "text": chunk,
-                "embedding": embedding.tolist()
-            }
-            for i, (chunk, embedding) in enumerate(zip(text_chunks, embeddings))
-        ]
-        await db.embeddings.insert_many(entries)
+        await tracker.update(force=True, stage="done", pages_done=n_pages, chunks_embedded=total)
         await db.documents.update_one({"_id": document_id}, {"$set": {"status": "READY"}})
+        await blobs.propagate_status(document_id, "READY")
+        # Version the finished index and write its shared memory-mapped copy
+        indexed_at = datetime.now(timezone.utc)
+        await db.ingest_jobs.update_one({"_id": document_id}, {"$set": {"indexed_at": indexed_at}})
+        with metrics.INGEST_STAGE_SECONDS.time("publish"):
+            await vector_index.publish(document_id, indexed_at, lexical if len(lexical) == total else None)
+        elapsed = time.perf_counter() - started
+        metrics.INGEST_PAGES_RATE.observe((n_pages - first_page) / elapsed)
+        metrics.INGEST_CHUNKS_RATE.observe((total - first_chunk) / elapsed)
+        metrics.INGEST_DOCUMENTS.inc("ok")
         # Log
-        print(f"[INFO] Finished indexing {len(entries)} chunks from document: {document_id}")
+        print(f"[INFO] Finished indexing {total} chunks from {n_pages} pages of document: {document_id}")
+        return True
     # Exception
     except Exception as e:
+        if isinstance(e, ExceptionGroup):
+            e = e.exceptions[0]
+        # Committed batches and the checkpoint are kept so a retry only does the missing work
         print(f"[ERROR] Ingestion failed for {document_id}: {e}")
+        metrics.INGEST_DOCUMENTS.inc("failed")
+        if tracker:
+            await tracker.update(force=True, stage="failed")
         await db.documents.update_one({"_id": document_id}, {"$set": {"status": "FAILED"}})
+        await blobs.propagate_status(document_id, "FAILED")
+        return False
+    finally:
+        if path:
+            os.remove(path)
@@ -1,26 +1,25 @@
 # app/services/internet_archive.py
-import httpx
-from tenacity import retry, stop_after_attempt, wait_fixed
+from app.services import http_pool
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def search(q):
     url = f"https://archive.org/advancedsearch.php?q={q}&output=json&rows=5"
-    async with httpx.AsyncClient(timeout=5) as client:
-        res = await client.get(url)
-        docs = res.json().get("response", {}).get("docs", [])
-        return [
-            {
-                "title": d.get("title"),
-                "author": d.get("creator", ""),
-                "edition": d.get("identifier"),
-                "year": d.get("year"),
-                "source": "ia",
-                "isbn": d.get("isbn", [""])[0] if d.get("isbn") else "",
-                "download_available": "public" in d.get("rights", "").lower(),
-                "download_url": f"https://archive.org/download/{d['identifier']}/{d['identifier']}.pdf" if "public" in d.get("rights", "").lower() else None,
-                "ref": {"id": d.get("identifier")}
-            } for d in docs if d.get("identifier")
-        ]
+    client = http_pool.get_client()
+    res = await client.get(url)
+    res.raise_for_status()   # a 429/5xx must reach the breaker, not be cached as no results
+    docs = res.json().get("response", {}).get("docs", [])
+    return [
+        {
+            "title": d.get("title"),
+            "author": d.get("creator", ""),
+            "edition": d.get("identifier"),
+            "year": d.get("year"),
+            "source": "ia",
+            "isbn": d.get("isbn", [""])[0] if d.get("isbn") else "",
+            "download_available": "public" in d.get("rights", "").lower(),
+            "download_url": f"https://archive.org/download/{d['identifier']}/{d['identifier']}.pdf" if "public" in d.get("rights", "").lower() else None,
+            "ref": {"id": d.get("identifier")}
+        } for d in docs if d.get("identifier")
+    ]
 
 async def fetch(ref):
     identifier = ref.get("id")
@@ -28,19 +27,19 @@ async def fetch(ref):
         return None
 
     url = f"https://archive.org/metadata/{identifier}"
-    async with httpx.AsyncClient(timeout=5) as client:
-        res = await client.get(url)
-        metadata = res.json()
-        rights = metadata.get("metadata", {}).get("rights", "")
-        files = metadata.get("files", [])
+    client = http_pool.get_client()
+    res = await client.get(url)
+    metadata = res.json()
+    rights = metadata.get("metadata", {}).get("rights", "")
+    files = metadata.get("files", [])
 
-        # Prefer the actual PDF file name
-        for f in files:
-            if f.get("format", "").lower() == "pdf" and f.get("name", "").endswith(".pdf"):
-                return {
-                    "download_available": "public" in rights.lower(),
-                    "download_url": f"https://archive.org/download/{identifier}/{f['name']}"
-                }
+    # Prefer the actual PDF file name
+    for f in files:
+        if f.get("format", "").lower() == "pdf" and f.get("name", "").endswith(".pdf"):
+            return {
+                "download_available": "public" in rights.lower(),
+                "download_url": f"https://archive.org/download/{identifier}/{f['name']}"
+            }
 
     return {"download_available": False}
 
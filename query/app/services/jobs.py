@@ -0,0 +1,260 @@
+# app/services/jobs.py
+import asyncio, os, socket, logging
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+from app.db import get_db
+
+logger = logging.getLogger("book-query")
+
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))    # documents indexed at once
+INGEST_QUEUE_MAX   = int(os.getenv("INGEST_QUEUE_MAX", "20"))     # waiting jobs before we push back
+INGEST_THREADS     = int(os.getenv("INGEST_THREADS", str(os.cpu_count() or 2)))
+INGEST_PROCESSES   = int(os.getenv("INGEST_PROCESSES", str(os.cpu_count() or 2)))  # PDF extraction
+JOB_LEASE_SECONDS  = int(os.getenv("INGEST_LEASE_SECONDS", "300"))
+SWEEP_SECONDS      = int(os.getenv("INGEST_SWEEP_SECONDS", "60"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"   # re-read in start(): preloaded workers are forked after import
+
+
+class QueueFull(Exception):
+    """Raised when the local ingestion queue has no room left."""
+
+
+# ────────────────────────────────────────────────────────────────
+# CPU pools – model.encode runs in threads (shared weights), PyMuPDF
+# page extraction runs in processes; neither ever blocks the loop
+# ────────────────────────────────────────────────────────────────
+_executor: ThreadPoolExecutor | None = None
+_processes: ProcessPoolExecutor | None = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=INGEST_THREADS, thread_name_prefix="ingest")
+    return _executor
+
+async def run_blocking(fn, *args):
+    """Run a blocking/CPU-bound call in the ingestion pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), fn, *args)
+
+def _get_processes() -> ProcessPoolExecutor:
+    global _processes
+    if _processes is None:
+        # spawn, not fork: the parent holds torch threads that don't survive a fork
+        _processes = ProcessPoolExecutor(max_workers=INGEST_PROCESSES, mp_context=mp.get_context("spawn"))
+    return _processes
+
+def submit_process(fn, *args) -> asyncio.Future:
+    """Schedule a picklable CPU-bound call in the process pool; returns an awaitable future."""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(_get_processes(), fn, *args)
+
+
+# ────────────────────────────────────────────────────────────────
+# Scheduler – bounded in-process queue backed by db.ingest_jobs
+# ────────────────────────────────────────────────────────────────
+_queue: asyncio.Queue | None = None
+_queued: set[str] = set()   # ids waiting in _queue, so neither submit() nor the sweep adds one twice
+_tasks: list[asyncio.Task] = []
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def has_capacity() -> bool:
+    return _queue is None or not _queue.full()
+
+def queue_depth() -> int:
+    return _queue.qsize() if _queue else 0
+
+def _enqueue(document_id: str):
+    _queued.add(document_id)
+    _queue.put_nowait(document_id)
+
+async def submit(document_id: str) -> str:
+    """
+    Persist a job record and enqueue it locally.
+    Returns "QUEUED"; raises QueueFull when the local queue is saturated
+    (the record stays QUEUED in Mongo and the sweeper picks it up later).
+    A job some worker is running under a live lease keeps its owner: it is
+    flagged to run again once that worker finishes, and "RUNNING" is returned.
+    """
+    db = get_db()
+    now = _now()
+    live = {"status": "RUNNING", "lease_until": {"$gt": now}}
+    try:
+        await db.ingest_jobs.update_one(
+            {"_id": document_id, "$nor": [live]},
+            {
+                "$set": {"status": "QUEUED", "updated_at": now, "owner": None, "lease_until": None},
+                "$setOnInsert": {"created_at": now, "attempts": 0},
+                "$unset": {"rerun": ""},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The record exists but is running: resetting it would start a second ingestion
+        await db.ingest_jobs.update_one({"_id": document_id, **live}, {"$set": {"rerun": True}})
+        logger.info(f"🧾 ingestion job {document_id} is running, will run again when it finishes")
+        return "RUNNING"
+    if document_id in _queued:
+        return "QUEUED"
+    if _queue is None or _queue.full():
+        raise QueueFull(document_id)
+    _enqueue(document_id)
+    logger.info(f"🧾 ingestion job {document_id} queued (depth={_queue.qsize()})")
+    return "QUEUED"
+
+async def running(document_id: str) -> dict | None:
+    """The job record if some worker is running it under a live lease, else None."""
+    return await get_db().ingest_jobs.find_one(
+        {"_id": document_id, "status": "RUNNING", "lease_until": {"$gt": _now()}},
+        {"status": 1, "owner": 1, "lease_until": 1},
+    )
+
+async def _claim(document_id: str) -> bool:
+    """Atomically move a job to RUNNING under this worker's lease."""
+    db = get_db()
+    now = _now()
+    job = await db.ingest_jobs.find_one_and_update(
+        {
+            "_id": document_id,
+            "$or": [
+                {"status": "QUEUED"},
+                {"status": "RUNNING", "lease_until": {"$lt": now}},
+            ],
+        },
+        {
+            "$set": {
+                "status": "RUNNING",
+                "owner": WORKER_ID,
+                "started_at": now,
+                "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS),
+            },
+            "$inc": {"attempts": 1},
+        },
+    )
+    return job is not None
+
+async def _heartbeat(document_id: str):
+    """Renew the lease until cancelled; returns only once the lease is lost to another worker."""
+    db = get_db()
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            result = await db.ingest_jobs.update_one(
+                {"_id": document_id, "owner": WORKER_ID},
+                {"$set": {"lease_until": _now() + timedelta(seconds=JOB_LEASE_SECONDS)}},
+            )
+        except Exception as e:
+            # Transient: the lease still has two renewals' worth of time left
+            logger.warning(f"⚠️ lease renewal for {document_id} failed: {e}")
+            continue
+        if not result.matched_count:
+            logger.warning(f"⚠️ lost the lease on ingestion job {document_id}, abandoning it")
+            return
+
+async def _run_job(document_id: str):
+    from app.services.ingest import parse_and_index
+    if not await _claim(document_id):
+        logger.debug(f"🧾 job {document_id} already claimed elsewhere, skipping")
+        return
+    db = get_db()
+    run = asyncio.create_task(parse_and_index(document_id))
+    beat = asyncio.create_task(_heartbeat(document_id))
+    try:
+        await asyncio.wait((run, beat), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        beat.cancel()
+        if not run.done():
+            # Lease lost (or shutting down): the next owner resumes from the checkpoint
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+    if run.cancelled():
+        return
+    try:
+        ok = run.result()
+    except Exception as e:
+        logger.exception(f"💥 ingestion job {document_id} crashed: {e}")
+        ok = False
+    job = await db.ingest_jobs.find_one_and_update(
+        {"_id": document_id, "owner": WORKER_ID},
+        {"$set": {"status": "DONE" if ok else "FAILED", "finished_at": _now(), "lease_until": None},
+         "$unset": {"rerun": ""}},
+    )
+    if job and job.get("rerun"):
+        # New content was submitted while this ran
+        try:
+            await submit(document_id)
+        except QueueFull:
+            logger.warning(f"🚦 queue full, re-run of {document_id} left for the scheduler sweep")
+
+async def _worker(n: int):
+    while True:
+        document_id = await _queue.get()
+        _queued.discard(document_id)
+        try:
+            await _run_job(document_id)
+        except Exception as e:
+            logger.exception(f"💥 ingest worker {n} failed on {document_id}: {e}")
+        finally:
+            _queue.task_done()
+
+async def _sweep():
+    """
+    Pick up jobs left QUEUED for a full sweep interval (submitted while every queue
+    was full, or queued by a worker that died), or RUNNING with an expired lease.
+    Fresh QUEUED jobs are still sitting in whichever worker's queue submitted them.
+    """
+    db = get_db()
+    while True:
+        try:
+            now = _now()
+            cursor = db.ingest_jobs.find(
+                {"$or": [
+                    {"status": "QUEUED", "updated_at": {"$lt": now - timedelta(seconds=SWEEP_SECONDS)}},
+                    {"status": "RUNNING", "lease_until": {"$lt": now}},
+                ]},
+                {"_id": 1},
+            ).sort("created_at", 1)
+            async for job in cursor:
+                if _queue.full():
+                    break
+                if job["_id"] in _queued:
+                    continue
+                _enqueue(job["_id"])
+                logger.info(f"♻️ recovered ingestion job {job['_id']}")
+        except Exception as e:
+            logger.warning(f"⚠️ ingestion sweep failed: {e}")
+        await asyncio.sleep(SWEEP_SECONDS)
+
+async def start():
+    global _queue, WORKER_ID
+    WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+    _queue = asyncio.Queue(maxsize=INGEST_QUEUE_MAX)
+    _tasks.extend(asyncio.create_task(_worker(i)) for i in range(INGEST_CONCURRENCY))
+    _tasks.append(asyncio.create_task(_sweep()))
+    logger.info(f"🧾 ingestion scheduler started: concurrency={INGEST_CONCURRENCY}, queue={INGEST_QUEUE_MAX}")
+
+async def stop():
+    global _executor, _processes
+    for t in _tasks:
+        t.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _queued.clear()
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _processes is not None:
+        _processes.shutdown(wait=False, cancel_futures=True)
+        _processes = None
+
+def status() -> dict:
+    return {
+        "queue_depth": queue_depth(),
+        "queue_max": INGEST_QUEUE_MAX,
+        "concurrency": INGEST_CONCURRENCY,
+    }
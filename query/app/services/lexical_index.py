@@ -0,0 +1,114 @@
+# app/services/lexical_index.py
+# BM25 inverted index over chunk text, stored CSR-style:
+#   vocab (sorted terms) → term_offsets[t]:term_offsets[t+1] slice of
+#   post_rows (row = position in the document's chunk order) / post_tf
+import os, re
+from collections import Counter
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B  = float(os.getenv("BM25_B", "0.75"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class LexicalBuilder:
+    """Accumulates postings batch by batch while ingestion runs."""
+
+    def __init__(self):
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._lens: list[int] = []
+
+    def __len__(self):
+        return len(self._lens)
+
+    def add(self, texts):
+        for text in texts:
+            row = len(self._lens)
+            counts = Counter(tokenize(text))
+            self._lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, []).append((row, tf))
+
+    def build(self) -> "LexicalIndex":
+        vocab = sorted(self._postings)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        for i, term in enumerate(vocab):
+            offsets[i + 1] = offsets[i] + len(self._postings[term])
+        rows = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(vocab):
+            plist = self._postings[term]
+            rows[offsets[i]:offsets[i + 1]] = [r for r, _ in plist]
+            tfs[offsets[i]:offsets[i + 1]] = [min(tf, 65535) for _, tf in plist]
+        return LexicalIndex(vocab, offsets, rows, tfs, np.asarray(self._lens, dtype=np.int32))
+
+
+class LexicalIndex:
+    def __init__(self, vocab: list[str], term_offsets, post_rows, post_tf, doc_lens):
+        self.vocab = vocab
+        self._term_ids = {term: i for i, term in enumerate(vocab)}
+        self.term_offsets, self.post_rows, self.post_tf, self.doc_lens = term_offsets, post_rows, post_tf, doc_lens
+        self.avgdl = float(doc_lens.mean()) if len(doc_lens) else 0.0
+
+    @classmethod
+    def from_texts(cls, texts) -> "LexicalIndex":
+        builder = LexicalBuilder()
+        builder.add(texts)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.doc_lens)
+
+    def search(self, query: str, k: int) -> list[tuple[float, int]]:
+        """Top-k (bm25 score, row) pairs; rows without any query term are never returned."""
+        n = len(self.doc_lens)
+        if not n:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens / max(self.avgdl, 1e-9))
+        for term in set(tokenize(query)):
+            t = self._term_ids.get(term)
+            if t is None:
+                continue
+            lo, hi = self.term_offsets[t], self.term_offsets[t + 1]
+            rows = self.post_rows[lo:hi]
+            tf = self.post_tf[lo:hi].astype(np.float32)
+            idf = np.log1p((n - (hi - lo) + 0.5) / ((hi - lo) + 0.5))
+            scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm[rows])
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        k = min(k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[r]), int(r)) for r in top]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.term_offsets, self.post_rows, self.post_tf, self.doc_lens)
+        return sum(0 if isinstance(a, np.memmap) else a.nbytes for a in arrays) + sum(len(t) + 60 for t in self.vocab)
+
+    # ── persistence (next to the vector store files) ────────────
+    def save(self, path: str):
+        with open(os.path.join(path, "lex_vocab.txt"), "w") as fh:
+            fh.write("\n".join(self.vocab))
+        np.save(os.path.join(path, "lex_term_offsets.npy"), self.term_offsets)
+        np.save(os.path.join(path, "lex_post_rows.npy"), self.post_rows)
+        np.save(os.path.join(path, "lex_post_tf.npy"), self.post_tf)
+        np.save(os.path.join(path, "lex_doc_lens.npy"), self.doc_lens)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex | None":
+        try:
+            with open(os.path.join(path, "lex_vocab.txt")) as fh:
+                raw = fh.read()
+            mm = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+            return cls(raw.split("\n") if raw else [], np.load(os.path.join(path, "lex_term_offsets.npy")),
+                       mm("lex_post_rows.npy"), mm("lex_post_tf.npy"), np.load(os.path.join(path, "lex_doc_lens.npy")))
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,164 @@
+# app/services/metrics.py
+# Prometheus text-format metrics (exposition format 0.0.4), no client library.
+#   - hot-path hooks only bump a list slot per (labels) series – no locks, no I/O
+#   - gauges that mirror existing stats() (queue depth, cache hit rates, sockets)
+#     are read at scrape time by the /metrics router, so they cost nothing in between
+# Values are per worker process: scrape every worker (or run one) for totals.
+import bisect, functools, time
+
+# Seconds: provider calls and ingestion batches span ~1 ms to minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS    = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)   # items per second
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {} if labels else {(): 0}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, tuple(buckets)
+        self._series: dict[tuple, list] = {}   # labels → [per-bucket counts…, +Inf count, sum]
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labels, errors: Counter | None = None) -> "_Timer":
+        """`with HIST.time("x"):` observes the block's wall time; exceptions also bump `errors`."""
+        return _Timer(self, labels, errors)
+
+    def totals(self) -> dict[tuple, tuple[int, float]]:
+        """labels → (count, sum) so far, e.g. to diff around a benchmark run."""
+        return {labels: (sum(series[:-1]), series[-1]) for labels, series in self._series.items()}
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "errors", "started")
+
+    def __init__(self, hist: Histogram, labels: tuple, errors: Counter | None):
+        self.hist, self.labels, self.errors = hist, labels, errors
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.hist.observe(time.perf_counter() - self.started, *self.labels)
+        if exc_type is not None and self.errors is not None and issubclass(exc_type, Exception):
+            self.errors.inc(*self.labels)
+        return False
+
+
+def timed(hist: Histogram, *labels):
+    """Decorator form of `hist.time(...)` for async route handlers (keeps the signature FastAPI reads)."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def inner(*args, **kwargs):
+            with hist.time(*labels):
+                return await fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def gauge(name: str, help: str, samples, labels: tuple = (), kind: str = "gauge") -> list[str]:
+    """One scrape-time family from already-collected values: `samples` is [(label values, value)]."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for values, value in samples:
+        if value is not None:
+            lines.append(f"{name}{_labels(labels, values)} {_number(value)}")
+    return lines
+
+
+_registry: list[Counter | Histogram] = []
+
+def render(*families: list[str]) -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for family in families:
+        lines.extend(family)
+    return "\n".join(lines) + "\n"
+
+
+# ────────────────────────────────────────────────────────────────
+# Metrics fed by hooks in the routers and services
+# ────────────────────────────────────────────────────────────────
+PROVIDER_SECONDS = Histogram(
+    "bookquery_provider_request_seconds", "Upstream provider call latency.", ("provider", "op"))
+PROVIDER_ERRORS = Counter(
+    "bookquery_provider_errors_total", "Upstream provider calls that raised.", ("provider", "op"))
+
+# One `provider` label per upstream: the service module name, as used by the search
+# path and the breakers. Imports name their source by its short id; map it here.
+PROVIDER_LABELS = {"google": "google_books", "openlibrary": "open_library", "ia": "internet_archive",
+                   "gutenberg": "project_gutenberg"}
+
+def provider_label(name: str) -> str:
+    return PROVIDER_LABELS.get(name, name)
+
+SEARCH_SECONDS = Histogram(
+    "bookquery_search_seconds", "End-to-end search request latency.", ("endpoint",))
+
+IMPORT_STAGE_SECONDS = Histogram(
+    "bookquery_import_stage_seconds", "Import request stages (fetch metadata, download + GridFS upload).", ("stage",))
+INGEST_STAGE_SECONDS = Histogram(
+    "bookquery_ingest_stage_seconds", "Ingestion pipeline stages, per batch (spool and finish per document).", ("stage",))
+INGEST_DOCUMENTS = Counter(
+    "bookquery_ingest_documents_total", "Finished ingestion runs.", ("outcome",))
+INGEST_PAGES = Counter(
+    "bookquery_ingest_pages_total", "Pages indexed (extracted, embedded and stored).")
+INGEST_CHUNKS = Counter(
+    "bookquery_ingest_chunks_total", "Chunks embedded and stored by the ingestion pipeline.")
+INGEST_PAGES_RATE = Histogram(
+    "bookquery_ingest_pages_per_second", "Per-document extraction throughput.", buckets=RATE_BUCKETS)
+INGEST_CHUNKS_RATE = Histogram(
+    "bookquery_ingest_chunks_per_second", "Per-document embedding throughput.", buckets=RATE_BUCKETS)
+
+WEBSOCKETS = Counter(
+    "bookquery_websocket_connections_total", "Progress WebSockets accepted.")
+WEBSOCKET_MESSAGES = Counter(
+    "bookquery_websocket_messages_total", "Progress messages pushed to clients.", ("status",))
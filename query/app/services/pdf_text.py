@@ -0,0 +1,21 @@
+# app/services/pdf_text.py
+# Kept free of heavy imports: these functions run inside the extraction process pool.
+# PyMuPDF is imported on first call, so web workers that never ingest don't load it.
+
+
+def page_count(path: str) -> int:
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def extract_range(path: str, start: int, end: int) -> list[tuple[int, str]]:
+    """Extract plaintext for pages [start, end) → [(page_no, text)], skipping empty pages."""
+    import fitz  # PyMuPDF
+    pages = []
+    with fitz.open(path) as doc:
+        for page_no in range(start, min(end, doc.page_count)):
+            text = doc.load_page(page_no).get_text("text").strip()
+            if text:
+                pages.append((page_no, text))
+    return pages
@@ -0,0 +1,203 @@
+# app/services/progress.py
+# Document status/progress events for the /ws/documents sockets.
+# Ingestion writes a small `progress` sub-document (throttled) next to `status`;
+# one watcher per process follows db.documents – a change stream when the
+# deployment supports it, otherwise one batched poll for every subscribed
+# document – and fans each change out to the local subscribers.
+import asyncio, os, time, logging
+from pymongo.errors import OperationFailure
+from app.db import get_db
+
+logger = logging.getLogger("book-query")
+
+PROGRESS_WRITE_SECONDS = float(os.getenv("PROGRESS_WRITE_SECONDS", "0.5"))   # min gap between progress writes
+PROGRESS_POLL_SECONDS  = float(os.getenv("PROGRESS_POLL_SECONDS", "1.5"))    # fallback poll interval
+PROGRESS_CHANGE_STREAM = os.getenv("PROGRESS_CHANGE_STREAM", "1") == "1"
+
+
+# ────────────────────────────────────────────────────────────────
+# Publishing side (ingestion)
+# ────────────────────────────────────────────────────────────────
+class Tracker:
+    """Progress of one ingestion run; also shown on documents sharing the same content."""
+
+    def __init__(self, document_id: str, pages_total: int, next_page: int = 0, next_chunk: int = 0):
+        self.document_id = document_id
+        self.state = {
+            "stage": "extracting",
+            "pages_total": pages_total,
+            "pages_extracted": next_page,
+            "pages_done": next_page,
+            "chunks_embedded": next_chunk,
+            "percent": 0.0,
+        }
+        self._written = 0.0
+
+    async def update(self, force: bool = False, **fields):
+        self.state.update(fields)
+        total = self.state["pages_total"]
+        self.state["percent"] = round(100.0 * self.state["pages_done"] / total, 1) if total else 0.0
+        now = time.monotonic()
+        if not force and now - self._written < PROGRESS_WRITE_SECONDS:
+            return
+        self._written = now
+        try:
+            await get_db().documents.update_many(
+                {"$or": [{"_id": self.document_id}, {"blob.owner": self.document_id}]},
+                {"$set": {"progress": dict(self.state)}},
+            )
+        except Exception as e:
+            logger.debug(f"[progress] write failed for {self.document_id}: {e}")
+
+
+# ────────────────────────────────────────────────────────────────
+# Subscribing side (WebSockets)
+# ────────────────────────────────────────────────────────────────
+_subscribers: dict[str, set[asyncio.Queue]] = {}
+_last: dict[str, dict] = {}    # last event delivered per document (polling dedup)
+_task: asyncio.Task | None = None
+_mode = "stopped"
+
+
+def subscribe(document_id: str) -> asyncio.Queue:
+    """Queue of partial updates ({"status"}, {"progress"} or {"deleted": True}) for one document."""
+    queue = asyncio.Queue(maxsize=32)
+    _subscribers.setdefault(document_id, set()).add(queue)
+    return queue
+
+
+def unsubscribe(document_id: str, queue: asyncio.Queue):
+    queues = _subscribers.get(document_id)
+    if queues is None:
+        return
+    queues.discard(queue)
+    if not queues:
+        _subscribers.pop(document_id, None)
+        _last.pop(document_id, None)
+
+
+def _coalesce(queue: asyncio.Queue):
+    """
+    Full queue (slow socket): fold each run of events that doesn't change the status
+    into one, later fields winning – the socket merges them the same way. Status
+    transitions and deletion stay separate events, so READY/FAILED is never lost.
+    """
+    events = [queue.get_nowait() for _ in range(queue.qsize())]
+    merged, status = [], None
+    for event in events:
+        transition = "deleted" in event or ("status" in event and event["status"] != status)
+        if merged and not transition:
+            merged[-1] = {**merged[-1], **event}
+        else:
+            merged.append(event)
+        status = event.get("status", status)
+    while len(merged) >= queue.maxsize:
+        merged[:2] = [{**merged[0], **merged[1]}]   # nothing but transitions: the oldest go first
+    for event in merged:
+        queue.put_nowait(event)
+
+
+def _deliver(document_id: str, event: dict):
+    for queue in _subscribers.get(document_id, ()):
+        if queue.full():
+            _coalesce(queue)
+        queue.put_nowait(event)
+
+
+def _snapshot(doc: dict | None) -> dict:
+    if doc is None:
+        return {"deleted": True}
+    return {"status": doc.get("status"), "progress": doc.get("progress")}
+
+
+async def _poll_once():
+    ids = list(_subscribers)
+    if not ids:
+        return
+    docs = await get_db().documents.find({"_id": {"$in": ids}}, {"status": 1, "progress": 1}).to_list(None)
+    by_id = {doc["_id"]: doc for doc in docs}
+    for doc_id in ids:
+        event = _snapshot(by_id.get(doc_id))
+        if _last.get(doc_id) != event:
+            _last[doc_id] = event
+            _deliver(doc_id, event)
+
+
+async def _poll_forever():
+    while True:
+        try:
+            await _poll_once()
+        except Exception as e:
+            logger.warning(f"⚠️ progress poll failed: {e}")
+        await asyncio.sleep(PROGRESS_POLL_SECONDS)
+
+
+async def _watch_forever():
+    """Follow status/progress changes; drops to polling if change streams aren't available."""
+    global _mode
+    pipeline = [
+        {"$match": {"$or": [
+            {"operationType": {"$in": ["insert", "replace", "delete"]}},
+            {"updateDescription.updatedFields.status": {"$exists": True}},
+            {"updateDescription.updatedFields.progress": {"$exists": True}},
+        ]}},
+        {"$project": {
+            "operationType": 1, "documentKey": 1,
+            "fullDocument.status": 1, "fullDocument.progress": 1,
+            "updateDescription.updatedFields.status": 1, "updateDescription.updatedFields.progress": 1,
+        }},
+    ]
+    while True:
+        try:
+            async with get_db().documents.watch(pipeline) as stream:
+                _mode = "change_stream"
+                await _poll_once()   # catch up on anything missed while (re)connecting
+                async for change in stream:
+                    doc_id = change["documentKey"]["_id"]
+                    if doc_id not in _subscribers:
+                        continue
+                    op = change["operationType"]
+                    if op == "delete":
+                        event = {"deleted": True}
+                    elif op == "update":
+                        event = change["updateDescription"]["updatedFields"]
+                    else:
+                        event = _snapshot(change.get("fullDocument"))
+                    _deliver(doc_id, event)
+        except OperationFailure as e:
+            # Standalone mongod: no change streams at all
+            logger.info(f"📡 change streams unavailable ({e.code}), polling every {PROGRESS_POLL_SECONDS}s")
+            _mode = "polling"
+            await _poll_forever()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ progress change stream dropped: {e}")
+            _mode = "reconnecting"
+            await asyncio.sleep(1)
+
+
+def start():
+    global _task, _mode
+    if _task is None:
+        _mode = "starting" if PROGRESS_CHANGE_STREAM else "polling"
+        _task = asyncio.create_task(_watch_forever() if PROGRESS_CHANGE_STREAM else _poll_forever())
+
+
+async def stop():
+    global _task, _mode
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task, _mode = None, "stopped"
+
+
+def stats() -> dict:
+    return {
+        "mode": _mode,
+        "documents": len(_subscribers),
+        "sockets": sum(len(queues) for queues in _subscribers.values()),
+    }
@@ -1,38 +1,106 @@
 # app/services/project_gutenberg.py
-import httpx, logging, re, urllib.parse
-from tenacity import retry, stop_after_attempt, wait_fixed
+import asyncio, contextlib, logging, os, re, time, urllib.parse
+from datetime import datetime, timezone
+from app.db import get_db
+from app.services import http_pool
 
 logger = logging.getLogger("book-query")
 
 GUTENDEX = "https://gutendex.com/books/?search="
 
+PROBE_FANOUT   = int(os.getenv("GUTENBERG_PROBE_FANOUT", "5"))         # concurrent HEAD probes per search
+PROBE_TTL_HIT  = int(os.getenv("GUTENBERG_PROBE_TTL_HIT", "604800"))   # PDF found: trust for 7 days
+PROBE_TTL_MISS = int(os.getenv("GUTENBERG_PROBE_TTL_MISS", "86400"))   # no PDF: re-check after 1 day
+
+# ────────────────────────────────────────────────────────────────
+# PDF availability cache: local dict in front of db.pdf_availability
+# gid → (expires_at epoch, pdf_url or None)
+# ────────────────────────────────────────────────────────────────
+_availability: dict[int, tuple[float, str | None]] = {}
+_MISSING = object()
+
+def _fallback_url(gid) -> str:
+    return f"https://www.gutenberg.org/files/{gid}/{gid}-pdf.pdf"
+
+async def _cached_pdf(gid):
+    """Known PDF url, None for a known miss, or _MISSING when we have to ask the network."""
+    entry = _availability.get(gid)
+    if entry and entry[0] > time.time():
+        return entry[1]
+    try:
+        doc = await get_db().pdf_availability.find_one({"_id": gid})
+    except Exception as e:
+        logger.debug(f"[GUT] availability lookup failed for {gid}: {e}")
+        return _MISSING
+    if doc and doc["expires_at"].replace(tzinfo=timezone.utc).timestamp() > time.time():
+        _availability[gid] = (doc["expires_at"].replace(tzinfo=timezone.utc).timestamp(), doc.get("pdf_url"))
+        return doc.get("pdf_url")
+    return _MISSING
+
+async def _remember_pdf(gid, pdf_url: str | None):
+    expires = time.time() + (PROBE_TTL_HIT if pdf_url else PROBE_TTL_MISS)
+    _availability[gid] = (expires, pdf_url)
+    try:
+        await get_db().pdf_availability.replace_one(
+            {"_id": gid},
+            {"pdf_url": pdf_url, "expires_at": datetime.fromtimestamp(expires, timezone.utc)},
+            upsert=True,
+        )
+    except Exception as e:
+        logger.debug(f"[GUT] availability store failed for {gid}: {e}")
+
+async def _probe_pdf(gid, sem: asyncio.Semaphore | None = None) -> str | None:
+    """HEAD the static Gutenberg PDF url, consulting/filling the availability cache."""
+    cached = await _cached_pdf(gid)
+    if cached is not _MISSING:
+        return cached
+    url = _fallback_url(gid)
+    try:
+        async with sem or contextlib.nullcontext():
+            head = await http_pool.get_client().head(url)
+    # PDF not accessible – transient, don't cache
+    except Exception as e:
+        logger.debug(f"[GUT] fallback failed for {gid}: {e}")
+        return None
+    if head.status_code == 200:
+        await _remember_pdf(gid, url)
+        return url
+    if head.status_code in (403, 404, 410):
+        await _remember_pdf(gid, None)
+    return None
+
+async def ensure_indexes():
+    try:
+        await get_db().pdf_availability.create_index("expires_at", expireAfterSeconds=0, name="expires_ttl")
+    except Exception as e:
+        logger.warning(f"⚠️ could not ensure pdf availability index: {e}")
+
 # Query for items return
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
 async def search(q: str):
     """Return at most 5 PDF-downloadable results from Gutendex."""
     url = f"{GUTENDEX}{urllib.parse.quote_plus(q)}"
-    async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        books = r.json().get("results", [])[:10]
+    client = http_pool.get_client()
+    r = await client.get(url)
+    r.raise_for_status()
+    books = r.json().get("results", [])[:10]
 
-    results = []
-    for b in books:
+    # Links from public details; probe the hardcoded fallback URL concurrently for the rest
+    sem = asyncio.Semaphore(PROBE_FANOUT)
+
+    async def pdf_for(b):
         pdf_link = next(
             (v for k, v in b["formats"].items() if k.lower().endswith("pdf")), None
         )
-        # Link not from public details
-        if not pdf_link:
-            try:
-                # Attempt fallback hardcoded PDF URL
-                fallback_url = f"https://www.gutenberg.org/files/{b['id']}/{b['id']}-pdf.pdf"
-                async with httpx.AsyncClient(timeout=5) as client:
-                    head_resp = await client.head(fallback_url)
-                    if head_resp.status_code == 200:
-                        pdf_link = fallback_url
-            # PDF not accessible from 
-            except Exception as e:
-                logger.debug(f"[GUT] fallback failed for {b['id']}: {e}")
+        if pdf_link:
+            if _availability.get(b["id"], (0, None))[1] != pdf_link:
+                await _remember_pdf(b["id"], pdf_link)
+            return pdf_link
+        return await _probe_pdf(b["id"], sem)
+
+    links = await asyncio.gather(*(pdf_for(b) for b in books))
+
+    results = []
+    for b, pdf_link in zip(books, links):
         # Fallback book not having preview/download url from both details and hardcode method
         if not pdf_link:
             logger.debug(f"[GUT] skipped (no PDF): {b['title']}")
@@ -60,28 +128,31 @@ async def fetch(ref: dict):
     gid = ref.get("id")
     if not gid:
         return None
+    # Already resolved by an earlier search/import
+    cached = await _cached_pdf(gid)
+    if cached is not _MISSING and cached:
+        return {"download_available": True, "download_url": cached}
     # Trailing to preview page for PDF confirmation
     gutendex_url = f"https://gutendex.com/books/{gid}/"  # ensure trailing slash
+    client = http_pool.get_client()
     try:
-        async with httpx.AsyncClient(timeout=10, follow_redirects=True) as client:
-            r = await client.get(gutendex_url)
-            if r.status_code == 200:
-                data = r.json()
-                pdf_link = next(
-                    (v for k, v in data["formats"].items() if k.lower().endswith("pdf")),
-                    None
-                )
-                if pdf_link:
-                    return {"download_available": True, "download_url": pdf_link}
+        r = await client.get(gutendex_url)
+        if r.status_code == 200:
+            data = r.json()
+            pdf_link = next(
+                (v for k, v in data["formats"].items() if k.lower().endswith("pdf")),
+                None
+            )
+            if pdf_link:
+                await _remember_pdf(gid, pdf_link)
+                return {"download_available": True, "download_url": pdf_link}
     except Exception as e:
         logger.warning(f"[GUT] Gutendex metadata failed for {gid}: {e}")
     # Fallback to static Gutenberg URL
-    fallback_url = f"https://www.gutenberg.org/files/{gid}/{gid}-pdf.pdf"
-    async with httpx.AsyncClient(timeout=10) as client:
-        head = await client.head(fallback_url)
-        if head.status_code == 200:
-            logger.info(f"[GUT] Using fallback PDF: {fallback_url}")
-            return {"download_available": True, "download_url": fallback_url}
+    fallback_url = await _probe_pdf(gid)
+    if fallback_url:
+        logger.info(f"[GUT] Using fallback PDF: {fallback_url}")
+        return {"download_available": True, "download_url": fallback_url}
     # Log
     logger.warning(f"[GUT] No PDF for book {gid}")
     return None
@@ -0,0 +1,153 @@
+# app/services/provider_health.py
+# Health layer in front of every upstream provider search.
+#   - rolling window of outcomes/latencies per provider
+#   - circuit breaker: CLOSED → OPEN on sustained failure → HALF_OPEN single probe
+#   - adaptive in-flight cap (AIMD): grows slowly while calls are fast and clean,
+#     halves on errors, or on slow calls once they are the bulk of the window;
+#     callers over the cap are turned away at once
+import asyncio, os, time, logging
+from collections import deque
+from app.services import metrics
+
+logger = logging.getLogger("book-query")
+
+WINDOW_SECONDS    = float(os.getenv("PROVIDER_WINDOW_SECONDS", "60"))
+MIN_CALLS         = int(os.getenv("PROVIDER_MIN_CALLS", "5"))          # before the error rate counts
+ERROR_THRESHOLD   = float(os.getenv("PROVIDER_ERROR_THRESHOLD", "0.5"))
+OPEN_SECONDS      = float(os.getenv("PROVIDER_OPEN_SECONDS", "30"))    # first cool-down, doubled per failed probe
+MAX_OPEN_SECONDS  = float(os.getenv("PROVIDER_MAX_OPEN_SECONDS", "300"))
+MAX_INFLIGHT      = int(os.getenv("PROVIDER_MAX_INFLIGHT", "16"))
+LATENCY_TARGET    = float(os.getenv("PROVIDER_LATENCY_TARGET", "2.0"))  # default; PROVIDER_LATENCY_TARGET_OPEN_LIBRARY=... per provider
+SLOW_THRESHOLD    = float(os.getenv("PROVIDER_SLOW_THRESHOLD", "0.5"))  # share of slow calls in the window that shrinks the cap
+
+# Providers whose normal latency is above the default target
+_LATENCY_TARGETS = {"open_library": 5.0, "internet_archive": 5.0}
+
+CLOSED, OPEN, HALF_OPEN = "CLOSED", "OPEN", "HALF_OPEN"
+
+
+class Unavailable(Exception):
+    """Provider skipped without calling it: circuit open, probe already running, or at its in-flight cap."""
+
+
+class Breaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.latency_target = float(os.getenv(f"PROVIDER_LATENCY_TARGET_{name.upper()}",
+                                              _LATENCY_TARGETS.get(name, LATENCY_TARGET)))
+        self.state = CLOSED
+        self.limit = float(MAX_INFLIGHT)
+        self.inflight = 0
+        self.rejected = 0
+        self._calls: deque[tuple[float, bool, float]] = deque()   # (finished_at, ok, latency)
+        self._opened_at = 0.0
+        self._cooldown = OPEN_SECONDS
+        self._probing = False
+
+    # ── rolling window ──────────────────────────────────────────
+    def _trim(self, now: float):
+        while self._calls and now - self._calls[0][0] > WINDOW_SECONDS:
+            self._calls.popleft()
+
+    def error_rate(self) -> float:
+        self._trim(time.monotonic())
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, ok, _ in self._calls if not ok) / len(self._calls)
+
+    def slow_rate(self) -> float:
+        self._trim(time.monotonic())
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, ok, lat in self._calls if ok and lat > self.latency_target) / len(self._calls)
+
+    def _latency(self, q: float) -> float | None:
+        samples = sorted(lat for _, ok, lat in self._calls if ok)
+        return round(samples[min(int(q * len(samples)), len(samples) - 1)], 3) if samples else None
+
+    # ── admission ───────────────────────────────────────────────
+    def _admit(self) -> bool:
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self._opened_at < self._cooldown:
+                return False
+            self.state = HALF_OPEN
+            logger.info(f"🩺 {self.name} circuit half-open, probing")
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.inflight < int(self.limit)
+
+    def _record(self, ok: bool, latency: float):
+        now = time.monotonic()
+        metrics.PROVIDER_SECONDS.observe(latency, self.name, "search")
+        if not ok:
+            metrics.PROVIDER_ERRORS.inc(self.name, "search")
+        self._calls.append((now, ok, latency))
+        self._trim(now)
+        # AIMD on the in-flight cap; an occasional slow success leaves it alone
+        if ok and latency <= self.latency_target:
+            self.limit = min(MAX_INFLIGHT, self.limit + 1 / self.limit)
+        elif not ok or (len(self._calls) >= MIN_CALLS and self.slow_rate() >= SLOW_THRESHOLD):
+            self.limit = max(1.0, self.limit / 2)
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok:
+                self.state, self._cooldown = CLOSED, OPEN_SECONDS
+                self._calls.clear()
+                logger.info(f"✅ {self.name} circuit closed again")
+            else:
+                self._open(now, min(self._cooldown * 2, MAX_OPEN_SECONDS))
+            return
+        if self.state == CLOSED and len(self._calls) >= MIN_CALLS and self.error_rate() >= ERROR_THRESHOLD:
+            self._open(now, OPEN_SECONDS)
+
+    def _open(self, now: float, cooldown: float):
+        self.state, self._opened_at, self._cooldown = OPEN, now, cooldown
+        logger.warning(f"🔌 {self.name} circuit open for {cooldown:.0f}s (error rate {self.error_rate():.0%})")
+
+    async def call(self, fn, *args):
+        if not self._admit():
+            self.rejected += 1
+            raise Unavailable(f"{self.name} is {self.state.lower()}" if self.state != CLOSED else f"{self.name} is saturated")
+        self.inflight += 1
+        started = time.monotonic()
+        try:
+            result = await fn(*args)
+        except asyncio.CancelledError:
+            self._probing = False   # abandoned, not failed: counts neither way
+            raise
+        except Exception:
+            self._record(False, time.monotonic() - started)
+            raise
+        else:
+            self._record(True, time.monotonic() - started)
+            return result
+        finally:
+            self.inflight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "error_rate": round(self.error_rate(), 3),
+            "slow_rate": round(self.slow_rate(), 3),
+            "calls": len(self._calls),
+            "p50": self._latency(0.5),
+            "p95": self._latency(0.95),
+            "inflight": self.inflight,
+            "limit": int(self.limit),
+            "rejected": self.rejected,
+        }
+
+
+_breakers: dict[str, Breaker] = {}
+
+def for_provider(name: str) -> Breaker:
+    if name not in _breakers:
+        _breakers[name] = Breaker(name)
+    return _breakers[name]
+
+def stats() -> dict:
+    return {name: b.stats() for name, b in _breakers.items()}
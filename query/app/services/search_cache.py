@@ -0,0 +1,145 @@
+# app/services/search_cache.py
+import asyncio, os, time, logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from app.db import get_db
+
+logger = logging.getLogger("book-query")
+
+SEARCH_CACHE_TTL   = float(os.getenv("SEARCH_CACHE_TTL", "600"))      # fresh for 10 min
+SEARCH_CACHE_STALE = float(os.getenv("SEARCH_CACHE_STALE", "3600"))   # then served stale while refreshing
+SEARCH_CACHE_SIZE  = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))      # entries per provider
+SEARCH_CACHE_MONGO = os.getenv("SEARCH_CACHE_MONGO", "1") == "1"      # shared tier across workers
+
+
+class ProviderCache:
+    """TTL + LRU cache for one provider's search results, with stale-while-revalidate."""
+
+    def __init__(self, name: str, ttl=SEARCH_CACHE_TTL, stale=SEARCH_CACHE_STALE, max_entries=SEARCH_CACHE_SIZE):
+        self.name, self.ttl, self.stale, self.max_entries = name, ttl, stale, max_entries
+        self._entries: OrderedDict[str, tuple[float, list]] = OrderedDict()
+        self._refreshing: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self.hits = self.stale_hits = self.shared_hits = self.misses = 0
+
+    # ── local tier ──────────────────────────────────────────────
+    def _get_local(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_local(self, key: str, value: list, stored_at: float | None = None):
+        self._entries[key] = (stored_at or time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # ── shared Mongo tier ───────────────────────────────────────
+    async def _get_shared(self, key: str):
+        if not SEARCH_CACHE_MONGO:
+            return None
+        try:
+            doc = await get_db().search_cache.find_one({"_id": f"{self.name}:{key}"})
+        except Exception as e:
+            logger.debug(f"[cache] shared lookup failed for {self.name}: {e}")
+            return None
+        if not doc:
+            return None
+        return doc["stored_at"], doc["value"]
+
+    async def _put_shared(self, key: str, value: list, stored_at: float):
+        if not SEARCH_CACHE_MONGO:
+            return
+        try:
+            await get_db().search_cache.replace_one(
+                {"_id": f"{self.name}:{key}"},
+                {
+                    "provider": self.name,
+                    "value": value,
+                    "stored_at": stored_at,
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl + self.stale),
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            logger.debug(f"[cache] shared store failed for {self.name}: {e}")
+
+    # ── public ──────────────────────────────────────────────────
+    async def _fetch_and_store(self, key: str, fetch):
+        value = await fetch()
+        stored_at = time.time()
+        self._put_local(key, value, stored_at)
+        await self._put_shared(key, value, stored_at)
+        return value
+
+    def _refresh(self, key: str, fetch):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def run():
+            try:
+                await self._fetch_and_store(key, fetch)
+            except Exception as e:
+                logger.debug(f"[cache] background refresh failed for {self.name}:{key!r}: {e}")
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get_or_fetch(self, key: str, fetch):
+        """Return cached results for `key`, calling `fetch()` only on a miss (or in the background when stale)."""
+        entry = self._get_local(key)
+        shared = False
+        if entry is None or time.time() - entry[0] >= self.ttl + self.stale:
+            entry = await self._get_shared(key)
+            shared = entry is not None
+        if entry is not None:
+            stored_at, value = entry
+            age = time.time() - stored_at
+            if age < self.ttl + self.stale:
+                if shared:
+                    self._put_local(key, value, stored_at)
+                    self.shared_hits += 1
+                if age < self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    self._refresh(key, fetch)
+                return value
+        self.misses += 1
+        return await self._fetch_and_store(key, fetch)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+_caches: dict[str, ProviderCache] = {}
+
+def for_provider(name: str) -> ProviderCache:
+    if name not in _caches:
+        _caches[name] = ProviderCache(name)
+    return _caches[name]
+
+def stats() -> dict:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+async def ensure_indexes():
+    if not SEARCH_CACHE_MONGO:
+        return
+    try:
+        await get_db().search_cache.create_index("expires_at", expireAfterSeconds=0, name="expires_ttl")
+    except Exception as e:
+        logger.warning(f"⚠️ could not ensure search cache index: {e}")
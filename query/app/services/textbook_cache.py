@@ -0,0 +1,155 @@
+# app/services/textbook_cache.py
+# Serving side of GET /import/textbook/{doc_id}: file metadata for ETag /
+# Last-Modified, byte ranges read straight from GridFS (seek, no full download),
+# and a size-bounded disk LRU of hot textbooks shared by all workers.
+#
+#   {TEXTBOOK_CACHE_DIR}/{file_id}.pdf   complete copies only (written via rename)
+# Recency is the file's mtime (touched on every hit), so any worker can evict.
+import asyncio, os, time, logging
+from datetime import timezone
+from app.db import find_textbook_file, open_textbook_file
+
+logger = logging.getLogger("book-query")
+
+TEXTBOOK_CACHE_DIR     = os.getenv("TEXTBOOK_CACHE_DIR", "/tmp/textbook_cache")
+TEXTBOOK_CACHE_BYTES   = int(os.getenv("TEXTBOOK_CACHE_MB", "2048")) * 1024 * 1024
+TEXTBOOK_CACHE_ENABLED = os.getenv("TEXTBOOK_CACHE", "1") == "1"
+TEXTBOOK_META_TTL      = float(os.getenv("TEXTBOOK_META_TTL", "60"))   # how long file metadata is trusted
+READ_CHUNK             = 256 * 1024
+
+_meta: dict[str, tuple[float, dict | None]] = {}
+_filling: dict[str, asyncio.Task] = {}
+_stats = {"disk_hits": 0, "gridfs_reads": 0, "fills": 0, "evictions": 0}
+
+
+async def describe(owner: str) -> dict | None:
+    """{file_id, length, last_modified, etag} of the textbook stored under `owner`, or None."""
+    cached = _meta.get(owner)
+    if cached and time.monotonic() - cached[0] < TEXTBOOK_META_TTL:
+        return cached[1]
+    file = await find_textbook_file(owner)
+    info = None
+    if file:
+        uploaded = file["uploadDate"]
+        if uploaded.tzinfo is None:
+            uploaded = uploaded.replace(tzinfo=timezone.utc)
+        info = {
+            "file_id": file["_id"],
+            "length": file["length"],
+            "last_modified": uploaded.replace(microsecond=0),
+            # A new upload gets a new GridFS id, so the id is a strong validator
+            "etag": f'"{file["_id"]}"',
+        }
+    _meta[owner] = (time.monotonic(), info)
+    return info
+
+
+def drop(owner: str):
+    """Textbook deleted: forget its metadata and remove the disk copy (if this worker knows it)."""
+    _, info = _meta.pop(owner, (None, None))
+    if info is not None:
+        try:
+            os.remove(_path(info))
+        except OSError:
+            pass
+
+
+def _path(info: dict) -> str:
+    return os.path.join(TEXTBOOK_CACHE_DIR, f"{info['file_id']}.pdf")
+
+
+def _open_cached(info: dict):
+    """Open the disk copy (and mark it recently used), or None."""
+    if not TEXTBOOK_CACHE_ENABLED:
+        return None
+    try:
+        fh = open(_path(info), "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(fh.fileno())
+    except OSError:
+        pass
+    return fh
+
+
+def _evict():
+    try:
+        entries = [e for e in os.scandir(TEXTBOOK_CACHE_DIR) if e.is_file() and e.name.endswith(".pdf")]
+    except FileNotFoundError:
+        return
+    stats = sorted(((e.stat(), e.path) for e in entries), key=lambda x: x[0].st_mtime)
+    used = sum(st.st_size for st, _ in stats)
+    for st, path in stats:
+        if used <= TEXTBOOK_CACHE_BYTES:
+            break
+        try:
+            os.remove(path)   # readers holding it open keep their copy
+            used -= st.st_size
+            _stats["evictions"] += 1
+        except OSError:
+            pass
+
+
+async def _fill(info: dict):
+    os.makedirs(TEXTBOOK_CACHE_DIR, exist_ok=True)
+    tmp = f"{_path(info)}.{os.getpid()}.part"
+    try:
+        stream = await open_textbook_file(info["file_id"])
+        with open(tmp, "wb") as out:
+            while chunk := await stream.readchunk():
+                await asyncio.to_thread(out.write, chunk)
+        os.replace(tmp, _path(info))
+        _stats["fills"] += 1
+        logger.info(f"💾 cached textbook {info['file_id']} ({info['length'] // 1024} KiB)")
+        await asyncio.to_thread(_evict)
+    except Exception as e:
+        logger.warning(f"⚠️ could not cache textbook {info['file_id']}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _schedule_fill(info: dict):
+    key = str(info["file_id"])
+    if key in _filling or info["length"] > TEXTBOOK_CACHE_BYTES // 4:
+        return
+    task = asyncio.create_task(_fill(info))
+    _filling[key] = task
+    task.add_done_callback(lambda _: _filling.pop(key, None))
+
+
+async def iter_range(info: dict, start: int, end: int):
+    """Yield bytes [start, end] (inclusive) – from the disk copy when there is one, else GridFS."""
+    fh = _open_cached(info)
+    if fh is not None:
+        _stats["disk_hits"] += 1
+        try:
+            await asyncio.to_thread(fh.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = await asyncio.to_thread(fh.read, min(READ_CHUNK, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        finally:
+            fh.close()
+        return
+    _stats["gridfs_reads"] += 1
+    if TEXTBOOK_CACHE_ENABLED:
+        _schedule_fill(info)   # the next open of this book is served locally
+    stream = await open_textbook_file(info["file_id"])
+    stream.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await stream.read(min(READ_CHUNK, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+
+def stats() -> dict:
+    return {**_stats, "filling": len(_filling), "budget_bytes": TEXTBOOK_CACHE_BYTES}
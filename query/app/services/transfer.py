@@ -0,0 +1,89 @@
+# app/services/transfer.py
+import asyncio, hashlib, os, time, logging
+from typing import AsyncIterator
+from app.db import get_gridfs, _get_textbook_fs, TEXTBOOK_URI
+from app.services import metrics
+
+logger = logging.getLogger("book-query")
+
+MAX_PDF_BYTES  = int(os.getenv("MAX_PDF_BYTES", str(500 * 1024 * 1024)))
+TRANSFER_CHUNK = int(os.getenv("TRANSFER_CHUNK_BYTES", str(1024 * 1024)))
+
+
+class TooLarge(Exception):
+    """The PDF is bigger than MAX_PDF_BYTES."""
+
+
+async def iter_upload(file, chunk_size: int = TRANSFER_CHUNK) -> AsyncIterator[bytes]:
+    """Read an UploadFile piecewise instead of `await file.read()` on the whole thing."""
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+async def stream_to_buckets(doc_id: str, chunks: AsyncIterator[bytes], declared_size: int | None = None) -> dict:
+    """
+    Tee a byte stream into the main GridFS bucket and the textbook replica at once.
+    Hashes and counts as it goes; aborts both uploads past MAX_PDF_BYTES.
+    The textbook copy is best-effort, like before: a failure there only logs.
+    """
+    if declared_size and declared_size > MAX_PDF_BYTES:
+        raise TooLarge(declared_size)
+    filename = f"{doc_id}.pdf"
+    main = get_gridfs().open_upload_stream(filename, metadata={"document_id": doc_id})
+    replica = None
+    if TEXTBOOK_URI:
+        try:
+            replica = _get_textbook_fs().open_upload_stream(filename, metadata={"document_id": doc_id})
+        except Exception as e:
+            logger.warning(f"⚠️ textbook GridFS save failed: {e}")
+
+    sha, size = hashlib.sha256(), 0
+    writing = 0.0   # time spent waiting on GridFS, as opposed to on the source
+
+    async def replica_write(chunk):
+        nonlocal replica
+        try:
+            await replica.write(chunk)
+        except Exception as e:
+            logger.warning(f"⚠️ textbook GridFS save failed: {e}")
+            failed, replica = replica, None
+            await _quiet_abort(failed)
+
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > MAX_PDF_BYTES:
+                raise TooLarge(size)
+            sha.update(chunk)
+            started = time.perf_counter()
+            if replica is not None:
+                await asyncio.gather(main.write(chunk), replica_write(chunk))
+            else:
+                await main.write(chunk)
+            writing += time.perf_counter() - started
+        await main.close()
+    except BaseException:
+        await _quiet_abort(main)
+        await _quiet_abort(replica)
+        raise
+
+    replica_id = None
+    if replica is not None:
+        try:
+            await replica.close()
+            replica_id = replica._id
+            logger.info(f"📦 textbook PDF stored for {doc_id} → {TEXTBOOK_URI}")
+        except Exception as e:
+            logger.warning(f"⚠️ textbook GridFS save failed: {e}")
+    metrics.IMPORT_STAGE_SECONDS.observe(writing, "gridfs_write")
+    logger.info(f"✅ streamed {size} bytes for {doc_id} into GridFS")
+    return {"file_id": main._id, "replica_id": replica_id, "sha256": sha.hexdigest(), "size": size}
+
+
+async def _quiet_abort(grid_in):
+    if grid_in is None:
+        return
+    try:
+        await grid_in.abort()
+    except Exception:
+        pass
@@ -0,0 +1,253 @@
+# app/services/vector_index.py
+# Per-document in-memory vector indexes for /search/semantic.
+# Small books: exact cosine over the whole matrix. Large ones: IVF (k-means
+# coarse quantizer, probe the closest lists, exact re-score of candidates).
+# Each index also carries a BM25 lexical index over the same chunk rows.
+import asyncio, os, time, logging
+from collections import OrderedDict
+import numpy as np
+from app.db import get_db
+from app.services import blobs, jobs, vectors, vector_store
+from app.services.lexical_index import LexicalBuilder, LexicalIndex
+
+logger = logging.getLogger("book-query")
+
+IVF_MIN_ROWS     = int(os.getenv("VECTOR_IVF_MIN_ROWS", "20000"))   # below this, exact search
+IVF_NPROBE       = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+INDEX_BUDGET     = int(os.getenv("VECTOR_INDEX_BUDGET_MB", "512")) * 1024 * 1024
+REVALIDATE_AFTER = float(os.getenv("VECTOR_STORE_REVALIDATE", "300"))  # re-check disk copies against Mongo
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample; good enough for a coarse quantizer."""
+    rng = np.random.default_rng(seed)
+    sample = x[rng.choice(len(x), min(len(x), k * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(k):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class DocumentIndex:
+    def __init__(self, document_id: str, version: str, chunk_ids: np.ndarray, matrix: np.ndarray, meta,
+                 ivf: tuple | None = None, normalized: bool = False, lexical: LexicalIndex | None = None):
+        self.document_id, self.version = document_id, version
+        self.chunk_ids = chunk_ids
+        self.matrix = matrix if normalized else _normalize(matrix.astype(np.float32, copy=False))
+        self.meta = meta
+        self.centroids = self.order = self.offsets = None
+        if ivf is not None:
+            self.centroids, self.order, self.offsets = ivf
+        elif len(self.matrix) >= IVF_MIN_ROWS:
+            self._build_ivf()
+        # Stores written before lexical search existed: tokenize once on load
+        self.lexical = lexical if lexical is not None else LexicalIndex.from_texts(meta[i]["text"] for i in range(len(meta)))
+        # Heap footprint only – memory-mapped arrays live in the shared page cache
+        heap = lambda a: 0 if a is None or isinstance(a, np.memmap) else a.nbytes
+        text_bytes = 0 if isinstance(meta, vector_store.MmapTexts) else sum(len(m.get("text", "")) for m in meta)
+        self.nbytes = sum(heap(a) for a in (self.matrix, self.chunk_ids, self.centroids, self.order, self.offsets)) \
+            + text_bytes + self.lexical.nbytes
+
+    @classmethod
+    def from_store(cls, document_id: str, tag: str) -> "DocumentIndex | None":
+        parts = vector_store.load(document_id, tag)
+        if parts is None:
+            return None
+        return cls(document_id, tag, parts["chunk_ids"], parts["matrix"], parts["meta"], parts["ivf"],
+                   normalized=True, lexical=parts["lexical"])
+
+    def _build_ivf(self):
+        nlist = int(np.sqrt(len(self.matrix)))
+        self.centroids = _kmeans(self.matrix, nlist)
+        assign = np.empty(len(self.matrix), dtype=np.int32)
+        for start in range(0, len(self.matrix), 8192):
+            block = self.matrix[start:start + 8192]
+            assign[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        self.order = np.argsort(assign, kind="stable")
+        self.offsets = np.searchsorted(assign[self.order], np.arange(nlist + 1))
+
+    @property
+    def kind(self) -> str:
+        return "ivf" if self.centroids is not None else "exact"
+
+    def search(self, query: np.ndarray, k: int) -> list[tuple[float, int]]:
+        """Top-k (score, row) pairs by cosine similarity."""
+        if not len(self.matrix):
+            return []
+        if self.centroids is None:
+            candidates = None
+            scores = self.matrix @ query
+        else:
+            lists = np.argsort(self.centroids @ query)[::-1][:IVF_NPROBE]
+            candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+            scores = self.matrix[candidates] @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = top if candidates is None else candidates[top]
+        return [(float(scores[t]), int(r)) for t, r in zip(top, rows)]
+
+
+# ────────────────────────────────────────────────────────────────
+# LRU of loaded indexes under a memory budget
+# ────────────────────────────────────────────────────────────────
+_indexes: OrderedDict[str, DocumentIndex] = OrderedDict()
+_loading: dict[str, asyncio.Lock] = {}
+_validated: dict[str, float] = {}   # last time a disk copy was checked against Mongo
+_owners: dict[str, tuple[str, float]] = {}   # document id → (content owner, resolved at)
+
+
+async def _version(document_id: str):
+    """Indexing time – changes whenever the document is (re)indexed, gone when deleted."""
+    db = get_db()
+    job = await db.ingest_jobs.find_one({"_id": document_id}, {"indexed_at": 1})
+    if job:
+        return job.get("indexed_at")
+    # Indexed before ingestion jobs were tracked
+    doc = await db.documents.find_one({"_id": document_id}, {"status": 1})
+    return "legacy" if doc and doc.get("status") == "READY" else None
+
+
+def _evict():
+    used = sum(ix.nbytes for ix in _indexes.values())
+    while len(_indexes) > 1 and used > INDEX_BUDGET:
+        doc_id, ix = _indexes.popitem(last=False)
+        used -= ix.nbytes
+        logger.info(f"🧹 evicted vector index {doc_id} ({ix.nbytes // 1024} KiB)")
+
+
+def invalidate(document_id: str):
+    _indexes.pop(document_id, None)
+    _validated.pop(document_id, None)
+
+
+def drop(document_id: str):
+    """Document deleted: forget it here and remove the shared disk copy."""
+    invalidate(document_id)
+    vector_store.remove(document_id)
+
+
+async def owner(document_id: str) -> str:
+    """
+    Document whose index holds `document_id`'s content (blobs.storage_id), re-resolved
+    every REVALIDATE_AFTER like the disk copies. With Mongo unreachable the last known
+    owner is used – or the document itself, which owns its content unless deduplicated.
+    """
+    cached = _owners.get(document_id)
+    if cached is not None and time.monotonic() - cached[1] < REVALIDATE_AFTER:
+        return cached[0]
+    try:
+        resolved = await blobs.storage_id(document_id)
+    except Exception as e:
+        logger.warning(f"⚠️ could not resolve the content owner of {document_id}: {e}")
+        return cached[0] if cached is not None else document_id
+    _owners[document_id] = (resolved, time.monotonic())
+    return resolved
+
+
+def forget_owner(document_id: str):
+    """The document was re-linked to other content or deleted."""
+    _owners.pop(document_id, None)
+
+
+def _remember(ix: DocumentIndex):
+    _indexes[ix.document_id] = ix
+    _indexes.move_to_end(ix.document_id)
+    logger.info(f"🧭 loaded {ix.kind} vector index for {ix.document_id}: {len(ix.matrix)} chunks")
+    _evict()
+
+
+def _build_and_store(document_id, tag, chunk_ids, matrix, meta, lexical: LexicalBuilder | None = None) -> DocumentIndex:
+    """Blocking: build from Mongo data; if the disk store is on, persist and reopen it mmap'd."""
+    ix = DocumentIndex(document_id, tag, chunk_ids, matrix, meta, lexical=lexical.build() if lexical else None)
+    if not vector_store.VECTOR_STORE_ENABLED:
+        return ix
+    try:
+        vector_store.save(ix)
+        return DocumentIndex.from_store(document_id, tag) or ix
+    except OSError as e:
+        logger.warning(f"⚠️ vector store write failed for {document_id}: {e}")
+        return ix
+
+
+async def _build(document_id: str, tag: str, lexical: LexicalBuilder | None = None) -> DocumentIndex:
+    chunk_ids, matrix, rows = await vectors.load_matrix(document_id, with_text=True)
+    meta = [{"text": r.get("text", ""), "page": r.get("page")} for r in rows]
+    if lexical is not None and len(lexical) != len(rows):
+        lexical = None
+    return await jobs.run_blocking(_build_and_store, document_id, tag, chunk_ids, matrix, meta, lexical)
+
+
+async def publish(document_id: str, version, lexical: LexicalBuilder | None = None):
+    """Called when ingestion finishes: write the shared disk copy once and serve it locally.
+    `lexical` holds the postings ingestion accumulated; without it the text is tokenized here."""
+    try:
+        ix = await _build(document_id, vector_store.version_tag(version), lexical)
+        _validated[document_id] = time.monotonic()
+        _remember(ix)
+    except Exception as e:
+        invalidate(document_id)
+        logger.warning(f"⚠️ could not publish vector index for {document_id}: {e}")
+
+
+async def get(document_id: str) -> DocumentIndex | None:
+    """Lazily load (or reload after re-ingestion) the index for an indexed document."""
+    lock = _loading.setdefault(document_id, asyncio.Lock())
+    async with lock:
+        ix = await _get_locked(document_id)
+        # Drop the lock while still holding it: the index is cached by now, so a caller
+        # that arrives next and makes a fresh lock finds it instead of building it again
+        if _loading.get(document_id) is lock:
+            del _loading[document_id]
+    return ix
+
+
+async def _get_locked(document_id: str) -> DocumentIndex | None:
+    cached = _indexes.get(document_id)
+    # 1. Shared disk copy – no Mongo round trip while it is recently validated
+    tag = vector_store.current_version(document_id)
+    fresh = time.monotonic() - _validated.get(document_id, time.monotonic()) < REVALIDATE_AFTER
+    if tag is not None and fresh:
+        if cached is not None and cached.version == tag:
+            _indexes.move_to_end(document_id)
+            return cached
+        ix = await jobs.run_blocking(DocumentIndex.from_store, document_id, tag)
+        if ix is not None:
+            _validated.setdefault(document_id, time.monotonic())
+            _remember(ix)
+            return ix
+    # 2. Ask Mongo which version is current
+    version = await _version(document_id)
+    if version is None:
+        invalidate(document_id)
+        return None
+    tag = vector_store.version_tag(version)
+    _validated[document_id] = time.monotonic()
+    if cached is not None and cached.version == tag:
+        _indexes.move_to_end(document_id)
+        return cached
+    ix = None
+    if vector_store.current_version(document_id) == tag:
+        ix = await jobs.run_blocking(DocumentIndex.from_store, document_id, tag)
+    if ix is None:
+        ix = await _build(document_id, tag)
+    _remember(ix)
+    return ix
+
+
+def stats() -> dict:
+    return {
+        "loaded": len(_indexes),
+        "bytes": sum(ix.nbytes for ix in _indexes.values()),
+        "budget_bytes": INDEX_BUDGET,
+    }
@@ -0,0 +1,138 @@
+# app/services/vector_store.py
+# On-disk, memory-mapped copies of per-document vector indexes.
+# Written once by the worker that finishes ingestion; every gunicorn worker
+# opens the same files with mmap, so the OS page cache holds one copy.
+#
+#   {VECTOR_STORE_DIR}/{doc}/CURRENT            → name of the live version dir
+#   {VECTOR_STORE_DIR}/{doc}/{version}/
+#       meta.json        count, dim, version
+#       vectors.npy      float32 (n, dim), L2-normalized
+#       chunk_ids.npy    int64 (n,)
+#       pages.npy        int32 (n,), -1 when unknown
+#       text.bin         utf-8 chunk texts back to back
+#       text_offsets.npy int64 (n + 1,) byte offsets into text.bin
+#       ivf_*.npy        coarse quantizer, only for large documents
+#       lex_*            BM25 postings (see lexical_index.py)
+import json, os, re, shutil, tempfile, logging
+from datetime import datetime
+import numpy as np
+from app.services.lexical_index import LexicalIndex
+
+logger = logging.getLogger("book-query")
+
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "/tmp/vector_store")
+VECTOR_STORE_ENABLED = os.getenv("VECTOR_STORE", "1") == "1"
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def version_tag(version) -> str:
+    if isinstance(version, datetime):
+        # Mongo keeps milliseconds only; match what other workers read back
+        return version.strftime("%Y%m%dT%H%M%S") + f"{version.microsecond // 1000:03d}"
+    return _safe(str(version))
+
+
+def _doc_dir(document_id: str) -> str:
+    return os.path.join(VECTOR_STORE_DIR, _safe(document_id))
+
+
+class MmapTexts:
+    """List-like view of chunk text/page metadata backed by the mmap'd files."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, pages: np.ndarray):
+        self._blob, self._offsets, self._pages = blob, offsets, pages
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> dict:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        page = int(self._pages[i])
+        return {"text": self._blob[start:end].tobytes().decode("utf-8"), "page": page if page >= 0 else None}
+
+
+def current_version(document_id: str) -> str | None:
+    """Version tag of the live on-disk index, or None. One tiny file read, no Mongo."""
+    if not VECTOR_STORE_ENABLED:
+        return None
+    try:
+        with open(os.path.join(_doc_dir(document_id), "CURRENT")) as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save(ix) -> str:
+    """Persist a DocumentIndex (blocking). Writes a new version dir, then flips CURRENT atomically."""
+    tag = version_tag(ix.version)
+    doc_dir = _doc_dir(ix.document_id)
+    os.makedirs(doc_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{tag}-", dir=doc_dir)
+    try:
+        np.save(os.path.join(tmp, "vectors.npy"), np.ascontiguousarray(ix.matrix, dtype=np.float32))
+        np.save(os.path.join(tmp, "chunk_ids.npy"), np.asarray(ix.chunk_ids, dtype=np.int64))
+        np.save(os.path.join(tmp, "pages.npy"), np.array(
+            [m["page"] if m.get("page") is not None else -1 for m in (ix.meta[i] for i in range(len(ix.meta)))],
+            dtype=np.int32,
+        ))
+        offsets = np.zeros(len(ix.meta) + 1, dtype=np.int64)
+        with open(os.path.join(tmp, "text.bin"), "wb") as fh:
+            for i in range(len(ix.meta)):
+                data = ix.meta[i].get("text", "").encode("utf-8")
+                fh.write(data)
+                offsets[i + 1] = offsets[i] + len(data)
+        np.save(os.path.join(tmp, "text_offsets.npy"), offsets)
+        if ix.centroids is not None:
+            np.save(os.path.join(tmp, "ivf_centroids.npy"), ix.centroids)
+            np.save(os.path.join(tmp, "ivf_order.npy"), ix.order)
+            np.save(os.path.join(tmp, "ivf_offsets.npy"), ix.offsets)
+        ix.lexical.save(tmp)
+        with open(os.path.join(tmp, "meta.json"), "w") as fh:
+            json.dump({"document_id": ix.document_id, "version": tag,
+                       "count": int(len(ix.matrix)), "dim": int(ix.matrix.shape[1]) if ix.matrix.ndim == 2 else 0}, fh)
+        final = os.path.join(doc_dir, tag)
+        if os.path.exists(final):
+            shutil.rmtree(final)
+        os.rename(tmp, final)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    pointer = os.path.join(doc_dir, ".CURRENT.tmp")
+    with open(pointer, "w") as fh:
+        fh.write(tag)
+    os.replace(pointer, os.path.join(doc_dir, "CURRENT"))
+    # Older versions can go: workers still mapping them keep the inodes alive
+    for name in os.listdir(doc_dir):
+        if name not in (tag, "CURRENT") and not name.startswith("."):
+            shutil.rmtree(os.path.join(doc_dir, name), ignore_errors=True)
+    logger.info(f"💾 vector store written for {ix.document_id} ({len(ix.matrix)} chunks, version {tag})")
+    return tag
+
+
+def load(document_id: str, tag: str) -> dict | None:
+    """Open a stored version zero-copy; returns the pieces a DocumentIndex needs."""
+    path = os.path.join(_doc_dir(document_id), tag)
+    try:
+        mm = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        parts = {
+            "matrix": mm("vectors.npy"),
+            "chunk_ids": mm("chunk_ids.npy"),
+            "meta": MmapTexts(np.memmap(os.path.join(path, "text.bin"), dtype=np.uint8, mode="r")
+                              if os.path.getsize(os.path.join(path, "text.bin")) else np.zeros(0, np.uint8),
+                              mm("text_offsets.npy"), mm("pages.npy")),
+            "ivf": None,
+            "lexical": LexicalIndex.load(path),
+        }
+        if os.path.exists(os.path.join(path, "ivf_centroids.npy")):
+            parts["ivf"] = (np.load(os.path.join(path, "ivf_centroids.npy")),
+                            mm("ivf_order.npy"), np.load(os.path.join(path, "ivf_offsets.npy")))
+        return parts
+    except FileNotFoundError:
+        return None
+
+
+def remove(document_id: str):
+    shutil.rmtree(_doc_dir(document_id), ignore_errors=True)
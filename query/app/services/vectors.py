@@ -0,0 +1,74 @@
+# app/services/vectors.py
+# Packed binary storage for db.embeddings vectors.
+# Layout is BSON Binary subtype 9 (the MongoDB "vector" subtype):
+#   [dtype byte][padding byte][little-endian payload]
+# float32 → 4 bytes/dim, int8 → 1 byte/dim plus a per-vector `embedding_scale`.
+import os
+import numpy as np
+from bson.binary import Binary
+from app.db import get_db
+
+VECTOR_FORMAT = os.getenv("VECTOR_FORMAT", "float32")   # float32 | int8
+
+_SUBTYPE_VECTOR = 9
+_DTYPE_FLOAT32  = 0x27
+_DTYPE_INT8     = 0x03
+_HEADER         = 2
+
+
+def encode_vector(vec, fmt: str = VECTOR_FORMAT) -> dict:
+    """Fields to $set on an embeddings row for one vector."""
+    vec = np.asarray(vec, dtype=np.float32)
+    if fmt == "int8":
+        scale = float(np.abs(vec).max()) / 127.0 or 1.0
+        q = np.clip(np.rint(vec / scale), -127, 127).astype(np.int8)
+        return {
+            "embedding": Binary(bytes((_DTYPE_INT8, 0)) + q.tobytes(), _SUBTYPE_VECTOR),
+            "embedding_scale": scale,
+        }
+    if fmt != "float32":
+        raise ValueError(f"unknown VECTOR_FORMAT {fmt!r}")
+    return {"embedding": Binary(bytes((_DTYPE_FLOAT32, 0)) + vec.astype("<f4").tobytes(), _SUBTYPE_VECTOR)}
+
+
+def decode_into(row: dict, out: np.ndarray):
+    """Decode one stored embedding (binary or legacy BSON array) into a float32 row view."""
+    emb = row["embedding"]
+    if isinstance(emb, (bytes, Binary)):
+        dtype = emb[0]
+        if dtype == _DTYPE_FLOAT32:
+            out[:] = np.frombuffer(emb, dtype="<f4", offset=_HEADER)
+        elif dtype == _DTYPE_INT8:
+            np.multiply(np.frombuffer(emb, dtype=np.int8, offset=_HEADER), row.get("embedding_scale", 1.0), out=out)
+        else:
+            raise ValueError(f"unsupported vector dtype byte {dtype:#x}")
+    else:
+        out[:] = emb
+
+
+def decode_vector(row: dict) -> np.ndarray:
+    emb = row["embedding"]
+    dim = (len(emb) - _HEADER) // (4 if emb[0] == _DTYPE_FLOAT32 else 1) if isinstance(emb, (bytes, Binary)) else len(emb)
+    out = np.empty(dim, dtype=np.float32)
+    decode_into(row, out)
+    return out
+
+
+async def load_matrix(document_id: str, with_text: bool = False):
+    """
+    Read a document's vectors straight into one contiguous float32 matrix (rows ordered by chunk_id).
+    Returns (chunk_ids, matrix) or (chunk_ids, matrix, rows) when `with_text` is set.
+    """
+    projection = {"_id": 0, "chunk_id": 1, "embedding": 1, "embedding_scale": 1}
+    if with_text:
+        projection.update(text=1, page=1)
+    rows = await get_db().embeddings.find({"document_id": document_id}, projection).sort("chunk_id", 1).to_list(None)
+    if not rows:
+        matrix = np.empty((0, 0), dtype=np.float32)
+    else:
+        matrix = np.empty((len(rows), decode_vector(rows[0]).shape[0]), dtype=np.float32)
+        for i, row in enumerate(rows):
+            decode_into(row, matrix[i])
+            row.pop("embedding", None)
+    chunk_ids = np.fromiter((r["chunk_id"] for r in rows), dtype=np.int64, count=len(rows))
+    return (chunk_ids, matrix, rows) if with_text else (chunk_ids, matrix)
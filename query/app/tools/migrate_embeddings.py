@@ -0,0 +1,58 @@
+# app/tools/migrate_embeddings.py
+# Convert db.embeddings rows stored as BSON double arrays into packed binary vectors.
+#   python -m app.tools.migrate_embeddings [--format float32|int8] [--batch 500] [--document ID] [--dry-run]
+import argparse, asyncio, logging, time
+from pymongo import UpdateOne
+from app.db import get_db, close_clients
+from app.services import vectors
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s — %(levelname)s — %(message)s")
+logger = logging.getLogger("book-query")
+
+
+async def migrate(fmt: str, batch_size: int, document_id: str | None, dry_run: bool):
+    db = get_db()
+    query = {"embedding": {"$type": "array"}}
+    if document_id:
+        query["document_id"] = document_id
+    total = await db.embeddings.count_documents(query)
+    logger.info(f"🔁 {total} legacy embedding rows to convert to {fmt}")
+    if dry_run or not total:
+        return
+    done, started, ops = 0, time.monotonic(), []
+    async for row in db.embeddings.find(query, {"embedding": 1}).batch_size(batch_size):
+        # Guard on the array type so a concurrent re-run never double-converts a row
+        ops.append(UpdateOne(
+            {"_id": row["_id"], "embedding": {"$type": "array"}},
+            {"$set": vectors.encode_vector(row["embedding"], fmt)},
+        ))
+        if len(ops) >= batch_size:
+            await db.embeddings.bulk_write(ops, ordered=False)
+            done += len(ops)
+            ops = []
+            logger.info(f"   {done}/{total} rows ({done / (time.monotonic() - started):.0f} rows/s)")
+    if ops:
+        await db.embeddings.bulk_write(ops, ordered=False)
+        done += len(ops)
+    logger.info(f"✅ converted {done} rows in {time.monotonic() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert legacy db.embeddings arrays to packed binary vectors")
+    parser.add_argument("--format", choices=["float32", "int8"], default=vectors.VECTOR_FORMAT)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--document", help="only migrate this document_id")
+    parser.add_argument("--dry-run", action="store_true", help="count legacy rows and exit")
+    args = parser.parse_args()
+
+    async def run():
+        try:
+            await migrate(args.format, args.batch, args.document, args.dry_run)
+        finally:
+            close_clients()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# bench/compare.py
+# Side-by-side of two bench/run.py result files.
+#   python -m bench.compare baseline.json candidate.json
+import argparse, json
+
+# (path inside a scenario, higher is better)
+_METRICS = [
+    ("rps", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("pages_per_second", True),
+    ("chunks_per_second", True),
+    ("memory.after.peak_rss_mb", False),
+]
+
+
+def _get(data: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def compare(old: dict, new: dict) -> list[str]:
+    lines = [f"{'scenario':<8} {'metric':<26} {'baseline':>12} {'candidate':>12} {'change':>9}"]
+    for name in [n for n in new["scenarios"] if n in old["scenarios"]]:
+        for path, higher_is_better in _METRICS:
+            a, b = _get(old["scenarios"][name], path), _get(new["scenarios"][name], path)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a * 100 if a else 0.0
+            better = (change > 0) == higher_is_better
+            mark = "" if abs(change) < 2 else ("+" if better else "-")
+            lines.append(f"{name:<8} {path:<26} {a:>12} {b:>12} {change:>+8.1f}% {mark}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+    with open(args.baseline) as fa, open(args.candidate) as fb:
+        old, new = json.load(fa), json.load(fb)
+    for meta in (old["meta"], new["meta"]):
+        print(f"# {meta.get('commit') or '?'}  {meta['started_at']}  mongo={meta['mongo']}  encoder={meta['args']['encoder']}")
+    print("\n".join(compare(old, new)))
@@ -0,0 +1,547 @@
+# bench/memory_mongo.py
+# In-memory stand-in for the Motor client and GridFS buckets, covering the
+# operations the service actually uses (see `grep get_db app`). Single process,
+# no persistence, TTL indexes ignored; unique indexes and _id collisions raise
+# DuplicateKeyError like the server does (import flights rely on that).
+# Change streams raise OperationFailure(40573), as on a standalone mongod, so
+# progress falls back to polling.
+import asyncio, copy
+from datetime import datetime, timezone
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.operations import DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+
+_MISSING = object()
+
+
+# ────────────────────────────────────────────────────────────────
+# Query language (the subset the app uses)
+# ────────────────────────────────────────────────────────────────
+def _get(doc, path: str):
+    """Value at a dotted path; arrays of sub-documents fan out like in Mongo."""
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and not part.isdigit():
+            found = [v.get(part, _MISSING) for v in value if isinstance(v, dict)]
+            value = [v for v in found if v is not _MISSING] or _MISSING
+        elif isinstance(value, list):
+            value = value[int(part)] if int(part) < len(value) else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+def _candidates(value):
+    return value if isinstance(value, list) else [value]
+
+def _compare(value, bound, op) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        return any(op(v, bound) for v in _candidates(value))
+    except TypeError:
+        return False
+
+_TYPES = {"array": list, "string": str, "object": dict, "bool": bool, "date": datetime, "objectId": ObjectId}
+
+def _condition(value, cond) -> bool:
+    if not (isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond)):
+        if value is _MISSING:
+            return cond is None
+        return value == cond or (isinstance(value, list) and cond in value)
+    for op, arg in cond.items():
+        if op == "$eq":
+            ok = _condition(value, arg)
+        elif op == "$ne":
+            ok = not _condition(value, arg)
+        elif op == "$lt":
+            ok = _compare(value, arg, lambda a, b: a < b)
+        elif op == "$lte":
+            ok = _compare(value, arg, lambda a, b: a <= b)
+        elif op == "$gt":
+            ok = _compare(value, arg, lambda a, b: a > b)
+        elif op == "$gte":
+            ok = _compare(value, arg, lambda a, b: a >= b)
+        elif op == "$in":
+            ok = value is not _MISSING and any(v in arg for v in _candidates(value))
+        elif op == "$nin":
+            ok = value is _MISSING or not any(v in arg for v in _candidates(value))
+        elif op == "$exists":
+            ok = (value is not _MISSING) == bool(arg)
+        elif op == "$size":
+            ok = isinstance(value, list) and len(value) == arg
+        elif op == "$type":
+            ok = value is not _MISSING and isinstance(value, _TYPES[arg])
+        else:
+            raise NotImplementedError(f"memory mongo: query operator {op}")
+        if not ok:
+            return False
+    return True
+
+def matches(doc: dict, flt: dict | None) -> bool:
+    for key, cond in (flt or {}).items():
+        if key == "$or":
+            if not any(matches(doc, f) for f in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, f) for f in cond):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, f) for f in cond):
+                return False
+        elif not _condition(_get(doc, key), cond):
+            return False
+    return True
+
+
+# ────────────────────────────────────────────────────────────────
+# Updates and projections
+# ────────────────────────────────────────────────────────────────
+def _parent(doc: dict, path: str, create: bool):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        if part not in doc or not isinstance(doc[part], dict):
+            if not create:
+                return None, leaf
+            doc[part] = {}
+        doc = doc[part]
+    return doc, leaf
+
+def _apply(doc: dict, update: dict, inserting: bool):
+    if not any(k.startswith("$") for k in update):
+        keep = doc.get("_id")
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if keep is not None:
+            doc["_id"] = keep
+        return
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, arg in fields.items():
+            parent, leaf = _parent(doc, path, create=op != "$unset")
+            if op in ("$set", "$setOnInsert"):
+                parent[leaf] = copy.deepcopy(arg)
+            elif op == "$unset":
+                if parent is not None:
+                    parent.pop(leaf, None)
+            elif op == "$inc":
+                parent[leaf] = parent.get(leaf, 0) + arg
+            elif op == "$addToSet":
+                items = parent.setdefault(leaf, [])
+                for item in (arg["$each"] if isinstance(arg, dict) and "$each" in arg else [arg]):
+                    if item not in items:
+                        items.append(copy.deepcopy(item))
+            elif op == "$push":
+                parent.setdefault(leaf, []).append(copy.deepcopy(arg))
+            elif op == "$pull":
+                if isinstance(parent.get(leaf), list):
+                    parent[leaf] = [v for v in parent[leaf] if not _condition(v, arg)]
+            else:
+                raise NotImplementedError(f"memory mongo: update operator {op}")
+
+def _seed(flt: dict) -> dict:
+    """Upserted document: the filter's plain equality fields."""
+    doc = {}
+    for key, cond in flt.items():
+        if key.startswith("$") or (isinstance(cond, dict) and any(k.startswith("$") for k in cond)):
+            continue
+        parent, leaf = _parent(doc, key, create=True)
+        parent[leaf] = copy.deepcopy(cond)
+    return doc
+
+def _project(doc: dict, projection) -> dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include or projection == {"_id": 1}:
+        out = {}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        for path in include:
+            value = _get(doc, path)
+            if value is not _MISSING:
+                parent, leaf = _parent(out, path, create=True)
+                parent[leaf] = copy.deepcopy(value)
+        return out
+    out = copy.deepcopy(doc)
+    for path, keep in projection.items():
+        if not keep:
+            parent, leaf = _parent(out, path, create=False)
+            if parent is not None:
+                parent.pop(leaf, None)
+    return out
+
+def _key(doc: dict, fields: tuple) -> tuple:
+    return tuple(repr(_get(doc, f)) for f in fields)
+
+def _sort_key(fields):
+    def key(doc):
+        out = []
+        for name, _ in fields:
+            value = _get(doc, name)
+            out.append((0, 0) if value is _MISSING or value is None else (1, value))
+        return out
+    return key
+
+
+# ────────────────────────────────────────────────────────────────
+# Collections and cursors
+# ────────────────────────────────────────────────────────────────
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+        self.acknowledged = True
+
+
+class MemoryCursor:
+    def __init__(self, collection: "MemoryCollection", flt, projection):
+        self._collection, self._filter, self._projection = collection, flt, projection
+        self._sort: list[tuple[str, int]] = []
+        self._limit = 0
+        self._rows = None
+
+    def sort(self, key, direction: int = 1):
+        self._sort = list(key) if isinstance(key, list) else [(key, direction)]
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def batch_size(self, n: int):
+        return self
+
+    def _materialize(self) -> list[dict]:
+        if self._rows is None:
+            docs = [d for d in self._collection._docs.values() if matches(d, self._filter)]
+            for name, direction in reversed(self._sort):
+                docs.sort(key=_sort_key([(name, direction)]), reverse=direction < 0)
+            if self._limit:
+                docs = docs[:self._limit]
+            self._rows = [_project(d, self._projection) for d in docs]
+        return self._rows
+
+    async def to_list(self, length=None):
+        rows = self._materialize()
+        return rows[:length] if length else list(rows)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self._materialize():
+            yield row
+
+
+class MemoryCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self._docs: dict = {}
+        self._unique: dict[tuple[str, ...], dict] = {}   # unique fields → {values: _id}
+
+    # ── indexes ─────────────────────────────────────────────────
+    async def create_index(self, keys, unique: bool = False, **kwargs):
+        fields = (keys,) if isinstance(keys, str) else tuple(k for k, _ in keys)
+        if unique and fields not in self._unique:
+            self._unique[fields] = {_key(d, fields): i for i, d in self._docs.items()}
+        return kwargs.get("name") or "_".join(fields)
+
+    def _store(self, doc: dict, replacing=_MISSING):
+        doc.setdefault("_id", ObjectId())
+        if replacing is _MISSING and doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} _id: {doc['_id']!r}")
+        keys = {fields: _key(doc, fields) for fields in self._unique}
+        for fields, key in keys.items():
+            if self._unique[fields].get(key, doc["_id"]) != doc["_id"]:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {fields}")
+        if replacing is not _MISSING:
+            self._unindex(self._docs[replacing])
+        for fields, key in keys.items():
+            self._unique[fields][key] = doc["_id"]
+        self._docs[doc["_id"]] = doc
+
+    def _unindex(self, doc: dict):
+        for fields, index in self._unique.items():
+            index.pop(_key(doc, fields), None)
+
+    def _remove(self, doc_id):
+        self._unindex(self._docs.pop(doc_id))
+
+    def _first(self, flt, sort=None):
+        if sort:
+            docs = MemoryCursor(self, flt, None).sort(sort)._materialize()
+            return self._docs[docs[0]["_id"]] if docs else None
+        # Fast paths: {"_id": x, …} and exact unique-index lookups (embeddings upserts)
+        if flt and "_id" in flt and not isinstance(flt["_id"], dict):
+            doc = self._docs.get(flt["_id"])
+            return doc if doc is not None and matches(doc, flt) else None
+        for fields, index in self._unique.items():
+            if set(fields) == set(flt or ()) and not any(isinstance(flt[f], dict) for f in fields):
+                doc = self._docs.get(index.get(_key(flt, fields)))
+                return doc if doc is not None and matches(doc, flt) else None
+        return next((d for d in self._docs.values() if matches(d, flt)), None)
+
+    # ── reads ───────────────────────────────────────────────────
+    async def find_one(self, flt=None, projection=None, sort=None, **kwargs):
+        doc = self._first(flt or {}, sort)
+        return _project(doc, projection) if doc is not None else None
+
+    def find(self, flt=None, projection=None, **kwargs):
+        return MemoryCursor(self, flt or {}, projection)
+
+    async def count_documents(self, flt, **kwargs):
+        return sum(1 for d in self._docs.values() if matches(d, flt))
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    # ── writes ──────────────────────────────────────────────────
+    async def insert_one(self, doc: dict, **kwargs):
+        doc = copy.deepcopy(doc)
+        self._store(doc)
+        return _Result(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs: list[dict], ordered: bool = True, **kwargs):
+        ids, errors = [], []
+        for i, doc in enumerate(docs):
+            try:
+                ids.append((await self.insert_one(doc)).inserted_id)
+            except DuplicateKeyError as e:
+                errors.append({"index": i, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(ids)})
+        return _Result(inserted_ids=ids)
+
+    def _upsert(self, flt: dict, update: dict) -> dict:
+        doc = _seed(flt)
+        _apply(doc, update, inserting=True)
+        if "_id" in flt and not isinstance(flt["_id"], dict):
+            doc["_id"] = flt["_id"]
+        self._store(doc)
+        return doc
+
+    def _update(self, doc: dict, update: dict):
+        updated = copy.deepcopy(doc)
+        _apply(updated, update, inserting=False)
+        self._store(updated, replacing=doc["_id"])
+        return updated
+
+    async def update_one(self, flt, update, upsert: bool = False, **kwargs):
+        doc = self._first(flt)
+        if doc is None:
+            if not upsert:
+                return _Result(matched_count=0, modified_count=0, upserted_id=None)
+            return _Result(matched_count=0, modified_count=0, upserted_id=self._upsert(flt, update)["_id"])
+        self._update(doc, update)
+        return _Result(matched_count=1, modified_count=1, upserted_id=None)
+
+    async def update_many(self, flt, update, upsert: bool = False, **kwargs):
+        docs = [d for d in self._docs.values() if matches(d, flt)]
+        for doc in docs:
+            self._update(doc, update)
+        if not docs and upsert:
+            return _Result(matched_count=0, modified_count=0, upserted_id=self._upsert(flt, update)["_id"])
+        return _Result(matched_count=len(docs), modified_count=len(docs), upserted_id=None)
+
+    async def replace_one(self, flt, replacement, upsert: bool = False, **kwargs):
+        return await self.update_one(flt, replacement, upsert=upsert)
+
+    async def find_one_and_update(self, flt, update, projection=None, upsert: bool = False,
+                                  return_document=ReturnDocument.BEFORE, sort=None, **kwargs):
+        doc = self._first(flt, sort)
+        if doc is None:
+            if not upsert:
+                return None
+            created = self._upsert(flt, update)
+            return _project(created, projection) if return_document == ReturnDocument.AFTER else None
+        updated = self._update(doc, update)
+        return _project(updated if return_document == ReturnDocument.AFTER else doc, projection)
+
+    async def delete_one(self, flt, **kwargs):
+        doc = self._first(flt)
+        if doc is not None:
+            self._remove(doc["_id"])
+        return _Result(deleted_count=int(doc is not None))
+
+    async def delete_many(self, flt, **kwargs):
+        ids = [i for i, d in self._docs.items() if matches(d, flt)]
+        for i in ids:
+            self._remove(i)
+        return _Result(deleted_count=len(ids))
+
+    async def bulk_write(self, requests: list, ordered: bool = True, **kwargs):
+        counts = dict(inserted_count=0, matched_count=0, modified_count=0, deleted_count=0, upserted_count=0)
+        errors = []
+        for i, op in enumerate(requests):
+            try:
+                if isinstance(op, InsertOne):
+                    await self.insert_one(op._doc)
+                    counts["inserted_count"] += 1
+                    continue
+                if isinstance(op, (ReplaceOne, UpdateOne)):
+                    result = await self.update_one(op._filter, op._doc, upsert=op._upsert)
+                elif isinstance(op, UpdateMany):
+                    result = await self.update_many(op._filter, op._doc, upsert=op._upsert)
+                elif isinstance(op, DeleteOne):
+                    counts["deleted_count"] += (await self.delete_one(op._filter)).deleted_count
+                    continue
+                else:
+                    raise NotImplementedError(f"memory mongo: bulk op {type(op).__name__}")
+                counts["matched_count"] += result.matched_count
+                counts["modified_count"] += result.modified_count
+                counts["upserted_count"] += int(result.upserted_id is not None)
+            except DuplicateKeyError as e:
+                errors.append({"index": i, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, **counts})
+        return _Result(**counts)
+
+
+class MemoryDatabase:
+    def __init__(self, name: str):
+        self.name = name
+        self._collections: dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def drop_collection(self, name: str):
+        self._collections.pop(name, None)
+
+
+class MemoryClient:
+    def __init__(self):
+        self._databases: dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(name)
+        return self._databases[name]
+
+    def close(self):
+        pass
+
+
+# ────────────────────────────────────────────────────────────────
+# GridFS
+# ────────────────────────────────────────────────────────────────
+CHUNK_SIZE = 255 * 1024
+
+
+class MemoryGridIn:
+    def __init__(self, bucket: "MemoryGridFSBucket", filename: str, metadata: dict | None):
+        self._bucket, self.filename, self.metadata = bucket, filename, metadata
+        self._id = ObjectId()
+        self._parts: list[bytes] = []
+        self.closed = False
+
+    async def write(self, data: bytes):
+        self._parts.append(bytes(data))
+        await asyncio.sleep(0)   # a real write yields to the loop
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        data = b"".join(self._parts)
+        self._bucket._data[self._id] = data
+        await self._bucket._files.insert_one({
+            "_id": self._id, "filename": self.filename, "length": len(data), "chunkSize": CHUNK_SIZE,
+            "uploadDate": datetime.now(timezone.utc).replace(tzinfo=None), "metadata": self.metadata,
+        })
+
+    async def abort(self):
+        self.closed = True
+        self._parts.clear()
+
+
+class MemoryGridOut:
+    def __init__(self, file: dict, data: bytes):
+        self._id, self.filename, self.length = file["_id"], file["filename"], file["length"]
+        self.upload_date, self.metadata = file["uploadDate"], file.get("metadata")
+        self._data, self._pos = data, 0
+
+    def seek(self, pos: int, whence: int = 0):
+        self._pos = pos if whence == 0 else (self._pos + pos if whence == 1 else self.length + pos)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    async def readchunk(self) -> bytes:
+        end = min((self._pos // CHUNK_SIZE + 1) * CHUNK_SIZE, self.length)
+        return await self.read(end - self._pos)
+
+    async def read(self, size: int = -1) -> bytes:
+        end = self.length if size is None or size < 0 else min(self._pos + size, self.length)
+        data, self._pos = self._data[self._pos:end], end
+        return data
+
+    def close(self):
+        pass
+
+
+class MemoryGridFSBucket:
+    def __init__(self, database: MemoryDatabase, bucket_name: str = "fs"):
+        self._files = database[f"{bucket_name}.files"]
+        self._data: dict[ObjectId, bytes] = {}
+
+    def open_upload_stream(self, filename: str, metadata: dict | None = None, **kwargs) -> MemoryGridIn:
+        return MemoryGridIn(self, filename, metadata)
+
+    async def open_download_stream(self, file_id) -> MemoryGridOut:
+        file = await self._files.find_one({"_id": file_id})
+        if file is None:
+            raise NoFile(f"no file in gridfs with _id {file_id!r}")
+        return MemoryGridOut(file, self._data[file_id])
+
+    async def open_download_stream_by_name(self, filename: str, revision: int = -1) -> MemoryGridOut:
+        files = await self._files.find({"filename": filename}).sort("uploadDate", 1).to_list(None)
+        try:
+            file = files[revision]
+        except IndexError:
+            raise NoFile(f"no version {revision} for filename {filename!r}") from None
+        return MemoryGridOut(file, self._data[file["_id"]])
+
+    def find(self, flt=None, **kwargs) -> MemoryCursor:
+        return self._files.find(flt)
+
+    async def delete(self, file_id):
+        result = await self._files.delete_one({"_id": file_id})
+        self._data.pop(file_id, None)
+        if not result.deleted_count:
+            raise NoFile(f"no file could be deleted because none matched {file_id!r}")
+
+    @property
+    def stored_bytes(self) -> int:
+        return sum(len(d) for d in self._data.values())
+
+
+def install(db_name: str, textbook_db: str = "textbooks") -> MemoryClient:
+    """Point app.db's process-wide clients and buckets at fresh in-memory ones."""
+    from app import db
+    client, textbooks = MemoryClient(), MemoryClient()
+    db._client = client
+    db._gridfs = MemoryGridFSBucket(client[db_name])
+    db._textbook_client = textbooks
+    db._textbook_fs = MemoryGridFSBucket(textbooks[textbook_db])
+    return client
@@ -0,0 +1,221 @@
+# bench/providers.py
+# Stand-ins for Google Books, Open Library, archive.org, Gutendex and the PDF
+# hosts, served by a real uvicorn server in a child process on 127.0.0.1.
+# Every upstream host gets its own ephemeral port, and the app's own pooled
+# transport (http_pool.pooled_transport) is only re-pointed at those ports, so
+# TCP connects, keep-alive reuse and the per-host/pool limits are all exercised.
+# Responses are replayed from bench/fixtures/*.json with placeholders filled:
+#   {query} → the search words, {qid} → a per-query id, {id} → the requested id
+# Every request pays `latency` ± `jitter` seconds; `failure_rate` of them get a
+# 503 and `timeout_rate` never answer (the client's read timeout fires), both seeded.
+import asyncio, json, multiprocessing as mp, os, queue, random, re, socket, time, urllib.parse, zlib
+from collections import Counter
+import httpx
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+HOSTS = ("www.googleapis.com", "openlibrary.org", "archive.org", "gutendex.com", "www.gutenberg.org")
+_DEFAULT = "*"   # any other host (e.g. a PDF link elsewhere) shares one port
+
+# (host, path pattern) → fixture; first match wins
+_ROUTES = [
+    ("www.googleapis.com", re.compile(r"^/books/v1/volumes$"), "google_books_search"),
+    ("openlibrary.org", re.compile(r"^/search\.json$"), "open_library_search"),
+    ("openlibrary.org", re.compile(r"^/books/(?P<id>[^/]+)\.json$"), "open_library_edition"),
+    ("archive.org", re.compile(r"^/advancedsearch\.php$"), "internet_archive_search"),
+    ("archive.org", re.compile(r"^/metadata/(?P<id>[^/]+)$"), "internet_archive_metadata"),
+    ("gutendex.com", re.compile(r"^/books/$"), "gutendex_search"),
+    ("gutendex.com", re.compile(r"^/books/(?P<id>\d+)/$"), "gutendex_book"),
+]
+
+
+class StandInApp:
+    """ASGI app behind every stand-in port; dispatches on the Host header the client kept."""
+    def __init__(self, pdf: bytes, latency: float, jitter: float, failure_rate: float, timeout_rate: float,
+                 bytes_per_second: float | None, fixtures: str, seed: int, hang: float):
+        self.pdf = pdf
+        self.latency, self.jitter, self.hang = latency, jitter, hang
+        self.failure_rate, self.timeout_rate = failure_rate, timeout_rate
+        self.bytes_per_second = bytes_per_second
+        self._rng = random.Random(seed)
+        self._fixtures = {}
+        for name in os.listdir(fixtures):
+            if name.endswith(".json"):
+                with open(os.path.join(fixtures, name)) as fh:
+                    self._fixtures[name[:-5]] = fh.read()
+        self.requests: Counter = Counter()      # host → requests
+        self.failures: Counter = Counter()      # host → injected 503s/timeouts
+        self.connections: Counter = Counter()   # host → distinct client connections seen
+        self._seen: set = set()
+
+    def _render(self, fixture: str, query: str = "", ref_id: str = "") -> bytes:
+        text = self._fixtures[fixture]
+        # json.dumps(...)[1:-1] keeps quotes/backslashes in the values valid JSON
+        qid = f"{zlib.crc32(query.encode()):08x}"
+        for placeholder, value in (("{query}", query.title()), ("{qid}", qid), ("{id}", ref_id)):
+            text = text.replace(placeholder, json.dumps(value)[1:-1])
+        return text.encode()
+
+    def _pdf_for(self, path: str) -> bytes:
+        # Distinct bytes per URL, so every import is new content (no dedup shortcut)
+        return self.pdf + f"\n% bench {path}\n".encode()
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope["headers"])
+        host = headers.get(b"host", b"").decode().split(":")[0]
+        path, method = scope["path"], scope["method"]
+        if path == "/_stats":
+            return await _respond(send, 200, json.dumps(self.stats()).encode(), "application/json")
+
+        self.requests[host] += 1
+        if (conn := (host, tuple(scope.get("client") or ()))) not in self._seen:
+            self._seen.add(conn)
+            self.connections[host] += 1
+        await asyncio.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+        roll = self._rng.random()
+        if roll < self.timeout_rate:
+            self.failures[host] += 1
+            await asyncio.sleep(self.hang)
+            return await _respond(send, 504, b"{}", "application/json")
+        if roll < self.timeout_rate + self.failure_rate:
+            self.failures[host] += 1
+            return await _respond(send, 503, b'{"error": "injected failure"}', "application/json")
+
+        if path.endswith(".pdf"):
+            data = self._pdf_for(path)
+            if method == "HEAD":
+                return await _respond(send, 200, b"", "application/pdf", length=len(data))
+            return await _respond(send, 200, data, "application/pdf", rate=self.bytes_per_second)
+
+        for route_host, pattern, fixture in _ROUTES:
+            match = pattern.match(path) if host == route_host else None
+            if match:
+                params = dict(urllib.parse.parse_qsl(scope["query_string"].decode()))
+                query = params.get("q") or params.get("search") or ""
+                if host == "archive.org":
+                    query = query.split(" AND ")[0]
+                body = self._render(fixture, query, match.groupdict().get("id", ""))
+                return await _respond(send, 200, body, "application/json")
+        await _respond(send, 404, json.dumps({"error": f"no stand-in for {host}{path}"}).encode(), "application/json")
+
+    def stats(self) -> dict:
+        return {"requests": dict(self.requests), "injected_failures": dict(self.failures),
+                "connections": dict(self.connections)}
+
+
+async def _respond(send, status: int, body: bytes, content_type: str, length: int | None = None,
+                   rate: float | None = None, chunk: int = 256 * 1024):
+    """Send a response; with `rate` (bytes/s) the body goes out in paced chunks."""
+    headers = [(b"content-type", content_type.encode()),
+               (b"content-length", str(len(body) if length is None else length).encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    if not rate or len(body) <= chunk:
+        await send({"type": "http.response.body", "body": body})
+        return
+    for start in range(0, len(body), chunk):
+        piece = body[start:start + chunk]
+        await asyncio.sleep(len(piece) / rate)
+        await send({"type": "http.response.body", "body": piece, "more_body": start + chunk < len(body)})
+
+
+def _serve(app_kwargs: dict, ports: "mp.Queue"):
+    """Child process: bind one socket per host, report the ports, serve until terminated.
+    A failure (uvicorn missing, bind error, …) is reported on the same queue before exiting."""
+    try:
+        import uvicorn
+        sockets = {}
+        for host in (*HOSTS, _DEFAULT):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("127.0.0.1", 0))
+            sockets[host] = sock
+        ports.put({host: sock.getsockname()[1] for host, sock in sockets.items()})
+        config = uvicorn.Config(StandInApp(**app_kwargs), lifespan="off", log_level="error", access_log=False,
+                                timeout_keep_alive=60, backlog=2048)
+        uvicorn.Server(config).run(sockets=list(sockets.values()))
+    except BaseException as e:
+        ports.put({"error": f"{type(e).__name__}: {e}"})
+        raise
+
+
+class LocalRoute(httpx.AsyncBaseTransport):
+    """Re-point requests at the stand-in port for their host; the Host header keeps the real name."""
+    def __init__(self, inner: httpx.AsyncBaseTransport, ports: dict[str, int]):
+        self._inner, self._ports = inner, ports
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        port = self._ports.get(request.url.host, self._ports[_DEFAULT])
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=port)
+        return await self._inner.handle_async_request(request)
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+
+class StandInProviders:
+    """Owns the stand-in server process: start(), transport() for http_pool, stats(), stop()."""
+    def __init__(self, pdf: bytes, latency: float = 0.08, jitter: float = 0.04,
+                 failure_rate: float = 0.0, timeout_rate: float = 0.0,
+                 bandwidth_mbps: float | None = None, fixtures: str = FIXTURES, seed: int = 0, hang: float = 60.0):
+        self._kwargs = dict(pdf=pdf, latency=latency, jitter=jitter, failure_rate=failure_rate,
+                            timeout_rate=timeout_rate, bytes_per_second=bandwidth_mbps * 125_000 if bandwidth_mbps else None,
+                            fixtures=fixtures, seed=seed, hang=hang)
+        self._process: mp.Process | None = None
+        self._replies: "mp.Queue | None" = None
+        self.ports: dict[str, int] = {}
+
+    def start(self, timeout: float = 30.0):
+        # spawn: the parent may already hold threads (encoder, pools) that don't survive fork
+        ctx = mp.get_context("spawn")
+        self._replies = ctx.Queue()
+        self._process = ctx.Process(target=_serve, args=(self._kwargs, self._replies), daemon=True)
+        self._process.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                reply = self._replies.get(timeout=0.1)
+                break
+            except queue.Empty:
+                self._check_alive()
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError(f"stand-in providers did not report their ports within {timeout:.0f}s")
+        if "error" in reply:
+            self.stop()
+            raise RuntimeError(f"stand-in providers failed to start: {reply['error']}")
+        self.ports = reply
+        # The ports are bound before uvicorn starts accepting: wait until it answers
+        with httpx.Client(base_url=f"http://127.0.0.1:{self.ports[_DEFAULT]}") as client:
+            while time.monotonic() < deadline:
+                try:
+                    client.get("/_stats")
+                    return self
+                except httpx.TransportError:
+                    self._check_alive()
+                    time.sleep(0.05)
+        self.stop()
+        raise RuntimeError("stand-in providers did not come up")
+
+    def _check_alive(self):
+        """Raise with the child's own error (or at least its exit code) once it has died."""
+        if self._process.is_alive():
+            return
+        try:
+            error = self._replies.get(timeout=1.0).get("error")
+        except queue.Empty:
+            error = None
+        code = self._process.exitcode
+        self._process = None
+        raise RuntimeError(f"stand-in providers exited with code {code}" + (f": {error}" if error else ""))
+
+    def transport(self, inner: httpx.AsyncBaseTransport) -> LocalRoute:
+        return LocalRoute(inner, self.ports)
+
+    async def stats(self) -> dict:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{self.ports[_DEFAULT]}") as client:
+            return (await client.get("/_stats")).json()
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(timeout=10)
+            self._process = None
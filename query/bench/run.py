@@ -0,0 +1,393 @@
+# bench/run.py
+# Offline benchmark for the query service. The real app runs in-process over
+# ASGI against stand-in provider servers on localhost (bench/providers.py,
+# reached through the app's own connection pool), an in-memory Mongo/GridFS
+# (bench/memory_mongo.py, or --mongo-uri for a local mongod) and synthetic PDFs.
+#
+#   python -m bench.run                                   # every scenario, defaults
+#   python -m bench.run --scenarios search --requests 500 --concurrency 32 \
+#       --latency-ms 150 --failure-rate 0.05
+#   python -m bench.run --encoder hash --pages 300 --out /tmp/run-a.json
+#   python -m bench.compare /tmp/run-a.json /tmp/run-b.json
+#
+# Scenarios: search (GET /search, distinct queries), import (POST /import),
+# upload (POST /import/upload), ingest (parse_and_index, pages/sec). Results go
+# to --out as JSON (stdout when omitted); a short summary goes to stderr.
+import argparse, asyncio, contextlib, io, json, logging, os, platform, subprocess, sys, tempfile, time, zlib
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+from bench.synthetic_pdf import make_pdf, variant
+
+SCENARIOS = ("search", "import", "upload", "ingest")
+_QUERY_WORDS = ("calculus", "algebra", "physics", "chemistry", "statistics", "geometry", "biology", "economics")
+
+
+# ────────────────────────────────────────────────────────────────
+# Measurement helpers
+# ────────────────────────────────────────────────────────────────
+def _percentiles(samples: list[float], scale: float = 1000.0) -> dict:
+    if not samples:
+        return {}
+    arr = np.asarray(samples) * scale
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "mean": round(float(arr.mean()), 3),
+        "max": round(float(arr.max()), 3),
+    }
+
+
+def _memory() -> dict:
+    """Resident and peak resident set of this process, in MiB (Linux /proc, else getrusage)."""
+    try:
+        with open("/proc/self/status") as fh:
+            fields = dict(line.split(":", 1) for line in fh if line.startswith(("VmRSS", "VmHWM")))
+        return {"rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+                "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1)}
+    except (OSError, KeyError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        return {"rss_mb": None, "peak_rss_mb": round(peak_mb, 1)}
+
+
+def _reset_peak():
+    """Start a fresh peak-RSS window (Linux ≥ 4.0; elsewhere the peak is process-wide)."""
+    with contextlib.suppress(OSError):
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+
+
+async def _drive(n: int, concurrency: int, send) -> dict:
+    """Closed loop: `concurrency` clients issue `send(i)` for i in range(n) back to back."""
+    latencies, statuses = [], Counter()
+    pending = iter(range(n))
+
+    async def client():
+        for i in pending:
+            started = time.perf_counter()
+            try:
+                response = await send(i)
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    _reset_peak()
+    before = _memory()
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        "requests": n,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall, 3),
+        "rps": round(n / wall, 2) if wall else None,
+        "latency_ms": _percentiles(latencies),
+        "status": dict(statuses),
+        "memory": {"before": before, "after": _memory()},
+    }
+
+
+def _stage_totals(hist) -> dict:
+    return {labels[0]: totals for labels, totals in hist.totals().items()}
+
+
+def _stage_delta(before: dict, after: dict) -> dict:
+    out = {}
+    for stage, (count, total) in after.items():
+        prev_count, prev_total = before.get(stage, (0, 0.0))
+        if count > prev_count:
+            out[stage] = {"count": count - prev_count, "seconds": round(total - prev_total, 3)}
+    return out
+
+
+class HashEncoder:
+    """Deterministic stand-in for the SentenceTransformer: hashed bag of words → unit vector.
+    Isolates the pipeline (extraction, chunking, storage, indexing) from model cost."""
+    tokenizer = None
+    max_seq_length = 256
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                out[row, zlib.crc32(word.encode()) % self.dim] += 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+# ────────────────────────────────────────────────────────────────
+# Scenarios
+# ────────────────────────────────────────────────────────────────
+async def bench_search(ctx, args) -> dict:
+    from app.services import catalog, search_cache
+    distinct = args.distinct_queries or args.requests
+    headers = Counter()
+
+    async def send(i):
+        n = i % distinct
+        q = f"{_QUERY_WORDS[n % len(_QUERY_WORDS)]} {n}"
+        response = await ctx.client.get("/search", params={"q": q})
+        for marker in ("X-Search-Timed-Out", "X-Search-Failed", "X-Search-Skipped"):
+            for name in filter(None, response.headers.get(marker, "").split(",")):
+                headers[f"{marker[9:].lower()}:{name}"] += 1
+        if response.headers.get("X-Search-Source") == "catalog":
+            headers["catalog"] += 1
+        return response
+
+    result = await _drive(args.requests, args.concurrency, send)
+    result["distinct_queries"] = distinct
+    result["partial_results"] = dict(headers)
+    result["search_cache"] = search_cache.stats()
+    result["catalog"] = catalog.stats()
+    return result
+
+
+async def bench_import(ctx, args) -> dict:
+    sources = ("gutenberg", "openlibrary", "ia")
+
+    async def send(i):
+        source = sources[i % len(sources)]
+        ref = {"gutenberg": {"id": 40000 + i}, "openlibrary": {"edition": f"OL{i}BM"}, "ia": {"id": f"bench{i}"}}[source]
+        return await ctx.client.post("/import", json={
+            "candidate_id": f"{ctx.run_id}-imp-{i}", "title": f"Bench import {i}", "source": source, "ref": ref,
+        })
+
+    result = await _drive(args.requests, args.concurrency, send)
+    result["ingestion_drain_seconds"] = await _drain(args.drain_timeout)
+    return result
+
+
+async def bench_upload(ctx, args) -> dict:
+    async def send(i):
+        doc_id = f"{ctx.run_id}-up-{i}"
+        return await ctx.client.post(
+            "/import/upload",
+            files={"file": (f"{doc_id}.pdf", variant(ctx.pdf, doc_id), "application/pdf")},
+            data={"title": f"Bench upload {i}", "candidate_id": doc_id},
+        )
+
+    result = await _drive(args.requests, args.concurrency, send)
+    result["pdf_bytes"] = len(ctx.pdf)
+    result["ingestion_drain_seconds"] = await _drain(args.drain_timeout)
+    return result
+
+
+async def bench_ingest(ctx, args) -> dict:
+    """parse_and_index on documents already in GridFS, one after another."""
+    from app.db import get_db, get_gridfs
+    from app.services import embedding_cache, ingest, metrics
+    db = get_db()
+    doc_ids = [f"{ctx.run_id}-ing-{i}" for i in range(args.ingest_docs)]
+    for doc_id in doc_ids:
+        upload = get_gridfs().open_upload_stream(f"{doc_id}.pdf", metadata={"document_id": doc_id})
+        await upload.write(variant(ctx.pdf, doc_id))
+        await upload.close()
+        await db.documents.replace_one({"_id": doc_id}, {"_id": doc_id, "title": doc_id, "status": "QUEUED"}, upsert=True)
+
+    stages_before = _stage_totals(metrics.INGEST_STAGE_SECONDS)
+    per_doc, failures = [], 0
+    _reset_peak()
+    before = _memory()
+    started = time.perf_counter()
+    for doc_id in doc_ids:
+        t0 = time.perf_counter()
+        ok = await ingest.parse_and_index(doc_id)
+        elapsed = time.perf_counter() - t0
+        if not ok:
+            failures += 1
+            continue
+        chunks = await db.embeddings.count_documents({"document_id": doc_id})
+        per_doc.append({"seconds": elapsed, "pages_per_second": args.pages / elapsed, "chunks_per_second": chunks / elapsed,
+                        "chunks": chunks})
+    wall = time.perf_counter() - started
+    done = len(per_doc)
+    return {
+        "documents": len(doc_ids),
+        "failed": failures,
+        "pages_per_document": args.pages,
+        "wall_seconds": round(wall, 3),
+        "pages_per_second": round(args.pages * done / wall, 2) if wall else None,
+        "chunks_per_second": round(sum(d["chunks"] for d in per_doc) / wall, 2) if wall else None,
+        "document_seconds": _percentiles([d["seconds"] for d in per_doc], scale=1.0),
+        "document_pages_per_second": _percentiles([d["pages_per_second"] for d in per_doc], scale=1.0),
+        "stages": _stage_delta(stages_before, _stage_totals(metrics.INGEST_STAGE_SECONDS)),
+        "embedding_cache": embedding_cache.stats(),
+        "memory": {"before": before, "after": _memory()},
+    }
+
+
+async def _drain(timeout: float) -> float | None:
+    """Seconds until background ingestion from the previous scenario has finished (None on timeout)."""
+    from app.db import get_db
+    from app.services import jobs
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        active = await get_db().ingest_jobs.count_documents({"status": {"$in": ["QUEUED", "RUNNING"]}})
+        if not active and not jobs.queue_depth():
+            return round(time.perf_counter() - started, 3)
+        await asyncio.sleep(0.2)
+    return None
+
+
+# ────────────────────────────────────────────────────────────────
+# Harness
+# ────────────────────────────────────────────────────────────────
+class _Context:
+    def __init__(self, client: httpx.AsyncClient, pdf: bytes, run_id: str):
+        self.client, self.pdf, self.run_id = client, pdf, run_id
+
+
+def _configure(args, workdir: str):
+    """Environment the app reads at import time – must run before anything under app/ is imported."""
+    os.environ["VECTOR_STORE_DIR"] = os.path.join(workdir, "vector_store")
+    os.environ["TEXTBOOK_CACHE_DIR"] = os.path.join(workdir, "textbook_cache")
+    os.environ.setdefault("INGEST_QUEUE_MAX", str(max(20, args.requests * 2)))   # measure latency, not 429s
+    os.environ.setdefault("GOOGLE_BOOKS_KEY", "bench")
+    if args.encoder == "hash":
+        os.environ["EMBEDDING_MODEL"] = "bench-hash-encoder"   # keeps hash vectors out of any real cache
+    if args.mongo_uri:
+        os.environ["MONGODB_URI"] = args.mongo_uri
+        os.environ["MONGODB_DB"] = f"bench_{os.getpid()}_{int(time.time())}"
+    else:
+        os.environ.setdefault("TEXTBOOK_URI", "mongodb://bench-memory/textbooks")   # replica bucket is in memory too
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    _configure(args, workdir)
+    pdf = make_pdf(args.pages, args.words, seed=args.seed)
+
+    from app.main import app
+    from app import db
+    from app.services import embedder, http_pool, provider_health
+    from bench import memory_mongo
+    from bench.providers import StandInProviders
+
+    for name in ("book-query", "httpx", "httpcore"):
+        logging.getLogger(name).setLevel(getattr(logging, args.log_level))
+    if not args.mongo_uri:
+        memory_mongo.install(db.MONGO_DB_NAME)
+    if args.encoder == "hash":
+        embedder._model = HashEncoder()
+    providers = StandInProviders(
+        pdf, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        failure_rate=args.failure_rate, timeout_rate=args.timeout_rate,
+        bandwidth_mbps=args.bandwidth_mbps, fixtures=args.fixtures, seed=args.seed,
+    ).start()
+    http_pool.set_client(http_pool.build_client(providers.transport(http_pool.pooled_transport())))
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "mongo": "mongodb" if args.mongo_uri else "memory",
+            "args": vars(args),
+        },
+        "setup": {"pdf_bytes": len(pdf)},
+        "scenarios": {},
+    }
+    run_id = f"b{int(time.time())}"
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        async with app.router.lifespan_context(app):
+            started = time.perf_counter()
+            await asyncio.to_thread(embedder.warmup)
+            report["setup"]["encoder_warmup_seconds"] = round(time.perf_counter() - started, 3)
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)   # app errors count as 500s
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                ctx = _Context(client, pdf, run_id)
+                for name in args.scenarios:
+                    print(f"▶ {name}", file=sys.stderr)
+                    with quiet:
+                        report["scenarios"][name] = await {
+                            "search": bench_search, "import": bench_import,
+                            "upload": bench_upload, "ingest": bench_ingest,
+                        }[name](ctx, args)
+            report["providers"] = {**await providers.stats(), "breakers": provider_health.stats()}
+    finally:
+        providers.stop()
+        if args.mongo_uri:
+            with contextlib.suppress(Exception):
+                await db.get_client().drop_database(db.MONGO_DB_NAME)
+                db.close_clients()
+    report["meta"]["finished_at"] = datetime.now(timezone.utc).isoformat()
+    return report
+
+
+def _summary(report: dict) -> str:
+    lines = []
+    for name, result in report["scenarios"].items():
+        if "latency_ms" in result:
+            lat = result["latency_ms"]
+            lines.append(f"{name:>7}: {result['rps']} req/s  p50 {lat.get('p50')} ms  p95 {lat.get('p95')} ms  "
+                         f"p99 {lat.get('p99')} ms  status {result['status']}  peak {result['memory']['after']['peak_rss_mb']} MiB")
+        else:
+            lines.append(f"{name:>7}: {result['pages_per_second']} pages/s  {result['chunks_per_second']} chunks/s  "
+                         f"({result['documents']} × {result['pages_per_document']} pages)  "
+                         f"peak {result['memory']['after']['peak_rss_mb']} MiB")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark: stand-in providers, in-memory Mongo, synthetic PDFs")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda s: [x for x in s.split(",") if x], help=f"comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--requests", type=int, default=200, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--distinct-queries", type=int, default=0, help="0 = every search is a new query")
+    parser.add_argument("--pages", type=int, default=100, help="pages per synthetic PDF")
+    parser.add_argument("--words", type=int, default=350, help="words per synthetic page")
+    parser.add_argument("--ingest-docs", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=80, help="stand-in provider latency")
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of provider calls answered 503")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of provider calls that time out")
+    parser.add_argument("--bandwidth-mbps", type=float, default=None, help="PDF download speed (unlimited if unset)")
+    parser.add_argument("--fixtures", default=os.path.join(os.path.dirname(__file__), "fixtures"))
+    parser.add_argument("--encoder", choices=("model", "hash"), default="model",
+                        help="real SentenceTransformer, or a hashing stand-in to time the pipeline alone")
+    parser.add_argument("--mongo-uri", default=None, help="local mongod instead of the in-memory substitute")
+    parser.add_argument("--drain-timeout", type=float, default=600, help="max wait for background ingestion")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON results path (stdout if omitted)")
+    parser.add_argument("--log-level", default="ERROR", choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    parser.add_argument("--verbose", action="store_true", help="keep the service's own stdout output")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(run(args))
+    print(_summary(report), file=sys.stderr)
+    text = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+        print(f"results → {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
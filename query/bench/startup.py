@@ -0,0 +1,177 @@
+# bench/startup.py
+# Cold start and memory per worker.
+#   python -m bench.startup import [--trials 5] [--load-model]
+#       fresh interpreters time `import app.main` (what every gunicorn worker pays
+#       before it can serve), report RSS and which heavy stacks got pulled in
+#   python -m bench.startup serve [--workers 4] [--preload] [--settle 20]
+#       boots gunicorn with gunicorn.conf.py, times the first /health answer (and
+#       the encoder becoming ready, when --preload or EMBEDDING_WARMUP=1 load it at
+#       startup), then reads RSS/PSS of the master and each worker. Without a
+#       reachable MONGODB_URI set MONGO_SERVER_SELECTION_TIMEOUT_MS low: index
+#       creation then only logs a warning and /health still answers.
+#   --root DIR measures another checkout (e.g. a `git worktree` of an older commit)
+# PSS splits shared pages between the processes mapping them, so its sum is the
+# real footprint; with --preload the weights show up once instead of per worker.
+import argparse, json, os, socket, statistics, subprocess, sys, tempfile, time
+import httpx
+
+ROOT  = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("torch", "sentence_transformers", "transformers", "fitz")
+
+_IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+out = {"import_s": time.perf_counter() - t0}
+if LOAD_MODEL:
+    t1 = time.perf_counter()
+    from app.services import embedder
+    embedder.get_model()
+    out["model_s"] = time.perf_counter() - t1
+with open("/proc/self/status") as fh:
+    out["rss_mb"] = int(next(l for l in fh if l.startswith("VmRSS")).split()[1]) / 1024
+out["heavy"] = [m for m in HEAVY if m in sys.modules]
+print("RESULT " + json.dumps(out))
+"""
+
+
+def _memory(pid: int) -> dict:
+    """RSS and PSS of one process in MiB, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty"):
+                    fields[key] = int(rest.split()[0])
+    except OSError:
+        return {}
+    return {"rss_mb": round(fields.get("Rss", 0) / 1024, 1), "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+            "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1)}
+
+
+def _children(pid: int) -> list[int]:
+    found = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as fh:
+                    # "pid (comm) state ppid ..." – comm may contain spaces, split after ')'
+                    ppid = int(fh.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == pid:
+                found.append(int(entry))
+    return sorted(found)
+
+
+def _summary(values: list[float]) -> dict:
+    return {"median": round(statistics.median(values), 3), "min": round(min(values), 3), "max": round(max(values), 3)}
+
+
+def measure_import(root: str, trials: int, load_model: bool) -> dict:
+    probe = f"LOAD_MODEL = {load_model!r}\nHEAVY = {HEAVY!r}\n" + _IMPORT_PROBE
+    runs = []
+    for _ in range(trials):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", probe], cwd=root, capture_output=True, text=True)
+        wall = time.perf_counter() - t0
+        line = next((l for l in proc.stdout.splitlines() if l.startswith("RESULT ")), None)
+        if proc.returncode or line is None:
+            raise RuntimeError(f"import probe failed:\n{proc.stderr[-2000:]}")
+        runs.append({**json.loads(line[7:]), "process_s": wall})
+    out = {
+        "trials": trials,
+        "import_s": _summary([r["import_s"] for r in runs]),
+        "process_s": _summary([r["process_s"] for r in runs]),
+        "rss_mb": _summary([r["rss_mb"] for r in runs]),
+        "heavy_modules_loaded": runs[-1]["heavy"],
+    }
+    if load_model:
+        out["model_s"] = _summary([r["model_s"] for r in runs])
+    return out
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_serve(root: str, workers: int, preload: bool, settle: float, timeout: float) -> dict:
+    port = _free_port()
+    env = {**os.environ, "GUNICORN_PRELOAD": "1" if preload else "0"}
+    cmd = [sys.executable, "-m", "gunicorn", "app.main:app", "-k", "uvicorn.workers.UvicornWorker",
+           "--workers", str(workers), "--bind", f"127.0.0.1:{port}", "--log-level", "warning"]
+    t0 = time.perf_counter()
+    # The app logs at DEBUG: a file, not a pipe nobody drains (that would stall gunicorn)
+    log = tempfile.TemporaryFile()
+    master = subprocess.Popen(cmd, cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    expect_encoder = preload or os.getenv("EMBEDDING_WARMUP") == "1"
+    first_response = encoder_ready = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while time.perf_counter() - t0 < timeout and encoder_ready is None:
+                if first_response and not expect_encoder:
+                    break
+                if master.poll() is not None:
+                    log.seek(0)
+                    raise RuntimeError(f"gunicorn exited:\n{log.read().decode(errors='replace')[-2000:]}")
+                try:
+                    body = client.get("/health").json()
+                except (httpx.HTTPError, ValueError):
+                    time.sleep(0.05)
+                    continue
+                first_response = first_response or time.perf_counter() - t0
+                if body.get("embedder", {}).get("ready"):
+                    encoder_ready = time.perf_counter() - t0
+                else:
+                    time.sleep(0.1)
+            time.sleep(settle)   # let the other workers finish booting (and warming up)
+            worker_pids = _children(master.pid)
+            procs = {"master": _memory(master.pid), **{f"worker-{pid}": _memory(pid) for pid in worker_pids}}
+    finally:
+        master.terminate()
+        try:
+            master.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            master.kill()
+        log.close()
+    worker_mem = [m for name, m in procs.items() if name.startswith("worker") and m]
+    return {
+        "workers": workers,
+        "preload": preload,
+        "first_response_s": round(first_response, 3) if first_response else None,
+        "encoder_ready_s": round(encoder_ready, 3) if encoder_ready else None,
+        "processes": procs,
+        "worker_rss_mb": _summary([m["rss_mb"] for m in worker_mem]) if worker_mem else None,
+        "total_pss_mb": round(sum(m.get("pss_mb", 0) for m in procs.values()), 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure worker cold start and memory")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    p_import = sub.add_parser("import", help="time `import app.main` in fresh interpreters")
+    p_import.add_argument("--trials", type=int, default=5)
+    p_import.add_argument("--load-model", action="store_true", help="also time loading the encoder")
+    p_serve = sub.add_parser("serve", help="boot gunicorn and measure startup and per-worker memory")
+    p_serve.add_argument("--workers", type=int, default=4)
+    p_serve.add_argument("--preload", action="store_true", help="GUNICORN_PRELOAD=1")
+    p_serve.add_argument("--settle", type=float, default=20.0, help="seconds to wait before reading memory")
+    p_serve.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    parser.add_argument("--root", default=ROOT, help="checkout to measure (default: this one)")
+    args = parser.parse_args()
+
+    if args.mode == "import":
+        result = measure_import(args.root, args.trials, args.load_model)
+    else:
+        result = measure_serve(args.root, args.workers, args.preload, args.settle, args.timeout)
+    result = {"mode": args.mode, "root": os.path.abspath(args.root), "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), **result}
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
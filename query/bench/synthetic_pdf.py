@@ -0,0 +1,64 @@
+# bench/synthetic_pdf.py
+# Deterministic text PDFs of any page count, for ingestion and upload benchmarks.
+#   python -m bench.synthetic_pdf --pages 300 --out /tmp/book.pdf
+import argparse, random
+import fitz  # PyMuPDF
+
+# Textbook-ish vocabulary so chunking/BM25 see realistic word lengths and repeats
+_WORDS = (
+    "the of and to in is that for as with by on are this be from or an which it at can "
+    "function equation theorem proof derivative integral matrix vector energy force mass "
+    "velocity acceleration reaction molecule cell protein economy market demand supply "
+    "population variable constant probability distribution sample hypothesis model system "
+    "limit series convergence graph node algorithm complexity memory process thread "
+    "example exercise chapter section figure table definition lemma corollary result"
+).split()
+
+
+def page_text(rng: random.Random, words: int) -> str:
+    lines, line = [], []
+    for _ in range(words):
+        line.append(rng.choice(_WORDS))
+        if len(line) >= 12:
+            sentence = " ".join(line)
+            lines.append(sentence[0].upper() + sentence[1:] + ".")
+            line = []
+    if line:
+        lines.append(" ".join(line) + ".")
+    return "\n".join(lines)
+
+
+def make_pdf(pages: int, words_per_page: int = 350, seed: int = 0) -> bytes:
+    """A `pages`-page PDF of seeded pseudo-text; same arguments, same bytes."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    try:
+        for page_no in range(pages):
+            page = doc.new_page()   # A4-ish default (595 x 842 pt)
+            page.insert_textbox(
+                fitz.Rect(50, 50, 545, 800),
+                f"Chapter {page_no // 20 + 1}, page {page_no + 1}\n\n" + page_text(rng, words_per_page),
+                fontsize=9,
+            )
+        doc.set_metadata({"title": f"Synthetic textbook ({pages} pages, seed {seed})", "producer": "bench"})
+        return doc.tobytes(garbage=3, deflate=True, no_new_id=True)
+    finally:
+        doc.close()
+
+
+def variant(pdf: bytes, tag: str) -> bytes:
+    """Same document, different bytes (and content hash): a trailing comment after %%EOF."""
+    return pdf + f"\n% bench {tag}\n".encode()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic text PDF")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--words", type=int, default=350, help="words per page")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    data = make_pdf(args.pages, args.words, args.seed)
+    with open(args.out, "wb") as fh:
+        fh.write(data)
+    print(f"{args.out}: {args.pages} pages, {len(data) // 1024} KiB")
@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+# Read automatically from the working directory by `gunicorn app.main:app ...`.
+# Default: every worker imports the app itself (ML/PDF stacks load lazily, on first use).
+# GUNICORN_PRELOAD=1: the master imports the app and loads the encoder once, then forks;
+# workers share the weight pages copy-on-write instead of each holding their own copy.
+import gc, os
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+
+def when_ready(server):
+    # Runs in the master after the preload, right before the first fork
+    if not preload_app:
+        return
+    from app.services import embedder
+    try:
+        embedder.preload()
+    except Exception as e:
+        server.log.error(f"❌ Encoder preload failed, workers will load their own: {e}")
+    # Park everything allocated so far outside the GC, so collections in the workers
+    # don't write to (and un-share) the master's pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app.services import embedder
+        embedder.after_fork()